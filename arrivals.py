@@ -0,0 +1,167 @@
+"""Reading of the arrival schedules in scenario configuration files, for previews.
+
+An ``.xlsx`` file is a zip archive of XML parts.  Rather than loading the whole workbook,
+:py:func:`read_tables` finds the named Excel tables from the (small) table and relationship
+parts, then streams the worksheet XML with :py:func:`xml.etree.ElementTree.iterparse`, keeping
+only the rows in the tables' ranges and stopping after the last of them.  Column names are
+taken from the table definitions, so the shared strings part is never read.
+
+Parsed schedules are kept in a small per-worker LRU cache keyed by the SHA-256 digest of the
+file contents (see :py:func:`content_digest`), so uploading the same file again costs no
+parsing.
+"""
+import hashlib
+import io
+import posixpath
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from xml.etree import ElementTree
+
+import pandas as pd
+
+from conf import ARRIVAL_PREVIEW_CACHE_SIZE
+
+ARRIVAL_TABLES = ['ArrivalScheduleCancer', 'ArrivalScheduleNonCancer']
+"""Names of the Excel tables holding the hourly arrival rates, by day of the week."""
+
+_NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+_ROW_TAG = f'{{{_NS["main"]}}}row'
+_CELL_TAG = f'{{{_NS["main"]}}}c'
+_VALUE_TAG = f'{{{_NS["main"]}}}v'
+_CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+_schedule_cache: OrderedDict[str, dict[str, pd.DataFrame]] = OrderedDict()
+_schedule_cache_lock = threading.Lock()
+
+
+def _column_index(letters: str) -> int:
+    """Zero-based index of a spreadsheet column, e.g. 0 for ``'A'`` and 27 for ``'AB'``."""
+    index = 0
+    for letter in letters:
+        index = 26*index + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _parse_ref(ref: str) -> tuple[int, int, int, int]:
+    """First row, last row, first column and last column of a range such as ``'A5:H30'``."""
+    first, _, last = ref.partition(':')
+    first_col, first_row = _CELL_REF.fullmatch(first).groups()
+    last_col, last_row = _CELL_REF.fullmatch(last or first).groups()
+    return int(first_row), int(last_row), _column_index(first_col), _column_index(last_col)
+
+
+def _find_tables(archive: zipfile.ZipFile, names: list[str]) -> dict[str, tuple[str, dict]]:
+    """Locate the named tables: worksheet part and table definition (range, header and
+    totals row counts, column names) of each table found."""
+    found = {}
+    for rels_path in archive.namelist():
+        if not (rels_path.startswith('xl/worksheets/_rels/') and rels_path.endswith('.rels')):
+            continue
+        sheet_path = posixpath.join('xl/worksheets', posixpath.basename(rels_path)[:-5])
+        rels = ElementTree.fromstring(archive.read(rels_path))
+        for rel in rels.iterfind('rel:Relationship', _NS):
+            if not rel.get('Type', '').endswith('/table'):
+                continue
+            table_path = posixpath.normpath(
+                posixpath.join(posixpath.dirname(sheet_path), rel.get('Target')))
+            table = ElementTree.fromstring(archive.read(table_path))
+            if table.get('name') not in names:
+                continue
+            found[table.get('name')] = (sheet_path, {
+                'ref': _parse_ref(table.get('ref')),
+                'header_rows': int(table.get('headerRowCount', 1)),
+                'totals_rows': int(table.get('totalsRowCount', 0)),
+                'columns': [col.get('name') for col in
+                            table.iterfind('main:tableColumns/main:tableColumn', _NS)],
+            })
+    return found
+
+
+def _read_rows(archive: zipfile.ZipFile, sheet_path: str,
+               wanted: set[int]) -> dict[int, dict[int, float]]:
+    """Numeric cell values of the wanted rows of a worksheet, by row and column index.  The
+    worksheet is streamed and parsing stops after the last wanted row."""
+    rows: dict[int, dict[int, float]] = {}
+    last = max(wanted)
+    with archive.open(sheet_path) as stream:
+        for _, elem in ElementTree.iterparse(stream):
+            if elem.tag != _ROW_TAG:
+                continue
+            row = int(elem.get('r'))
+            if row in wanted:
+                values = {}
+                for cell in elem.iter(_CELL_TAG):
+                    value = cell.find(_VALUE_TAG)
+                    if value is None or cell.get('t') not in (None, 'n'):
+                        continue  # Empty or non-numeric
+                    col, _ = _CELL_REF.fullmatch(cell.get('r')).groups()
+                    values[_column_index(col)] = float(value.text)
+                rows[row] = values
+            elem.clear()
+            if row >= last:
+                break
+    return rows
+
+
+def read_tables(data: bytes, names: list[str]) -> dict[str, pd.DataFrame]:
+    """Read the data rows (without header or totals rows) of named Excel tables in an
+    ``.xlsx`` file.  Tables that are not found are omitted.  Empty and non-numeric cells
+    are NaN.
+
+    Raises:
+        zipfile.BadZipFile: ``data`` is not a zip archive.
+        KeyError: A part referenced by the workbook is missing.
+        xml.etree.ElementTree.ParseError: A part is not well-formed XML.
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        tables = _find_tables(archive, names)
+        ret = {}
+        for sheet_path in {sheet_path for sheet_path, _ in tables.values()}:
+            on_sheet = {name: table for name, (path, table) in tables.items()
+                        if path == sheet_path}
+            ranges = {
+                name: range(table['ref'][0] + table['header_rows'],
+                            table['ref'][1] - table['totals_rows'] + 1)
+                for name, table in on_sheet.items()
+            }
+            rows = _read_rows(archive, sheet_path, set().union(*ranges.values()))
+            for name, table in on_sheet.items():
+                first_col = table['ref'][2]
+                ret[name] = pd.DataFrame(
+                    [[rows.get(row, {}).get(first_col + i, float('nan'))
+                      for i in range(len(table['columns']))]
+                     for row in ranges[name]],
+                    columns=table['columns']
+                )
+    return {name: ret[name] for name in names if name in ret}
+
+
+def content_digest(data: bytes) -> str:
+    """Digest identifying the contents of a configuration file."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def arrival_schedules(data: bytes) -> dict[str, pd.DataFrame]:
+    """Return the arrival schedule tables (see :py:data:`ARRIVAL_TABLES`) of a scenario
+    configuration file, from the cache if the same contents were read before.  The returned
+    DataFrames are shared and must not be modified.
+
+    Raises:
+        See :py:func:`read_tables`.
+    """
+    digest = content_digest(data)
+    with _schedule_cache_lock:
+        if digest in _schedule_cache:
+            _schedule_cache.move_to_end(digest)
+            return _schedule_cache[digest]
+    schedules = read_tables(data, ARRIVAL_TABLES)
+    with _schedule_cache_lock:
+        _schedule_cache[digest] = schedules
+        while len(_schedule_cache) > ARRIVAL_PREVIEW_CACHE_SIZE:
+            _schedule_cache.popitem(last=False)
+    return schedules
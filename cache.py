@@ -0,0 +1,335 @@
+"""Persistent, size-bounded caches for data derived from simulation results.
+
+Results of a completed scenario never change, so anything derived from them (e.g. plotly
+figures) can be cached indefinitely, keyed by scenario ID.  Values are stored as bytes
+either on local disk or in Redis, as set by :py:data:`conf.CACHE_BACKEND`.  Each store
+evicts least recently used entries once its size limit is exceeded.
+
+All cache keys are tuples whose first element is the scenario ID, so that the cached
+entries for a scenario can be invalidated together.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from typing import Any, Callable, Hashable
+
+from plotly.io.json import to_json_plotly
+from redis.exceptions import RedisError
+
+import mirror
+import prefetch
+import reports
+import scenario_list
+from conf import (CACHE_BACKEND, CACHE_DIR, FIGURE_CACHE_MAX_BYTES, FIGURE_CACHE_VERSION,
+                  LAYOUT_CACHE_MAX_BYTES, PYRAMID_CACHE_MAX_BYTES)
+from pyramid import Pyramid
+from redis_conn import REDIS_CONN
+
+
+def _digest(key: tuple[Hashable, ...]) -> str:
+    """Stable digest of a cache key.  The scenario ID is digested as a string, as it is an int
+    or a str (from the page URL) depending on the caller."""
+    return hashlib.sha1(json.dumps((str(key[0]), *key[1:]), default=str).encode()).hexdigest()
+
+
+class DiskStore:
+    """Size-bounded key/value store on local disk.  Entries are stored as one file each,
+    under one subdirectory per scenario; file modification times are used for LRU eviction.
+    """
+
+    def __init__(self, namespace: str, max_bytes: int):
+        self.directory = os.path.join(CACHE_DIR, namespace)
+        self.max_bytes = max_bytes
+        self._approx_bytes: int | None = None  # Lazily initialised by _scan()
+
+    def _path(self, key: tuple[Hashable, ...]) -> str:
+        return os.path.join(self.directory, str(key[0]), _digest(key))
+
+    def _scan(self) -> list[os.DirEntry]:
+        """List all entries and update the size estimate."""
+        entries = []
+        if os.path.isdir(self.directory):
+            for subdir in os.scandir(self.directory):
+                if subdir.is_dir():
+                    entries.extend(e for e in os.scandir(subdir.path) if e.is_file())
+        self._approx_bytes = sum(e.stat().st_size for e in entries)
+        return entries
+
+    def get(self, key: tuple[Hashable, ...]) -> bytes | None:
+        """Return the value for ``key``, or ``None`` on a cache miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = file.read()
+            os.utime(path)  # Mark as recently used
+            return value
+        except OSError:
+            return None
+
+    def set(self, key: tuple[Hashable, ...], value: bytes) -> None:
+        """Store ``value`` under ``key``, evicting old entries if over the size limit."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(value)
+        os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+
+        if self._approx_bytes is None:
+            self._scan()
+        else:
+            self._approx_bytes += len(value)
+        if self._approx_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the store is 90% full."""
+        entries = sorted(self._scan(), key=lambda e: e.stat().st_mtime)
+        for entry in entries:
+            if self._approx_bytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._approx_bytes -= size
+            except OSError:
+                pass  # Removed by another worker
+
+    def invalidate(self, scenario_id: Any = None) -> None:
+        """Delete all entries for ``scenario_id``, or all entries if ``scenario_id`` is None."""
+        shutil.rmtree(
+            self.directory if scenario_id is None
+            else os.path.join(self.directory, str(scenario_id)),
+            ignore_errors=True
+        )
+        self._approx_bytes = None
+
+
+class RedisStore:
+    """Size-bounded key/value store in Redis, shared by all workers.  A sorted set of
+    last-access times and a hash of entry sizes are kept per namespace for LRU eviction.
+    """
+
+    def __init__(self, namespace: str, max_bytes: int):
+        self.prefix = f'hpath:cache:{namespace}'
+        self.max_bytes = max_bytes
+
+    def _key(self, key: tuple[Hashable, ...]) -> str:
+        return f'{self.prefix}:{key[0]}:{_digest(key)}'
+
+    def get(self, key: tuple[Hashable, ...]) -> bytes | None:
+        """Return the value for ``key``, or ``None`` on a cache miss."""
+        redis_key = self._key(key)
+        value = REDIS_CONN.get(redis_key)
+        if value is not None:
+            REDIS_CONN.zadd(f'{self.prefix}:lru', {redis_key: time.time()})
+        return value
+
+    def set(self, key: tuple[Hashable, ...], value: bytes) -> None:
+        """Store ``value`` under ``key``, evicting old entries if over the size limit."""
+        redis_key = self._key(key)
+        pipe = REDIS_CONN.pipeline()
+        pipe.set(redis_key, value)
+        pipe.zadd(f'{self.prefix}:lru', {redis_key: time.time()})
+        pipe.hset(f'{self.prefix}:sizes', redis_key, len(value))
+        pipe.incrby(f'{self.prefix}:bytes', len(value))
+        total = pipe.execute()[-1]
+        if total > self.max_bytes:
+            self._evict(total)
+
+    def _evict(self, total: int) -> None:
+        """Delete least recently used entries until the store is 90% full."""
+        while total > 0.9 * self.max_bytes:
+            oldest = REDIS_CONN.zrange(f'{self.prefix}:lru', 0, 99)
+            if not oldest:
+                break
+            total = self._delete(oldest)
+
+    def _delete(self, redis_keys: list[bytes]) -> int:
+        """Delete the given entries and return the updated total size."""
+        sizes = REDIS_CONN.hmget(f'{self.prefix}:sizes', redis_keys)
+        pipe = REDIS_CONN.pipeline()
+        pipe.delete(*redis_keys)
+        pipe.zrem(f'{self.prefix}:lru', *redis_keys)
+        pipe.hdel(f'{self.prefix}:sizes', *redis_keys)
+        pipe.incrby(f'{self.prefix}:bytes', -sum(int(s) for s in sizes if s is not None))
+        return pipe.execute()[-1]
+
+    def invalidate(self, scenario_id: Any = None) -> None:
+        """Delete all entries for ``scenario_id``, or all entries if ``scenario_id`` is None."""
+        if scenario_id is None:
+            redis_keys = list(REDIS_CONN.scan_iter(f'{self.prefix}:*'))
+            if redis_keys:
+                REDIS_CONN.delete(*redis_keys)
+            return
+        redis_keys = list(REDIS_CONN.scan_iter(f'{self.prefix}:{scenario_id}:*'))
+        if redis_keys:
+            self._delete(redis_keys)
+
+
+class NullStore:
+    """Store that caches nothing, for ``CACHE_BACKEND = 'off'``."""
+
+    def __init__(self, *_):
+        pass
+
+    def get(self, _) -> None:
+        """Always a cache miss."""
+        return None
+
+    def set(self, *_) -> None:
+        """Discard the value."""
+
+    def invalidate(self, *_) -> None:
+        """Nothing to invalidate."""
+
+
+def make_store(namespace: str, max_bytes: int) -> DiskStore | RedisStore | NullStore:
+    """Create a store for the configured cache backend."""
+    store_class = (
+        RedisStore if CACHE_BACKEND == 'redis'
+        else DiskStore if CACHE_BACKEND == 'disk'
+        else NullStore
+    )
+    return store_class(namespace, max_bytes)
+
+
+FIGURE_CACHE = make_store('figures', FIGURE_CACHE_MAX_BYTES)
+"""Cache of serialised plotly figures and other JSON data shown on the results page."""
+
+PYRAMID_CACHE = make_store('pyramids', PYRAMID_CACHE_MAX_BYTES)
+"""Cache of serialised time series pyramids."""
+
+LAYOUT_CACHE = make_store('layouts', LAYOUT_CACHE_MAX_BYTES)
+"""Cache of serialised Dash component trees of scenario result pages."""
+
+
+def cached_figure(key: tuple[Hashable, ...], build: Callable[..., Any], *args) -> dict:
+    """Return the plotly figure for ``key`` as a dict, calling ``build(*args)`` to create the
+    figure only on a cache miss.  Cache errors are logged and treated as a miss.
+
+    ``key`` should be ``(scenario_id, section, series, time_unit, *render_options)``.
+    """
+    logger = logging.getLogger('dash.dash')
+    key = (*key, FIGURE_CACHE_VERSION)
+    try:
+        value = FIGURE_CACHE.get(key)
+        if value is not None:
+            return json.loads(value)
+    except (OSError, RedisError, ValueError) as exc:
+        logger.error('Figure cache read failed: %s', exc)
+
+    fig_json = build(*args).to_json()
+    try:
+        FIGURE_CACHE.set(key, fig_json.encode())
+    except (OSError, RedisError) as exc:
+        logger.error('Figure cache write failed: %s', exc)
+    return json.loads(fig_json)
+
+
+def cached_json(key: tuple[Hashable, ...], build: Callable[..., Any], *args) -> Any:
+    """Return ``build(*args)``, a JSON-serialisable value such as grid rows, from the figure
+    cache if possible.  Cache errors are logged and treated as a miss.
+
+    ``key`` should be ``(scenario_id, section, *options)``.
+    """
+    logger = logging.getLogger('dash.dash')
+    key = (*key, FIGURE_CACHE_VERSION)
+    try:
+        value = FIGURE_CACHE.get(key)
+        if value is not None:
+            return json.loads(value)
+    except (OSError, RedisError, ValueError) as exc:
+        logger.error('Figure cache read failed: %s', exc)
+
+    value = build(*args)
+    try:
+        FIGURE_CACHE.set(key, json.dumps(value).encode())
+    except (OSError, RedisError) as exc:
+        logger.error('Figure cache write failed: %s', exc)
+    return value
+
+
+def cached_layout(key: tuple[Hashable, ...], build: Callable[..., Any], *args) -> dict:
+    """Return the Dash component tree for ``key`` in its JSON form (which Dash accepts as a
+    callback output), calling ``build(*args)`` to create the components only on a cache miss.
+    Cache errors are logged and treated as a miss.
+
+    ``key`` should be ``(scenario_id, *options)``.
+    """
+    logger = logging.getLogger('dash.dash')
+    key = (*key, FIGURE_CACHE_VERSION)
+    try:
+        value = LAYOUT_CACHE.get(key)
+        if value is not None:
+            return json.loads(value)
+    except (OSError, RedisError, ValueError) as exc:
+        logger.error('Layout cache read failed: %s', exc)
+
+    layout_json = to_json_plotly(build(*args))
+    try:
+        LAYOUT_CACHE.set(key, layout_json.encode())
+    except (OSError, RedisError) as exc:
+        logger.error('Layout cache write failed: %s', exc)
+    return json.loads(layout_json)
+
+
+def cached_pyramid(key: tuple[Hashable, ...], build: Callable[..., Pyramid], *args) -> Pyramid:
+    """Return the pyramid for ``key``, calling ``build(*args)`` only on a cache miss.  Cache
+    errors are logged and treated as a miss.
+
+    ``key`` should be ``(scenario_id, section, series)``.
+    """
+    logger = logging.getLogger('dash.dash')
+    key = (*key, FIGURE_CACHE_VERSION)
+    try:
+        value = PYRAMID_CACHE.get(key)
+        if value is not None:
+            return Pyramid.from_bytes(value)
+    except (OSError, RedisError, ValueError) as exc:
+        logger.error('Pyramid cache read failed: %s', exc)
+
+    pyramid = build(*args)
+    try:
+        PYRAMID_CACHE.set(key, pyramid.to_bytes())
+    except (OSError, RedisError) as exc:
+        logger.error('Pyramid cache write failed: %s', exc)
+    return pyramid
+
+
+def invalidate_all() -> None:
+    """Invalidate all result caches, e.g. after the results database is cleared."""
+    reports.invalidate()
+    prefetch.forget()
+    scenario_list.invalidate()
+    try:
+        mirror.delete()
+    except (sqlite3.Error, OSError) as exc:
+        logging.getLogger('dash.dash').error('Mirror deletion failed: %s', exc)
+    try:
+        FIGURE_CACHE.invalidate()
+        PYRAMID_CACHE.invalidate()
+        LAYOUT_CACHE.invalidate()
+    except (OSError, RedisError) as exc:
+        logging.getLogger('dash.dash').error('Cache invalidation failed: %s', exc)
+
+
+def invalidate_scenario(scenario_id: int) -> None:
+    """Invalidate the cached results of one scenario, e.g. after it is purged."""
+    reports.invalidate(scenario_id)
+    prefetch.forget(scenario_id)
+    scenario_list.invalidate()
+    try:
+        mirror.delete(int(scenario_id))
+    except (sqlite3.Error, OSError) as exc:
+        logging.getLogger('dash.dash').error('Mirror deletion failed: %s', exc)
+    try:
+        FIGURE_CACHE.invalidate(scenario_id)
+        PYRAMID_CACHE.invalidate(scenario_id)
+        LAYOUT_CACHE.invalidate(scenario_id)
+    except (OSError, RedisError) as exc:
+        logging.getLogger('dash.dash').error('Cache invalidation failed: %s', exc)
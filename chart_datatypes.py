@@ -1,8 +1,38 @@
-"""Datatypes for chart data."""
+"""Datatypes for chart data.
+
+Time series are represented either with explicit ``x`` values (:py:class:`ChartData`,
+:py:class:`MultiChartData`) or, for series sampled on an evenly spaced time grid, by the
+grid start and spacing only (:py:class:`RegularChartData`, :py:class:`RegularMultiChartData`).
+All four types provide ``window()`` and ``x_range()`` for selecting a time window without
+searching (regular types) or copying (explicit types) the whole x-axis.
+"""
+import math
 from dataclasses import dataclass, field
+import numpy as np
 import pandas as pd
 
 
+def _explicit_window(x, start: float | None, end: float | None) -> slice:
+    """Index range of an explicit, increasing x-axis covering ``[start, end]``, including the
+    last point at or before ``start`` so that step plots start at the window start.
+    ``None`` denotes an open end."""
+    i_start = 0 if start is None else max(int(np.searchsorted(x, start, side='right')) - 1, 0)
+    i_end = len(x) if end is None else int(np.searchsorted(x, end, side='right'))
+    return slice(i_start, max(i_end, i_start))
+
+
+def _regular_window(t0: float, dt: float, n: int,
+                    start: float | None, end: float | None) -> slice:
+    """Index range of the regular grid ``t0 + i*dt, i < n`` covering ``[start, end]``,
+    including the last point at or before ``start``.  Constant time.
+    ``None`` denotes an open end."""
+    eps = 1e-9  # Guard against floating-point error at grid points
+    i_start = (0 if start is None
+               else min(max(math.floor((start - t0) / dt + eps), 0), max(n - 1, 0)))
+    i_end = n if end is None else min(max(math.floor((end - t0) / dt + eps) + 1, 0), n)
+    return slice(i_start, max(i_end, i_start))
+
+
 @dataclass
 class ChartData:
     """Jsonifiable chart data representation for a single data series."""
@@ -18,6 +48,14 @@ class ChartData:
         series = obj.iloc[:, 0] if isinstance(obj, pd.DataFrame) else obj
         return __class__(x=series.index.tolist(), y=series.values.tolist())
 
+    def window(self, start: float | None = None, end: float | None = None) -> slice:
+        """Index range covering the time window ``[start, end]`` (numeric ``x`` only)."""
+        return _explicit_window(self.x, start, end)
+
+    def x_range(self, index: slice) -> np.ndarray:
+        """The x values for an index range."""
+        return np.asarray(self.x[index])
+
 
 @dataclass
 class MultiChartData:
@@ -43,3 +81,121 @@ class MultiChartData:
             df.T.values.tolist(),
             labels=df.columns.tolist()
         )
+
+    def window(self, start: float | None = None, end: float | None = None) -> slice:
+        """Index range covering the time window ``[start, end]``."""
+        return _explicit_window(self.x, start, end)
+
+    def x_range(self, index: slice) -> np.ndarray:
+        """The x values for an index range."""
+        return np.asarray(self.x[index])
+
+
+@dataclass
+class RegularChartData:
+    """Jsonifiable chart data representation for a single time series sampled on the
+    evenly spaced grid ``x[i] = t0 + i*dt``.  Only the grid start and spacing are stored.
+    """
+    t0: float
+    dt: float
+    y: list[float]
+    ymin: list[float] | None = field(default=None, kw_only=True)
+    ymax: list[float] | None = field(default=None, kw_only=True)
+
+    @property
+    def n(self) -> int:
+        """Number of points."""
+        return len(self.y)
+
+    @property
+    def x(self) -> np.ndarray:
+        """The full x-axis, materialised.  Prefer :py:meth:`window` and :py:meth:`x_range`."""
+        return self.x_range(slice(None))
+
+    def window(self, start: float | None = None, end: float | None = None) -> slice:
+        """Index range covering the time window ``[start, end]``, in constant time."""
+        return _regular_window(self.t0, self.dt, self.n, start, end)
+
+    def x_range(self, index: slice) -> np.ndarray:
+        """The x values for an index range."""
+        return self.t0 + self.dt * np.arange(*index.indices(self.n))
+
+
+@dataclass
+class RegularMultiChartData:
+    """Jsonifiable chart data representation for multiple time series sampled on the
+    evenly spaced grid ``x[i] = t0 + i*dt``.  Only the grid start and spacing are stored.
+    """
+    t0: float
+    dt: float
+    y: list[list[float]]
+    """List of line series.  Each series is a ``list[float]``."""
+    labels: list[str] = field(kw_only=True)
+    """Legend labels for each line series."""
+    ymin: list[list[float]] | None = field(default=None, kw_only=True)
+    ymax: list[list[float]] | None = field(default=None, kw_only=True)
+
+    @property
+    def n(self) -> int:
+        """Number of points per series."""
+        return len(self.y[0]) if self.y else 0
+
+    @property
+    def x(self) -> np.ndarray:
+        """The full x-axis, materialised.  Prefer :py:meth:`window` and :py:meth:`x_range`."""
+        return self.x_range(slice(None))
+
+    def window(self, start: float | None = None, end: float | None = None) -> slice:
+        """Index range covering the time window ``[start, end]``, in constant time."""
+        return _regular_window(self.t0, self.dt, self.n, start, end)
+
+    def x_range(self, index: slice) -> np.ndarray:
+        """The x values for an index range."""
+        return self.t0 + self.dt * np.arange(*index.indices(self.n))
+
+
+def regularise(chart_data: ChartData | MultiChartData, rtol: float = 1e-6) \
+        -> ChartData | MultiChartData | RegularChartData | RegularMultiChartData:
+    """Convert chart data with an evenly spaced numeric x-axis to the equivalent regular type.
+    Returns the input unchanged if the x-axis is not evenly spaced."""
+    x = np.asarray(chart_data.x)
+    if len(x) < 2 or not np.issubdtype(x.dtype, np.number):
+        return chart_data
+    dt = float(x[1] - x[0])
+    if dt <= 0 or not np.allclose(np.diff(x), dt, rtol=rtol, atol=0):
+        return chart_data
+    if isinstance(chart_data, MultiChartData):
+        return RegularMultiChartData(
+            float(x[0]), dt, chart_data.y, labels=chart_data.labels,
+            ymin=chart_data.ymin, ymax=chart_data.ymax
+        )
+    return RegularChartData(float(x[0]), dt, chart_data.y,
+                            ymin=chart_data.ymin, ymax=chart_data.ymax)
+
+
+@dataclass
+class CumulativeDistribution:
+    """Jsonifiable compact representation of an empirical distribution, as a cumulative
+    histogram.  Used to evaluate arbitrary thresholds (e.g. TAT targets) without access to
+    the underlying samples.
+    """
+    x: list[float]
+    """Increasing bin edges, starting from the minimum possible value (typically 0)."""
+    y: list[float]
+    """Proportion of samples less than or equal to each bin edge, non-decreasing from 0 to 1."""
+
+    @staticmethod
+    def from_samples(samples, n_bins: int = 200) -> 'CumulativeDistribution':
+        """Instantiate a CumulativeDistribution from an array of samples, using ``n_bins``
+        equal-width bins from 0 to the maximum sample."""
+        samples = np.asarray(samples, dtype=float)
+        if len(samples) == 0:
+            return __class__(x=[0.0], y=[0.0])
+        edges = np.linspace(0, samples.max() or 1.0, n_bins + 1)
+        cumulative = np.searchsorted(np.sort(samples), edges, side='right')
+        return __class__(x=edges.tolist(), y=(cumulative / len(samples)).tolist())
+
+    def evaluate(self, thresholds) -> np.ndarray:
+        """Proportion of samples less than or equal to each threshold, by linear interpolation
+        between bin edges.  Vectorised over ``thresholds``."""
+        return np.interp(np.asarray(thresholds, dtype=float), self.x, self.y, left=0.0)
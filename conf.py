@@ -1,4 +1,5 @@
 """Configuration settings for the hpath app."""
+import os
 
 REDIS_HOST = 'redis'
 """Hostname for the Redis server."""
@@ -18,3 +19,202 @@ TAT_TARGET = {'7': 0.8, '10': 0.9, '12': 0.95, '21': 0.95}
 
 LAB_TAT_TARGET = {'3': 0.8}
 """Lab TAT target: proportion of specimens done in {n} days."""
+
+PROFILING_MODE = os.environ.get('HPATH_PROFILING', 'off')
+"""CPU profiling mode for selected callbacks: ``'off'`` (no profiling hooks are installed),
+``'request'`` (profile only requests carrying the :py:data:`PROFILING_HEADER` header or the
+:py:data:`PROFILING_QUERY_PARAM` query parameter), or ``'always'``."""
+
+PROFILING_HEADER = 'X-Hpath-Profile'
+"""HTTP header for requesting a profile of the callbacks triggered by a request."""
+
+PROFILING_QUERY_PARAM = 'profile'
+"""Page URL query parameter for requesting profiles, e.g. ``/hpath/view/single/1?profile=1``."""
+
+PROFILING_DIR = os.environ.get('HPATH_PROFILING_DIR', '/tmp/hpath-profiles')
+"""Directory to which profiler output is written."""
+
+PROFILING_KEEP = 100
+"""Maximum number of profiler output files to keep.  Older files are deleted."""
+
+MEMORY_PROFILING_MODE = os.environ.get('HPATH_MEMORY_PROFILING', 'off')
+"""Memory profiling mode for all callbacks, with the same values as :py:data:`PROFILING_MODE`.
+If not ``'off'``, :py:mod:`tracemalloc` is started when the app starts, allocations are
+snapshotted around each profiled callback request, and worker RSS is sampled periodically."""
+
+MEMORY_PROFILING_TOP_N = 10
+"""Number of top allocation sites (by net allocated size) recorded per callback request."""
+
+MEMORY_PROFILING_FRAMES = 5
+"""Number of stack frames stored by :py:mod:`tracemalloc` per allocation."""
+
+RSS_SAMPLE_INTERVAL_SECONDS = 10
+"""Interval between worker RSS samples when memory profiling is enabled."""
+
+MEMORY_LOG_MAX_BYTES = 5 * 1024 * 1024
+"""Maximum size of each per-worker memory log file before it is rotated."""
+
+PAYLOAD_TRACKING_MODE = os.environ.get('HPATH_PAYLOAD_TRACKING', 'off')
+"""Payload size tracking mode for all callbacks, with the same values as
+:py:data:`PROFILING_MODE` (see :py:mod:`payload`)."""
+
+PAYLOAD_BUDGETS = {
+    'scenario-result-body.children': 256 * 1024,
+    'container-res-alloc.children': 2 * 1024 * 1024,
+    'container-wip.children': 2 * 1024 * 1024,
+    'container-util-hourly.children': 2 * 1024 * 1024,
+    'lod-slot.children': 512 * 1024,
+    'lod-graph.figure': 512 * 1024,
+    'stats-wip-grid.rowData': 64 * 1024,
+    'hpath-submitter-upload-files.contents': 20 * 1024 * 1024,
+    'hpath-submitter-grid.rowData': 20 * 1024 * 1024,
+    'hpath-submitter-schedules.data': 256 * 1024,
+    'hpath-submitter-preview.children': 64 * 1024,
+}
+"""Size budgets in bytes of callback inputs and outputs, by ``'<id>.<property>'`` (or
+``'<type>.<property>'`` for pattern-matching IDs), for a 26-week simulation run.  Checked by
+``python -m payload`` for a synthetic report, and logged when exceeded at runtime."""
+
+LOG_FORMAT = os.environ.get('HPATH_LOG_FORMAT', 'json')
+"""Format of log lines: ``'json'`` (one JSON object per line) or ``'text'`` (see
+:py:mod:`logs`)."""
+
+LOG_QUEUE_SIZE = 10000
+"""Maximum number of log records waiting to be written.  Further records are dropped, so that
+logging never blocks a callback."""
+
+LOG_MAX_MESSAGE_CHARS = 1000
+"""Log messages are truncated to this length."""
+
+LOG_SAMPLE_RATES = {
+    'dash.dash.callbacks': 0.1,
+}
+"""Fraction of the log records below WARNING that are kept, by logger name (including
+child loggers)."""
+
+LOG_RATE_LIMITS = {
+    'dash.dash.status': (1, 60),
+}
+"""Maximum number of log records below WARNING per message and period in seconds, by logger
+name (including child loggers), e.g. ``(1, 60)`` for at most one per minute."""
+
+CACHE_BACKEND = os.environ.get('HPATH_CACHE_BACKEND', 'disk')
+"""Backend for the persistent result caches: ``'disk'``, ``'redis'``, or ``'off'``."""
+
+CACHE_DIR = os.environ.get('HPATH_CACHE_DIR', '/tmp/hpath-cache')
+"""Root directory of the ``'disk'`` cache backend.  Mount a volume here to persist the cache."""
+
+FIGURE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+"""Size limit of the figure cache.  Least recently used figures are evicted above this size."""
+
+FIGURE_CACHE_VERSION = 3
+"""Included in all figure and layout cache keys.  Increment when changing how figures or
+result page layouts are built."""
+
+LAYOUT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+"""Size limit of the cache of serialised scenario result page layouts.  Least recently used
+layouts are evicted above this size."""
+
+PYRAMID_CACHE_MAX_BYTES = 256 * 1024 * 1024
+"""Size limit of the cache of time series pyramids (see :py:mod:`pyramid`)."""
+
+PYRAMID_FACTOR = 4
+"""Number of bins of each pyramid level merged into one bin of the next coarser level."""
+
+PYRAMID_MAX_POINTS = 2000
+"""Maximum number of points per trace sent to the browser for time series plots.  Zooming in
+loads finer pyramid levels, down to the raw data."""
+
+SINGLEFLIGHT_LEASE_SECONDS = 15
+"""Lease time for coalesced fetches from the REST server (see :py:mod:`singleflight`).  Other
+workers wait up to this long for the lease holder's result before fetching for themselves."""
+
+SINGLEFLIGHT_POLL_SECONDS = 0.05
+"""Interval at which workers waiting for a coalesced fetch poll for its result."""
+
+SINGLEFLIGHT_RESULT_TTL_SECONDS = 5
+"""Time for which the result of a coalesced fetch is shared with other workers."""
+
+SCENARIO_LIST_TTL_SECONDS = 60
+"""Time for which the cached scenario list is served without revalidation, if all scenarios
+have completed (see :py:mod:`scenario_list`)."""
+
+SCENARIO_LIST_RUNNING_TTL_SECONDS = 5
+"""Time for which the cached scenario list is served without revalidation, if any scenario
+is still running."""
+
+SCENARIO_LIST_MAX_AGE_SECONDS = 3600
+"""Maximum age of a cached scenario list.  Older lists are not served, even while stale."""
+
+PREFETCH_WORKERS = 2
+"""Number of threads per worker for prefetching newly completed scenarios (see
+:py:mod:`prefetch`)."""
+
+PREFETCH_MAX_BATCH = 4
+"""Maximum number of scenarios prefetched per scenario list refresh, most recent first."""
+
+PREFETCH_CLAIM_SECONDS = 24 * 60 * 60
+"""Time for which a worker's claim to warm the shared caches for a scenario is kept, so that
+other workers do not repeat the work."""
+
+MIRROR_PATH = os.environ.get('HPATH_MIRROR_PATH', '/tmp/hpath-mirror/mirror.sqlite3')
+"""Path of the local SQLite mirror of the scenario index and completed results (see
+:py:mod:`mirror`).  Mount a volume here to keep the mirror across restarts."""
+
+PURGE_REQUEST_TIMEOUT_SECONDS = 60
+"""Timeout of each deletion request sent to the REST server when purging scenarios (see
+:py:mod:`purge`).  Clearing the whole database is a single request, so allow it some time."""
+
+RETENTION_MAX_AGE_DAYS = (float(os.environ['HPATH_RETENTION_MAX_AGE_DAYS'])
+                          if 'HPATH_RETENTION_MAX_AGE_DAYS' in os.environ else None)
+"""Completed scenarios are purged automatically this many days after completion.  None (the
+default, if ``HPATH_RETENTION_MAX_AGE_DAYS`` is unset) keeps scenarios indefinitely."""
+
+RETENTION_MAX_SCENARIOS = (int(os.environ['HPATH_RETENTION_MAX_SCENARIOS'])
+                           if 'HPATH_RETENTION_MAX_SCENARIOS' in os.environ else None)
+"""Only this many of the most recently completed scenarios are kept; older ones are purged
+automatically.  None (the default) sets no limit."""
+
+RETENTION_INTERVAL_SECONDS = 60 * 60
+"""Minimum interval between automatic applications of the retention policy."""
+
+RUNTIME_MIN_RUNS = 5
+"""Number of completed runs needed before run times are estimated at submission (see
+:py:mod:`runtime_model`)."""
+
+RUNTIME_FORGETTING_FACTOR = 0.98
+"""Weight of the previously observed runs in the run time model each time a run is added,
+so that the estimates follow changes in the simulation workers.  1 weighs all runs equally."""
+
+RUNTIME_MATCH_WINDOW_SECONDS = 300
+"""Maximum difference between the submission time recorded by the webapp and the creation time
+reported by the REST server, for a completed scenario to be matched with its submission."""
+
+RUNTIME_SUBMISSION_MAX_AGE_DAYS = 30
+"""Recorded submissions not matched with a completed scenario within this many days (e.g.
+failed runs) are dropped."""
+
+RQ_KEY_PREFIX = 'rq:'
+"""Prefix of the Redis keys of the RQ job queue used by the simulation workers (see
+:py:mod:`jobqueue`)."""
+
+QUEUE_MONITOR_INTERVAL_SECONDS = 10
+"""Refresh interval of the job queue monitor page, and interval between queue samples for its
+throughput series (taken in the background, whether or not the page is open)."""
+
+QUEUE_MONITOR_HISTORY = 360
+"""Number of queue samples kept for the throughput series (an hour at the default interval)."""
+
+BACKGROUND_CALLBACK_DIR = os.environ.get('HPATH_BACKGROUND_CALLBACK_DIR',
+                                         '/tmp/hpath-callbacks')
+"""Directory for the diskcache-based queue of Dash background callbacks."""
+
+REPORT_CACHE_SIZE = 16
+"""Number of parsed scenario reports kept in memory per worker."""
+
+ARRIVAL_PREVIEW_CACHE_SIZE = 32
+"""Number of parsed arrival schedules of uploaded configuration files kept in memory per
+worker, for the preview on the submit page."""
+
+EXPORT_CHUNK_ROWS = 10000
+"""Number of rows per chunk (and per Parquet row group) in streamed report exports."""
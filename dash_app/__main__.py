@@ -1,11 +1,17 @@
 """Main module for the webapp frontend."""
-import logging
-
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html
+import diskcache
+from dash import DiskcacheManager, dcc, html
 from dash_compose import composition
 
+import export
+import jobqueue
+import logs
+import payload
+import profiling
+from conf import BACKGROUND_CALLBACK_DIR
+
 app = dash.Dash(
     __name__,
     use_pages=True,
@@ -14,8 +20,15 @@ app = dash.Dash(
         dbc.icons.FONT_AWESOME
     ],
     suppress_callback_exceptions=True,
-    pages_folder='../pages'
+    pages_folder='../pages',
+    background_callback_manager=DiskcacheManager(diskcache.Cache(BACKGROUND_CALLBACK_DIR))
 )
+profiling.register_memory_hooks(app.server)
+payload.register_hooks(app.server)
+logs.configure(app.logger)  # At import, so that WSGI servers get the configured handlers too
+logs.register_hooks(app.server)
+jobqueue.register_hooks(app.server)
+app.server.register_blueprint(export.blueprint)
 
 nav_dropdown_style = {'in_navbar': True, 'nav': True, 'align_end': True}
 
@@ -85,16 +98,6 @@ app.layout = dbc.Container(
 )
 
 if __name__ == '__main__':
-    # Example output:
-    # app       20396   Sep 27 22:35:12.127 <message body>
-    FORMAT = "%(process)5d   %(asctime)s.%(msecs)03d %(message)s"
-    DATE_FORMAT = '%b %d %H:%M:%S'
-
-    formatter = logging.Formatter(fmt=FORMAT, datefmt=DATE_FORMAT)
-    handler = logging.StreamHandler()
-    handler.setFormatter(formatter)
-    app.logger.handlers = [handler]
-
     app.logger.info("")
     app.logger.info("")
     app.logger.info("================================================")
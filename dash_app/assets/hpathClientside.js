@@ -0,0 +1,64 @@
+/* Clientside callbacks for the histopathology pages.
+
+These handle pure UI state (enabling inputs, opening and closing dialogs), so that typing
+and clicking cost no server requests.  They are registered with
+dash.clientside_callback(ClientsideFunction('hpath', <name>), ...) in the page modules. */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    hpath: {
+        /* Enable the analysis name input only for multi-scenario analyses, require a name
+        for those, and colour the submit button by whether all inputs are valid. */
+        inputStates: function (rowData, nameValue, simLengthValue) {
+            const nRows = (rowData || []).length;
+            const missingAnalysisName = nRows > 1 && (nameValue === '' || nameValue == null);
+            // Number() rejects trailing junk, like Python's float()
+            const simLength = (simLengthValue == null || simLengthValue === '')
+                ? NaN : Number(simLengthValue);
+            const canSubmit = nRows > 0 && !missingAnalysisName && simLength > 0;
+            return [nRows < 2, missingAnalysisName, canSubmit ? 'success' : 'secondary'];
+        },
+
+        /* Reduce the selected rows of the scenarios grid to the content digest and names of
+        the first one, for the arrival schedules preview, so that selecting rows never sends
+        their files to the server.  Unchanged keys are not updated. */
+        previewKey: function (selectedRows, current) {
+            const row = (selectedRows || [])[0];
+            const key = row
+                ? {digest: row.digest, sc_name: row.sc_name, file_name: row.file_name}
+                : null;
+            if (JSON.stringify(key) === JSON.stringify(current === undefined ? null : current)) {
+                return window.dash_clientside.no_update;
+            }
+            return key;
+        },
+
+        /* Delete the selected rows of the scenarios grid. */
+        deleteSelectedRows: function () {
+            return true;
+        },
+
+        /* Disable a button while a component (e.g. a progress bar) is shown.  The button is
+        left as it is when the component is hidden. */
+        disableWhileShown: function (style) {
+            if (style && style.display === 'none') {
+                return window.dash_clientside.no_update;
+            }
+            return true;
+        },
+
+        /* Close the dialog for submission-related messages. */
+        closeModal: function () {
+            return false;
+        },
+
+        /* Open the clear-database confirmation dialog, or close it on cancel/close.  The
+        deletion itself is handled by a server-side callback. */
+        clearDbModal: function () {
+            const hidden = {display: 'none'};
+            const triggered = window.dash_clientside.callback_context.triggered_id;
+            if (triggered === 'clear-db') {
+                return [true, 'Danger!', {}, [], {}, {}, hidden];
+            }
+            return [false, 'Danger!', {}, [], hidden, hidden, hidden];
+        }
+    }
+});
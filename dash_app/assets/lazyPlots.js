@@ -0,0 +1,62 @@
+/* Viewport virtualisation of time series plots on the scenario results page.
+
+Each placeholder with class "lod-slot" names, in its data-visible-store attribute, a
+dcc.Store whose data is set to true when the placeholder comes near the viewport and to
+false when it is far out of view.  The mount_plot callback mounts or unmounts the plot
+accordingly. */
+(function () {
+    const MOUNT_MARGIN = '300px 0px';  // Mount slightly before scrolling into view
+    const UNMOUNT_MARGIN = '2000px 0px';  // Unmount only when far away, to avoid churn
+
+    function setVisible(slot, visible) {
+        if (!document.contains(slot)) {
+            mountObserver.unobserve(slot);
+            unmountObserver.unobserve(slot);
+            return;
+        }
+        if (slot.dataset.visible === String(visible)) {
+            return;
+        }
+        slot.dataset.visible = String(visible);
+        window.dash_clientside.set_props(
+            JSON.parse(slot.dataset.visibleStore), {data: visible}
+        );
+    }
+
+    const mountObserver = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                setVisible(entry.target, true);
+            }
+        });
+    }, {rootMargin: MOUNT_MARGIN});
+
+    const unmountObserver = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (!entry.isIntersecting) {
+                setVisible(entry.target, false);
+            }
+        });
+    }, {rootMargin: UNMOUNT_MARGIN});
+
+    function observeSlots() {
+        document.querySelectorAll('.lod-slot:not([data-observed])').forEach(function (slot) {
+            slot.dataset.observed = 'true';
+            slot.dataset.visible = 'false';
+            mountObserver.observe(slot);
+            unmountObserver.observe(slot);
+        });
+    }
+
+    function start() {
+        // Placeholders are rendered by callbacks, so watch for them being added
+        new MutationObserver(observeSlots).observe(document.body, {childList: true, subtree: true});
+        observeSlots();
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', start);
+    } else {
+        start();
+    }
+})();
@@ -0,0 +1,189 @@
+"""Streaming download endpoints for simulation reports.
+
+Time series are exported in long form (one row per series and time point) as CSV or
+Parquet, and the scalar KPIs as JSON.  Rows are generated in chunks of
+:py:data:`conf.EXPORT_CHUNK_ROWS` directly from the cached report, so memory use does not
+grow with the length of the simulation.
+"""
+import csv
+import io
+import json
+from http import HTTPStatus
+from itertools import islice, repeat
+from typing import Iterable, Iterator
+
+import flask
+import pydantic as pyd
+import requests
+
+import kpis
+import reports
+from conf import EXPORT_CHUNK_ROWS
+
+blueprint = flask.Blueprint('hpath_export', __name__, url_prefix='/hpath/export')
+"""Flask blueprint for the export endpoints.  Register with the Dash app's Flask server."""
+
+SERIES_COLUMNS = {
+    'resource_allocation': ('resource', 'time_hours', 'allocated'),
+    'wip_by_stage': ('stage', 'time_hours', 'wip'),
+    'hourly_utilization_by_resource': ('resource', 'time_hours', 'busy'),
+}
+"""Exportable time series of :py:class:`kpis.Report` and their long-form column names."""
+
+SCALAR_KPIS = [
+    'overall_tat', 'lab_tat', 'progress', 'lab_progress',
+    'overall_tat_min', 'overall_tat_max', 'lab_tat_min', 'lab_tat_max',
+    'progress_min', 'progress_max', 'lab_progress_min', 'lab_progress_max',
+]
+"""Fields of :py:class:`kpis.Report` included in the KPI JSON export."""
+
+
+def export_url(scenario_id: int, name: str) -> str:
+    """URL of an export file, e.g. ``export_url(1, 'wip_by_stage.csv')``."""
+    return f'{blueprint.url_prefix}/{scenario_id}/{name}'
+
+
+def long_form_rows(report: kpis.Report, series: str,
+                   start: float | None = None, end: float | None = None) \
+        -> Iterator[tuple[str, float, float]]:
+    """Iterate over the rows of a time series of the report in long form,
+    i.e. ``(label, time, value)``, optionally restricted to the time window ``[start, end]``.
+
+    The x values are generated per chunk via ``x_range()``, so regular-grid series never
+    materialise their full x-axis.
+    """
+    if series == 'resource_allocation':
+        labelled = [
+            (label, chart_data, chart_data.y)
+            for label, chart_data in report.resource_allocation.items()
+        ]
+    else:
+        multi_chart_data = getattr(report, series)
+        labelled = [
+            (label, multi_chart_data, y_series)
+            for label, y_series in zip(multi_chart_data.labels, multi_chart_data.y)
+        ]
+
+    for label, chart_data, y_series in labelled:
+        window = chart_data.window(start, end)
+        for i in range(window.start, window.stop, EXPORT_CHUNK_ROWS):
+            index = slice(i, min(i + EXPORT_CHUNK_ROWS, window.stop))
+            yield from zip(
+                repeat(label),
+                chart_data.x_range(index).tolist(),
+                y_series[index]
+            )
+
+
+def chunked(rows: Iterable, size: int = EXPORT_CHUNK_ROWS) -> Iterator[list]:
+    """Split an iterable into lists of at most ``size`` items."""
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def csv_chunks(rows: Iterable, columns: tuple[str, ...]) -> Iterator[str]:
+    """Generate CSV text in chunks."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in chunked(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()  # Header only, if there were no rows
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be drained after each Parquet row group."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        """Return and forget everything written since the last call."""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_chunks(rows: Iterable, columns: tuple[str, ...]) -> Iterator[bytes]:
+    """Generate a Parquet file in chunks, with one row group per chunk of rows."""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+    schema = pa.schema([(columns[0], pa.string()), (columns[1], pa.float64()),
+                        (columns[2], pa.float64())])
+    sink = _DrainableSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunked(rows):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col) for col in zip(*chunk)], schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()  # Footer
+
+
+def _get_report_or_abort(scenario_id: int) -> kpis.Report:
+    try:
+        return reports.get_report(scenario_id)[1]
+    except (requests.RequestException, pyd.ValidationError, LookupError, KeyError):
+        flask.abort(HTTPStatus.NOT_FOUND)
+
+
+@blueprint.route('/<int:scenario_id>/kpis.json')
+def export_kpis(scenario_id: int):
+    """Scalar KPIs of a scenario, plus the per-stage and per-resource bar chart data."""
+    report = _get_report_or_abort(scenario_id)
+    data = report.model_dump(include=set(SCALAR_KPIS))
+    for name in ['tat_by_stage', 'utilization_by_resource', 'q_length_by_resource']:
+        chart_data = getattr(report, name)
+        data[name] = dict(zip(chart_data.x, chart_data.y))
+    return flask.Response(
+        json.dumps(data, indent=2),
+        mimetype='application/json',
+        headers={'Content-Disposition': f'attachment; filename=scenario-{scenario_id}-kpis.json'}
+    )
+
+
+@blueprint.route('/<int:scenario_id>/<series>.<fmt>')
+def export_series(scenario_id: int, series: str, fmt: str):
+    """A time series of a scenario in long form, as CSV or Parquet.  The optional ``start``
+    and ``end`` query parameters (in hours) restrict the export to a time window."""
+    if series not in SERIES_COLUMNS or fmt not in ['csv', 'parquet']:
+        flask.abort(HTTPStatus.NOT_FOUND)
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # pylint: disable=import-outside-toplevel,unused-import
+        except ImportError:
+            flask.abort(HTTPStatus.NOT_IMPLEMENTED, 'Parquet export requires pyarrow.')
+
+    report = _get_report_or_abort(scenario_id)
+    rows = long_form_rows(
+        report, series,
+        start=flask.request.args.get('start', type=float),
+        end=flask.request.args.get('end', type=float)
+    )
+    chunks = (csv_chunks if fmt == 'csv' else parquet_chunks)(rows, SERIES_COLUMNS[series])
+    return flask.Response(
+        flask.stream_with_context(chunks),
+        mimetype='text/csv' if fmt == 'csv' else 'application/vnd.apache.parquet',
+        headers={
+            'Content-Disposition':
+                f'attachment; filename=scenario-{scenario_id}-{series}.{fmt}'
+        }
+    )
@@ -0,0 +1,241 @@
+"""Monitoring of the simulation job queue and worker pool, read directly from Redis.
+
+Simulation jobs are queued with `RQ <https://python-rq.org>`_ on the Redis server at
+:py:data:`conf.REDIS_HOST`, so the queue state is read from RQ's keys (under
+:py:data:`conf.RQ_KEY_PREFIX`):
+
+- ``queues`` and ``workers``: sets of the queue and worker keys;
+- ``queue:<name>``: list of queued job IDs, oldest first;
+- ``wip:<name>`` and ``failed:<name>``: sorted sets of started and failed job IDs;
+- ``worker:<name>``: hash with the worker's state, current job and job counters;
+- ``job:<id>``: hash with the job's ``enqueued_at`` and ``started_at`` times.
+
+A :py:func:`snapshot` costs three pipelined round trips to Redis, however many queues and
+workers there are, and is shared by all callbacks in a worker for half of
+:py:data:`conf.QUEUE_MONITOR_INTERVAL_SECONDS`.  Once per interval (across all workers, by a
+Redis claim), a background thread appends the queue depth and job counters to a history kept
+in Redis, from which throughput is derived.  The sampler threads are started by the first
+request to each worker (see :py:func:`register_hooks`), so the history covers the time the
+job queue page was not open, but not the time the app was not serving at all.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any
+
+import flask
+from redis import Redis
+from redis.exceptions import RedisError
+
+from conf import QUEUE_MONITOR_HISTORY, QUEUE_MONITOR_INTERVAL_SECONDS, RQ_KEY_PREFIX
+from redis_conn import REDIS_CONN
+
+HISTORY_KEY = 'hpath:jobqueue:history'
+"""Redis key of the list of queue samples, newest first."""
+
+SAMPLE_CLAIM_KEY = 'hpath:jobqueue:sample'
+"""Redis key held for :py:data:`conf.QUEUE_MONITOR_INTERVAL_SECONDS` by the worker that took
+the last queue sample."""
+
+WORKER_FIELDS = ['state', 'queues', 'current_job', 'successful_job_count', 'failed_job_count',
+                 'total_working_time', 'birth', 'last_heartbeat']
+"""Fields read from each RQ worker hash."""
+
+_cached: tuple[float, dict[str, Any]] | None = None
+_cached_lock = threading.Lock()
+_sampler_pid: int | None = None
+
+
+def _str(value: bytes | None) -> str | None:
+    return None if value is None else value.decode()
+
+
+def _float(value: bytes | None) -> float:
+    return 0.0 if value is None else float(value)
+
+
+def _age(timestamp: bytes | None, now: float) -> float | None:
+    """Seconds elapsed since an RQ timestamp (ISO 8601 in UTC, e.g.
+    ``2024-01-02T03:04:05.123456Z``), or None if missing or invalid."""
+    if not timestamp:
+        return None
+    try:
+        return now - datetime.fromisoformat(timestamp.decode().replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _read(conn: Redis, now: float, record: bool = False) -> dict[str, Any]:
+    """Read the queue state from Redis in three pipelined round trips, appending a sample to
+    the history if ``record`` is true."""
+    pipe = conn.pipeline(transaction=False)
+    pipe.smembers(f'{RQ_KEY_PREFIX}queues')
+    pipe.smembers(f'{RQ_KEY_PREFIX}workers')
+    pipe.lrange(HISTORY_KEY, 0, QUEUE_MONITOR_HISTORY - 1)
+    queue_keys, worker_keys, history = pipe.execute()
+    queues = sorted(key.decode().removeprefix(f'{RQ_KEY_PREFIX}queue:') for key in queue_keys)
+    workers = sorted(key.decode().removeprefix(f'{RQ_KEY_PREFIX}worker:') for key in worker_keys)
+
+    for name in queues:
+        pipe.llen(f'{RQ_KEY_PREFIX}queue:{name}')
+        pipe.lindex(f'{RQ_KEY_PREFIX}queue:{name}', 0)
+        pipe.zcard(f'{RQ_KEY_PREFIX}wip:{name}')
+        pipe.zcard(f'{RQ_KEY_PREFIX}failed:{name}')
+    for name in workers:
+        pipe.hmget(f'{RQ_KEY_PREFIX}worker:{name}', WORKER_FIELDS)
+    results = pipe.execute()
+    queue_results = [results[4*i:4*i + 4] for i in range(len(queues))]
+    worker_results = [dict(zip(WORKER_FIELDS, values)) for values in results[4*len(queues):]]
+
+    # Enqueue times of the oldest queued jobs, start times of the running jobs
+    for _, oldest, _, _ in queue_results:
+        pipe.hget(f'{RQ_KEY_PREFIX}job:{_str(oldest)}', 'enqueued_at')
+    for worker in worker_results:
+        pipe.hget(f'{RQ_KEY_PREFIX}job:{_str(worker["current_job"])}', 'started_at')
+    sample = {
+        'time': now,
+        'queued': sum(queued for queued, _, _, _ in queue_results),
+        'in_flight': sum(in_flight for _, _, in_flight, _ in queue_results),
+        'successful': {
+            name: int(_float(worker['successful_job_count']))
+            for name, worker in zip(workers, worker_results)
+        },
+    }
+    if record:
+        pipe.lpush(HISTORY_KEY, json.dumps(sample))
+        pipe.ltrim(HISTORY_KEY, 0, QUEUE_MONITOR_HISTORY - 1)
+    results = pipe.execute()
+    enqueued_at, started_at = results[:len(queues)], results[len(queues):len(queues) + len(workers)]
+
+    history = [json.loads(entry) for entry in reversed(history)]
+    if record:
+        history = [*history, sample][-QUEUE_MONITOR_HISTORY:]
+    return {
+        'time': now,
+        'queues': [
+            {
+                'queue': name,
+                'queued': queued,
+                'in_flight': in_flight,
+                'failed': failed,
+                'oldest_age': _age(enqueued, now) if oldest is not None else None,
+            }
+            for name, (queued, oldest, in_flight, failed), enqueued
+            in zip(queues, queue_results, enqueued_at)
+        ],
+        'workers': [
+            {
+                'worker': name,
+                'state': _str(worker['state']),
+                'queues': _str(worker['queues']),
+                'current_job': _str(worker['current_job']),
+                'job_age': _age(started, now) if worker['current_job'] else None,
+                'successful': int(_float(worker['successful_job_count'])),
+                'failed': int(_float(worker['failed_job_count'])),
+                'utilisation': _utilisation(worker, now),
+                'heartbeat_age': _age(worker['last_heartbeat'], now),
+                'jobs_per_hour': worker_throughput(history, name),
+            }
+            for name, worker, started in zip(workers, worker_results, started_at)
+        ],
+        'history': history,
+    }
+
+
+def _utilisation(worker: dict[str, bytes | None], now: float) -> float | None:
+    """Fraction of its lifetime that a worker has spent working on jobs."""
+    lifetime = _age(worker['birth'], now)
+    if not lifetime or lifetime <= 0:
+        return None
+    return min(_float(worker['total_working_time']) / lifetime, 1.0)
+
+
+def worker_throughput(history: list[dict[str, Any]], worker: str) -> float | None:
+    """Jobs completed per hour by a worker over the sample history, or None if the worker
+    appears in fewer than two samples.  Counter resets (worker restarts) count as zero."""
+    samples = [(val['time'], val['successful'][worker])
+               for val in history if worker in val['successful']]
+    if len(samples) < 2 or samples[-1][0] <= samples[0][0]:
+        return None
+    completed = sum(max(b - a, 0) for (_, a), (_, b) in zip(samples, samples[1:]))
+    return 3600 * completed / (samples[-1][0] - samples[0][0])
+
+
+def throughput_series(history: list[dict[str, Any]]) -> list[dict[str, float | None]]:
+    """Jobs completed per hour by all workers between consecutive samples, with the queue
+    depth and number of jobs in flight at each sample.  Where samples are more than twice the
+    sampling interval apart (e.g. no worker was running), a point with no values is inserted,
+    so that plotted lines show the gap, and no rate is given across it."""
+    series = []
+    for prev, cur in zip(history, history[1:]):
+        elapsed = cur['time'] - prev['time']
+        if elapsed <= 0:
+            continue
+        if elapsed > 2 * QUEUE_MONITOR_INTERVAL_SECONDS:
+            series.append({'time': prev['time'] + elapsed / 2, 'jobs_per_hour': None,
+                           'queued': None, 'in_flight': None})
+            series.append({'time': cur['time'], 'jobs_per_hour': None,
+                           'queued': cur['queued'], 'in_flight': cur['in_flight']})
+            continue
+        completed = sum(
+            max(count - prev['successful'][name], 0)
+            for name, count in cur['successful'].items() if name in prev['successful']
+        )
+        series.append({
+            'time': cur['time'],
+            'jobs_per_hour': 3600 * completed / elapsed,
+            'queued': cur['queued'],
+            'in_flight': cur['in_flight'],
+        })
+    return series
+
+
+def snapshot() -> dict[str, Any]:
+    """Return the current state of the job queues and workers, and the sample history.  The
+    result is shared by all callers in this worker for half the refresh interval.
+
+    Raises:
+        redis.exceptions.RedisError: Redis is unavailable.
+    """
+    global _cached  # pylint: disable=global-statement
+    now = time.time()
+    with _cached_lock:
+        if _cached is not None and now - _cached[0] < QUEUE_MONITOR_INTERVAL_SECONDS / 2:
+            return _cached[1]
+    state = _read(REDIS_CONN, now)
+    with _cached_lock:
+        _cached = (now, state)
+    return state
+
+
+def _sample() -> None:
+    """Append a queue sample to the history every interval, unless another worker has
+    claimed the interval.  The sample also refreshes this worker's snapshot."""
+    global _cached  # pylint: disable=global-statement
+    while True:
+        now = time.time()
+        try:
+            if REDIS_CONN.set(SAMPLE_CLAIM_KEY, os.getpid(), nx=True,
+                              ex=QUEUE_MONITOR_INTERVAL_SECONDS):
+                state = _read(REDIS_CONN, now, record=True)
+                with _cached_lock:
+                    _cached = (now, state)
+        except RedisError as exc:
+            logging.getLogger('dash.dash').error('Job queue not sampled: %s', exc)
+        time.sleep(QUEUE_MONITOR_INTERVAL_SECONDS)
+
+
+def _before_request() -> None:
+    global _sampler_pid  # pylint: disable=global-statement
+    if _sampler_pid != os.getpid():
+        _sampler_pid = os.getpid()
+        threading.Thread(target=_sample, name='queue-sampler', daemon=True).start()
+
+
+def register_hooks(server: flask.Flask) -> None:
+    """Start the queue sampler thread of each worker on its first request to the Flask
+    server."""
+    server.before_request(_before_request)
@@ -5,7 +5,8 @@ Keep this module synced with kpis.py in `hpath-sim`.
 from typing_extensions import TypedDict
 
 import pydantic as pyd
-from chart_datatypes import ChartData, MultiChartData
+from chart_datatypes import (ChartData, CumulativeDistribution, MultiChartData,
+                             RegularChartData, RegularMultiChartData)
 
 Progress = TypedDict('Progress', {
     '7': float,
@@ -29,11 +30,11 @@ class Report(pyd.BaseModel):
     progress: Progress
     lab_progress: LabProgress
     tat_by_stage: ChartData
-    resource_allocation: dict[str, ChartData]  # ChartData for each resource
-    wip_by_stage: MultiChartData
+    resource_allocation: dict[str, ChartData | RegularChartData]  # Chart data for each resource
+    wip_by_stage: MultiChartData | RegularMultiChartData
     utilization_by_resource: ChartData
     q_length_by_resource: ChartData
-    hourly_utilization_by_resource: MultiChartData
+    hourly_utilization_by_resource: MultiChartData | RegularMultiChartData
 
     overall_tat_min: float | None = pyd.Field(default=None)
     overall_tat_max: float | None = pyd.Field(default=None)
@@ -43,3 +44,10 @@ class Report(pyd.BaseModel):
     progress_max: Progress | None = pyd.Field(default=None)
     lab_progress_min: LabProgress | None = pyd.Field(default=None)
     lab_progress_max: LabProgress | None = pyd.Field(default=None)
+
+    tat_distribution: CumulativeDistribution | None = pyd.Field(default=None)
+    """Cumulative distribution of overall TAT (hours), for evaluating arbitrary TAT targets.
+    Absent in reports from older simulator versions."""
+    lab_tat_distribution: CumulativeDistribution | None = pyd.Field(default=None)
+    """Cumulative distribution of lab TAT (hours), for evaluating arbitrary lab TAT targets.
+    Absent in reports from older simulator versions."""
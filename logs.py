@@ -0,0 +1,227 @@
+"""Non-blocking, structured logging for the webapp.
+
+:py:func:`configure` replaces the handlers of the app's logger with a queue: callbacks only
+filter and enqueue log records, and a listener thread per worker formats and writes them, as
+JSON lines (or as text, see :py:data:`conf.LOG_FORMAT`).  If the queue is full, records are
+dropped rather than blocking the caller.  Log messages are formatted on the listener thread,
+so avoid logging objects that are modified right after the call.
+
+Before a record is enqueued:
+
+- records from loggers in :py:data:`conf.LOG_SAMPLE_RATES` are sampled;
+- records from loggers in :py:data:`conf.LOG_RATE_LIMITS` are rate limited per message;
+- the current callback and scenario ID are attached (see :py:func:`register_hooks`).
+
+Warnings and errors are never sampled or rate limited.  Messages longer than
+:py:data:`conf.LOG_MAX_MESSAGE_CHARS` are truncated, to keep bulky payloads out of the logs.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+import flask
+
+from conf import (LOG_FORMAT, LOG_MAX_MESSAGE_CHARS, LOG_QUEUE_SIZE, LOG_RATE_LIMITS,
+                  LOG_SAMPLE_RATES)
+
+TEXT_FORMAT = '%(process)5d   %(asctime)s.%(msecs)03d %(message)s'
+"""Format of text log lines, e.g. ``20396   Sep 27 22:35:12.127 <message body>``."""
+
+TEXT_DATE_FORMAT = '%b %d %H:%M:%S'
+
+CONTEXT_FIELDS = ('callback', 'duration_ms', 'scenario_id')
+"""Record attributes included in JSON log lines if set, e.g. with ``extra=``."""
+
+_callback: contextvars.ContextVar[str | None] = contextvars.ContextVar('callback', default=None)
+_scenario_id: contextvars.ContextVar = contextvars.ContextVar('scenario_id', default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'message': _truncate(record.getMessage()),
+        }
+        entry.update({
+            name: getattr(record, name) for name in CONTEXT_FIELDS
+            if getattr(record, name, None) is not None
+        })
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formats records as text lines, truncating long messages."""
+
+    def __init__(self):
+        super().__init__(fmt=TEXT_FORMAT, datefmt=TEXT_DATE_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = _truncate(record.message)
+        return super().formatMessage(record)
+
+
+def _truncate(message: str) -> str:
+    if len(message) <= LOG_MAX_MESSAGE_CHARS:
+        return message
+    return (f'{message[:LOG_MAX_MESSAGE_CHARS]}... '
+            f'({len(message) - LOG_MAX_MESSAGE_CHARS} characters truncated)')
+
+
+class SamplingFilter(logging.Filter):
+    """Passes each record below WARNING from the configured loggers (and their children)
+    with the configured probability."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = _lookup(LOG_SAMPLE_RATES, record.name)
+        return rate is None or random.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """Passes at most ``n`` records below WARNING per message template and ``period``
+    seconds from each configured logger (and its children).  The next record passed after
+    some were suppressed notes how many."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._windows: dict[tuple[str, str], tuple[float, int, int]] = {}
+        """(start of window, records passed, records suppressed) by logger and message."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        limit = _lookup(LOG_RATE_LIMITS, record.name)
+        if limit is None:
+            return True
+        n, period = limit
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            start, passed, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= period:
+                start, passed = now, 0
+            if passed >= n:
+                self._windows[key] = (start, passed, suppressed + 1)
+                return False
+            self._windows[key] = (start, passed + 1, 0)
+        if suppressed:
+            record.msg = f'{record.msg} ({suppressed} similar messages suppressed)'
+        return True
+
+
+def _lookup(config: dict, name: str):
+    """Value for the logger ``name`` or its nearest configured ancestor, or None."""
+    while name:
+        if name in config:
+            return config[name]
+        name = name.rpartition('.')[0]
+    return None
+
+
+class ContextFilter(logging.Filter):
+    """Attaches the current callback and scenario ID to records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'callback', None) is None:
+            record.callback = _callback.get()
+        if getattr(record, 'scenario_id', None) is None:
+            record.scenario_id = _scenario_id.get()
+        return True
+
+
+class AsyncHandler(QueueHandler):
+    """Enqueues records for a listener thread, which writes them with ``handler``.  A new
+    queue and listener are created in each worker process, as threads do not survive a
+    fork."""
+
+    def __init__(self, handler: logging.Handler):
+        super().__init__(queue.Queue(LOG_QUEUE_SIZE))
+        self.handler = handler
+        self.dropped = 0
+        self._pid: int | None = None
+        self._pid_lock = threading.Lock()
+        self._listener: QueueListener | None = None
+
+    def _ensure_listener(self) -> None:
+        with self._pid_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(LOG_QUEUE_SIZE)
+            self._listener = QueueListener(self.queue, self.handler)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Only render the traceback, if any; the message is formatted by the listener."""
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # Never block the caller
+
+
+def configure(logger: logging.Logger) -> AsyncHandler:
+    """Replace the handlers of ``logger`` (the app's logger) with an :py:class:`AsyncHandler`
+    writing to stderr in the configured format."""
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+    handler = AsyncHandler(stream_handler)
+    for log_filter in [SamplingFilter(), RateLimitFilter(), ContextFilter()]:
+        handler.addFilter(log_filter)
+    logger.handlers = [handler]
+    return handler
+
+
+def register_hooks(server: flask.Flask) -> None:
+    """Set the logging context for each Dash callback request on the Flask server, and log
+    the callback and its duration (to the ``dash.dash.callbacks`` logger) when it returns."""
+    server.before_request(_before_request)
+    server.after_request(_after_request)
+
+
+def _before_request() -> None:
+    if not flask.request.path.endswith('_dash-update-component'):
+        return
+    body = flask.request.get_json(silent=True) or {}
+    flask.g.log_start = time.perf_counter()
+    flask.g.log_tokens = (
+        _callback.set(body.get('output')),
+        _scenario_id.set(next(
+            (item.get('value') for item in [*body.get('inputs', []), *body.get('state', [])]
+             if isinstance(item, dict) and item.get('id') == 'scenario-id'),
+            None
+        ))
+    )
+
+
+def _after_request(response: flask.Response) -> flask.Response:
+    if 'log_start' in flask.g:
+        logging.getLogger('dash.dash.callbacks').info(
+            'Callback returned %s', response.status_code,
+            extra={'duration_ms': round(1000 * (time.perf_counter() - flask.g.log_start), 1)}
+        )
+        callback_token, scenario_token = flask.g.log_tokens
+        _callback.reset(callback_token)
+        _scenario_id.reset(scenario_token)
+    return response
@@ -0,0 +1,215 @@
+"""Local SQLite mirror of the scenario index and completed scenario results.
+
+Results of completed scenarios never change, so they are served from the mirror first and
+only fetched from the REST server if missing (see :py:func:`reports.fetch_results`).  The
+scenario index is written on every successful fetch of the scenario list and serves as a
+fallback when the REST server is unavailable (see :py:mod:`scenario_list`).  The mirror is
+kept up to date in the background by the scenario list refresher and by :py:mod:`prefetch`,
+which fetches the results of newly completed scenarios.
+
+The mirror also holds a compact KPI summary of each completed scenario (see
+:py:func:`reports.kpi_summary`), so that KPIs can be listed without loading full reports.
+
+The database lives at :py:data:`conf.MIRROR_PATH`; mount a volume there to keep it across
+restarts.  Each thread uses its own connection, and the database is in WAL mode so that
+workers can read while another writes.
+"""
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any
+
+from conf import MIRROR_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    scenario_id INTEGER PRIMARY KEY,
+    analysis_id INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scenarios_analysis_id ON scenarios (analysis_id);
+CREATE TABLE IF NOT EXISTS results (
+    scenario_id INTEGER PRIMARY KEY,
+    analysis_id INTEGER,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_analysis_id ON results (analysis_id);
+CREATE TABLE IF NOT EXISTS kpis (
+    scenario_id INTEGER PRIMARY KEY,
+    analysis_id INTEGER,
+    overall_tat REAL,
+    lab_tat REAL,
+    peak_util REAL,
+    mean_util REAL,
+    progress TEXT
+);
+CREATE INDEX IF NOT EXISTS kpis_analysis_id ON kpis (analysis_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    submitted REAL NOT NULL,
+    analysis_name TEXT,
+    scenario_name TEXT,
+    features TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_scenario_name ON submissions (scenario_name);
+CREATE TABLE IF NOT EXISTS runtimes (
+    scenario_id INTEGER PRIMARY KEY,
+    features TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runtime_model (
+    id INTEGER PRIMARY KEY,
+    n INTEGER NOT NULL,
+    xtx TEXT NOT NULL,
+    xty TEXT NOT NULL
+);
+"""
+"""Database schema.  Rows hold the REST server's JSON (zlib-compressed for results).  The
+``submissions``, ``runtimes`` and ``runtime_model`` tables belong to :py:mod:`runtime_model`
+and are kept when scenarios are deleted, as a history of run times."""
+
+_local = threading.local()
+
+
+def connect() -> sqlite3.Connection:
+    """Return this thread's connection to the mirror, creating the database if needed."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'pid', None) != os.getpid():
+        os.makedirs(os.path.dirname(MIRROR_PATH), exist_ok=True)
+        conn = sqlite3.connect(MIRROR_PATH, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+def put_scenarios(scenarios: list[dict]) -> None:
+    """Replace the scenario index with the scenario list returned by the REST server."""
+    conn = connect()
+    with conn:
+        conn.execute('DELETE FROM scenarios')
+        conn.executemany(
+            'INSERT INTO scenarios (scenario_id, analysis_id, data) VALUES (?, ?, ?)',
+            [(val['scenario_id'], val.get('analysis_id'), json.dumps(val)) for val in scenarios]
+        )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scenarios_synced', "
+                     "strftime('%s', 'now'))")
+
+
+def scenarios_synced() -> float | None:
+    """Return the time at which the scenario index was last replaced, or None if the list has
+    never been mirrored."""
+    row = connect().execute("SELECT value FROM meta WHERE key = 'scenarios_synced'").fetchone()
+    return None if row is None else float(row[0])
+
+
+def get_scenarios(analysis_id: int | None = None) -> list[dict] | None:
+    """Return the mirrored scenario list, optionally only for one analysis, or None if the
+    list has never been mirrored."""
+    conn = connect()
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'scenarios_synced'").fetchone() is None:
+        return None
+    if analysis_id is None:
+        rows = conn.execute('SELECT data FROM scenarios ORDER BY scenario_id')
+    else:
+        rows = conn.execute(
+            'SELECT data FROM scenarios WHERE analysis_id = ? ORDER BY scenario_id',
+            (analysis_id,)
+        )
+    return [json.loads(data) for (data,) in rows]
+
+
+def put_results(scenario_id: int, results: dict[str, Any]) -> None:
+    """Store the results of a completed scenario, as returned by the REST server."""
+    conn = connect()
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO results (scenario_id, analysis_id, data) VALUES '
+            '(?, COALESCE(?, (SELECT analysis_id FROM scenarios WHERE scenario_id = ?)), ?)',
+            (scenario_id, results.get('analysis_id'), scenario_id,
+             zlib.compress(json.dumps(results).encode()))
+        )
+
+
+def get_results(scenario_id: int) -> dict[str, Any] | None:
+    """Return the mirrored results of a scenario, or None if not mirrored."""
+    row = connect().execute(
+        'SELECT data FROM results WHERE scenario_id = ?', (scenario_id,)
+    ).fetchone()
+    return None if row is None else json.loads(zlib.decompress(row[0]))
+
+
+def mirrored_results(analysis_id: int | None = None) -> list[int]:
+    """Return the IDs of the scenarios whose results are mirrored, optionally only for one
+    analysis."""
+    if analysis_id is None:
+        rows = connect().execute('SELECT scenario_id FROM results ORDER BY scenario_id')
+    else:
+        rows = connect().execute(
+            'SELECT scenario_id FROM results WHERE analysis_id = ? ORDER BY scenario_id',
+            (analysis_id,)
+        )
+    return [scenario_id for (scenario_id,) in rows]
+
+
+def has_kpis(scenario_id: int) -> bool:
+    """Whether the KPI summary of a scenario is stored."""
+    return connect().execute(
+        'SELECT 1 FROM kpis WHERE scenario_id = ?', (scenario_id,)
+    ).fetchone() is not None
+
+
+def put_kpis(scenario_id: int, summary: dict[str, Any]) -> None:
+    """Store the KPI summary of a completed scenario."""
+    conn = connect()
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO kpis (scenario_id, analysis_id, overall_tat, lab_tat, '
+            'peak_util, mean_util, progress) VALUES '
+            '(?, (SELECT analysis_id FROM scenarios WHERE scenario_id = ?), ?, ?, ?, ?, ?)',
+            (scenario_id, scenario_id, summary['overall_tat'], summary['lab_tat'],
+             summary['peak_util'], summary['mean_util'],
+             json.dumps({'progress': summary['progress'],
+                         'lab_progress': summary['lab_progress']}))
+        )
+
+
+def get_kpis(analysis_id: int | None = None) -> dict[int, dict[str, Any]]:
+    """Return the stored KPI summaries by scenario ID, optionally only for one analysis."""
+    query = ('SELECT scenario_id, overall_tat, lab_tat, peak_util, mean_util, progress '
+             'FROM kpis')
+    if analysis_id is None:
+        rows = connect().execute(query)
+    else:
+        rows = connect().execute(f'{query} WHERE analysis_id = ?', (analysis_id,))
+    return {
+        scenario_id: {
+            'overall_tat': overall_tat,
+            'lab_tat': lab_tat,
+            'peak_util': peak_util,
+            'mean_util': mean_util,
+            **json.loads(progress)
+        }
+        for scenario_id, overall_tat, lab_tat, peak_util, mean_util, progress in rows
+    }
+
+
+def delete(scenario_id: int | None = None) -> None:
+    """Delete a scenario from the mirror, or everything if ``scenario_id`` is None."""
+    conn = connect()
+    with conn:
+        if scenario_id is None:
+            conn.execute('DELETE FROM scenarios')
+            conn.execute('DELETE FROM results')
+            conn.execute('DELETE FROM kpis')
+            conn.execute('DELETE FROM meta')
+        else:
+            conn.execute('DELETE FROM scenarios WHERE scenario_id = ?', (scenario_id,))
+            conn.execute('DELETE FROM results WHERE scenario_id = ?', (scenario_id,))
+            conn.execute('DELETE FROM kpis WHERE scenario_id = ?', (scenario_id,))
@@ -6,18 +6,12 @@ import dash_bootstrap_components as dbc
 from dash import Input, Output, callback, dcc, html
 from dash.development.base_component import Component
 from dash_compose import composition
-from redis import Redis
 from redis.exceptions import RedisError
 import requests
 
-from conf import REDIS_HOST, REDIS_PORT, SENSOR_HOST, HPATH_RESTFUL_HOST
+from conf import SENSOR_HOST, HPATH_RESTFUL_HOST
 from pages import templates
-
-REDIS_CONN = Redis(
-    host=REDIS_HOST,
-    port=REDIS_PORT  # default
-)
-"""Provides an connection to the redis server at ``redis://<REDIS_HOST>:<REDIS_PORT>``."""
+from redis_conn import REDIS_CONN
 
 dash.register_page(__name__, title='Homepage', path='/')
 
@@ -191,10 +185,13 @@ def status_bullet_colors(_) -> tuple[Component, Component]:
     except requests.RequestException:
         sensor_ok = False
 
-    logger = logging.getLogger('dash.dash')
-    logger.info("ping sensor-server: %s", 'OK' if sensor_ok else 'FAIL')
-    logger.info("ping redis: %s", 'OK' if redis_ok else 'FAIL')
-    logger.info("ping hpath-rest: %s", 'OK' if hpath_rest_ok else 'FAIL')
+    # Rate limited, as this runs every few seconds for every open tab (see conf.LOG_RATE_LIMITS);
+    # failures are logged as warnings, which are never rate limited
+    logging.getLogger('dash.dash.status').log(
+        logging.INFO if sensor_ok and redis_ok and hpath_rest_ok else logging.WARNING,
+        "ping sensor-server: %s, redis: %s, hpath-rest: %s",
+        *['OK' if ok else 'FAIL' for ok in (sensor_ok, redis_ok, hpath_rest_ok)]
+    )
 
     return (
         '✔ ' if sensor_ok else '❌ ',
@@ -4,12 +4,14 @@ import logging
 
 import dash
 import dash_bootstrap_components as dbc
-from dash import html, callback, Input, Output
+from dash import (ClientsideFunction, clientside_callback, dcc, html, callback, Input, Output,
+                  State)
 from dash_compose import composition
 import requests
 
+import purge
+import scenario_list
 from pages import templates
-from conf import HPATH_RESTFUL_HOST
 
 dash.register_page(__name__, title='Histopathology', path='/hpath')
 
@@ -19,8 +21,8 @@ red_btn_style = {'color': 'danger', 'style': {'height': '100%'}}
 auto_col_style = {'width': 'auto', 'class_name': 'p-0'}
 hidden = {'display': 'none'}
 
-CLEAR_DB_CONFIRMATION_MSG = 'Clear simulation results database? Click anywhere '\
-    'outside this dialog box to cancel.'
+CLEAR_DB_CONFIRMATION_MSG = 'Delete the scenarios matching the filters below from the '\
+    'simulation results database? Click anywhere outside this dialog box to cancel.'
 
 btn_submit_page = dbc.Button(
     [
@@ -41,14 +43,41 @@ btn_view_page = dbc.Button(
     **btn_style
 )
 
+btn_queue_page = dbc.Button(
+    [templates.card_header('Job Queue', 'list-ol', pad_below=False)],
+    href='/hpath/queue',
+    **btn_style
+)
+
 btn_clear_db = dbc.Button(
-    [templates.card_header('Clear database', 'trash-can', pad_below=False)],
+    [templates.card_header('Purge database', 'trash-can', pad_below=False)],
     id='clear-db',
     href='#',
     **red_btn_style
 )
 
 
+@composition
+def purge_filters():
+    """Filters selecting the scenarios to purge.  Empty filters match all scenarios."""
+    with dbc.Stack(gap=2) as ret:
+        yield dcc.Dropdown(id='purge-analyses', multi=True, placeholder='All analyses')
+        yield dcc.Dropdown(id='purge-scenarios', multi=True, placeholder='All scenarios')
+        with dbc.InputGroup():
+            yield dbc.InputGroupText('Created more than')
+            yield dbc.Input(id='purge-age-days', type='number', min=0, debounce=True,
+                            placeholder='any number of')
+            yield dbc.InputGroupText('days ago')
+        yield dbc.RadioItems(
+            id='purge-status',
+            options=[{'label': label, 'value': value}
+                     for value, label in purge.STATUSES.items()],
+            value='any',
+            inline=True
+        )
+    return ret
+
+
 @composition
 def layout():
     """Page layout."""
@@ -60,13 +89,21 @@ def layout():
                 yield btn_submit_page
             with dbc.Col(**auto_col_style):
                 yield btn_view_page
+            with dbc.Col(**auto_col_style):
+                yield btn_queue_page
             with dbc.Col(**auto_col_style):
                 yield btn_clear_db
         with dbc.Modal(id='clear-db-modal', is_open=False):
-            with dbc.ModalHeader(id='clear-db-modal-header', close_button=False):
-                yield dbc.ModalTitle('Danger!')
-            with dbc.ModalBody(id='clear-db-modal-msg'):
-                yield CLEAR_DB_CONFIRMATION_MSG
+            with dbc.ModalHeader(close_button=False):
+                yield dbc.ModalTitle('Danger!', id='clear-db-modal-title')
+            with dbc.ModalBody():
+                with html.Div(id='clear-db-modal-msg'):
+                    yield html.P(CLEAR_DB_CONFIRMATION_MSG)
+                    yield purge_filters()
+                    yield html.Div(id='purge-summary', className='mt-3')
+                yield dbc.Progress(id='purge-progress', value=0, striped=True, animated=True,
+                                   class_name='mt-3', style=hidden)
+                yield html.Div(id='clear-db-modal-result')
             with dbc.ModalFooter():
                 with dbc.Button(id='clear-db-modal-cancel', color='primary', style={}):
                     yield 'Cancel'
@@ -89,54 +126,147 @@ def layout():
 ################################################################################################
 
 
-@callback(
+# Opening and closing the dialog is handled clientside (see assets/hpathClientside.js)
+clientside_callback(
+    ClientsideFunction('hpath', 'clearDbModal'),
     Output('clear-db-modal', 'is_open'),
-    Output('clear-db-modal-header', 'children'),
-    Output('clear-db-modal-msg', 'children'),
+    Output('clear-db-modal-title', 'children'),
+    Output('clear-db-modal-msg', 'style'),
+    Output('clear-db-modal-result', 'children'),
     Output('clear-db-modal-cancel', 'style'),
     Output('clear-db-modal-yes', 'style'),
     Output('clear-db-modal-close', 'style'),
     Input('clear-db', 'n_clicks'),
     Input('clear-db-modal-cancel', 'n_clicks'),
-    Input('clear-db-modal-yes', 'n_clicks'),
     Input('clear-db-modal-close', 'n_clicks'),
     prevent_initial_call=True
 )
-def clear_db_confirmation(*_):
-    """Handle callbacks for clearing the database."""
 
+
+@callback(
+    Output('purge-analyses', 'options'),
+    Output('purge-scenarios', 'options'),
+    Input('clear-db-modal', 'is_open'),
+    prevent_initial_call=True
+)
+def purge_options(is_open):
+    """Fill in the analyses and scenarios that can be selected for purging."""
+    if not is_open:
+        return dash.no_update, dash.no_update
+    try:
+        scenarios = scenario_list.get_scenarios()
+    except requests.RequestException:
+        return [], []
+    analyses = {val['analysis_id']: val['analysis_name'] for val in scenarios}
+    return (
+        [{'label': f'#{key}: {name}', 'value': key} for key, name in sorted(analyses.items())],
+        [{'label': f"#{val['scenario_id']}: {val['scenario_name']}",
+          'value': val['scenario_id']} for val in scenarios]
+    )
+
+
+@callback(
+    Output('purge-summary', 'children'),
+    Output('clear-db-modal-yes', 'disabled'),
+    Input('purge-analyses', 'value'),
+    Input('purge-scenarios', 'value'),
+    Input('purge-age-days', 'value'),
+    Input('purge-status', 'value'),
+    Input('clear-db-modal', 'is_open'),
+    prevent_initial_call=True
+)
+def purge_summary(analysis_ids, scenario_ids, older_than_days, status, _):
+    """Show how many scenarios match the purge filters, and disable deletion if none do."""
+    return purge_preview(analysis_ids, scenario_ids, older_than_days, status)
+
+
+def purge_preview(analysis_ids, scenario_ids, older_than_days, status):
+    """Summary of the scenarios matching the purge filters, and whether the delete button is
+    disabled.  The count is taken from the cached scenario list; :py:func:`clear_db` selects
+    from a freshly fetched list."""
+    if purge.is_unfiltered(analysis_ids, scenario_ids, older_than_days, status):
+        return html.B('All scenarios will be deleted!', style={'color': 'crimson'}), False
+    try:
+        selected = purge.select(scenario_list.get_scenarios(), analysis_ids, scenario_ids,
+                                older_than_days, status)
+    except requests.RequestException as exc:
+        return html.Pre(f"Could not fetch the scenario list.\n\n{str(exc)}"), True
+    return f'{len(selected)} scenario(s) will be deleted.', not selected
+
+
+# Disable the delete button while a purge is in progress
+clientside_callback(
+    ClientsideFunction('hpath', 'disableWhileShown'),
+    Output('clear-db-modal-yes', 'disabled', allow_duplicate=True),
+    Input('purge-progress', 'style'),
+    prevent_initial_call=True
+)
+
+
+@callback(
+    Output('clear-db-modal-title', 'children', allow_duplicate=True),
+    Output('clear-db-modal-msg', 'style', allow_duplicate=True),
+    Output('clear-db-modal-result', 'children', allow_duplicate=True),
+    Output('clear-db-modal-cancel', 'style', allow_duplicate=True),
+    Output('clear-db-modal-yes', 'style', allow_duplicate=True),
+    Output('clear-db-modal-close', 'style', allow_duplicate=True),
+    Output('clear-db-modal-yes', 'disabled', allow_duplicate=True),
+    Input('clear-db-modal-yes', 'n_clicks'),
+    State('purge-analyses', 'value'),
+    State('purge-scenarios', 'value'),
+    State('purge-age-days', 'value'),
+    State('purge-status', 'value'),
+    prevent_initial_call=True,
+    background=True,
+    running=[(Output('purge-progress', 'style'), {}, hidden)],
+    progress=[Output('purge-progress', 'value'), Output('purge-progress', 'label')],
+    cancel=[Input('clear-db-modal-cancel', 'n_clicks')]
+)
+def clear_db(set_progress, _, analysis_ids, scenario_ids, older_than_days, status):
+    """Delete the scenarios matching the purge filters when the (small 'Delete!')
+    confirmation button is pressed.  Runs as a background callback, deleting one scenario
+    at a time, so that a large purge neither times out nor blocks the web workers.  The
+    button is disabled while it runs, then set as :py:func:`purge_summary` would for the
+    remaining scenarios."""
     logger = logging.getLogger('dash.dash')
-    logger.info(dash.ctx.triggered_id)
-
-    # Clear database button (the BIG RED button!)
-    if dash.ctx.triggered_id == 'clear-db':
-        return True, dbc.ModalTitle('Danger!'), CLEAR_DB_CONFIRMATION_MSG, {}, {}, hidden
-
-    # Cancel or Close buttons
-    if dash.ctx.triggered_id in ['clear-db-modal-cancel', 'clear-db-modal-close']:
-        return False, [], [], hidden, hidden, hidden
-
-    # Confirmation button (Small 'Delete!' button)
-    if dash.ctx.triggered_id == 'clear-db-modal-yes':
-        try:
-            response = requests.delete(
-                url=f'{HPATH_RESTFUL_HOST}/',
-                json={'delete': 'yes'},
-                timeout=10
-            )
-            assert response.status_code == HTTPStatus.OK
-            return True, [], 'Database cleared!', hidden, hidden, {}
-        except AssertionError:
-            error_msg = [
-                html.B("Non-200 (OK) HTTP response received: "),
-                f"{response.status_code} {HTTPStatus(response.status_code).name}"
-            ]
-
-            return True, dbc.ModalTitle('Error!'), error_msg, hidden, hidden, {}
-        except requests.exceptions.RequestException as exc:
-            error_msg = f"An error occured (type {type(exc)})."
-            error_pre = html.Pre(f"{error_msg}\n\n{str(exc)}")
-            return True, dbc.ModalTitle('Error!'), error_pre, hidden, hidden, {}
-
-    # None of the above: hide modal
-    return False, [], [], hidden, hidden, hidden
+    filters = (analysis_ids, scenario_ids, older_than_days, status)
+    try:
+        if purge.is_unfiltered(analysis_ids, scenario_ids, older_than_days, status):
+            logger.info('Clearing simulation results database')
+            set_progress((100, 'Clearing database...'))
+            purge.delete_all()
+            return clear_db_result('', 'Database cleared!', filters)
+
+        selected = purge.select(scenario_list.fetch_scenarios(), analysis_ids, scenario_ids,
+                                older_than_days, status)
+        logger.info('Purging scenarios %s', selected)
+        deleted, failed = purge.purge(
+            selected,
+            lambda done, total: set_progress((100 * done / total, f'{done}/{total}'))
+        )
+    except requests.HTTPError as exc:
+        error_msg = [
+            html.B("Non-200 (OK) HTTP response received: "),
+            f"{exc.response.status_code} {HTTPStatus(exc.response.status_code).name}"
+        ]
+        return clear_db_result('Error!', error_msg, filters)
+    except requests.exceptions.RequestException as exc:
+        error_msg = f"An error occured (type {type(exc)})."
+        error_pre = html.Pre(f"{error_msg}\n\n{str(exc)}")
+        return clear_db_result('Error!', error_pre, filters)
+
+    if failed:
+        error_msg = [
+            html.P(f'Deleted {len(deleted)} scenario(s).'),
+            html.B('Could not delete: '),
+            ', '.join(f'#{scenario_id}' for scenario_id in failed)
+        ]
+        return clear_db_result('Error!', error_msg, filters)
+    return clear_db_result('', f'Deleted {len(deleted)} scenario(s).', filters)
+
+
+def clear_db_result(title, result, filters: tuple):
+    """Outputs of :py:func:`clear_db` showing a result.  The delete button is set as
+    :py:func:`purge_summary` would for the scenarios remaining after the deletion."""
+    _, disabled = purge_preview(*filters)
+    return title, hidden, result, hidden, hidden, {}, disabled
@@ -1,18 +1,16 @@
 """Menu page for selecting single scenarios to view results."""
-from datetime import datetime
-from http import HTTPStatus
 import logging
-from math import isnan
 import dash
 import dash_ag_grid as dag
 import dash_bootstrap_components as dbc
 from dash_compose import composition
 import pandas as pd
 from dash import Input, Output, callback, html
-import pytz
-import requests
 
-from conf import HPATH_RESTFUL_HOST
+import prefetch
+import purge
+import scenario_list
+from conf import LAB_TAT_TARGET, TAT_TARGET
 from pages import templates
 
 dash.register_page(
@@ -47,6 +45,12 @@ sc_df_init = pd.DataFrame({
 """Defines an empty scenarios dataframe. Required because some representations of
 an empty dataframe cannot hold column metadata."""
 
+kpi_col_style = {'sortable': True, 'filter': 'agNumberColumnFilter'}
+"""Column settings shared by the KPI columns."""
+
+HOURS_FORMAT = 'params.value == null ? "" : d3.format(".1f")(params.value)'
+PERCENT_FORMAT = 'params.value == null ? "" : d3.format(".1%")(params.value)'
+
 # See: https://dash.plotly.com/dash-ag-grid/cell-renderer-components
 
 sc_grid_coldefs = [
@@ -63,9 +67,28 @@ sc_grid_coldefs = [
         'width': '100px',
         # resultLink function is defined in the dashAgGridComponentFunctions.js in assets folder
         "cellRenderer": "resultLinkScenario",
-    }
+    },
+    {'field': 'kpi_overall_tat', 'headerName': 'TAT (h)', 'width': '110px',
+     **kpi_col_style, 'valueFormatter': {'function': HOURS_FORMAT}},
+    {'field': 'kpi_lab_tat', 'headerName': 'Lab TAT (h)', 'width': '130px',
+     **kpi_col_style, 'valueFormatter': {'function': HOURS_FORMAT}},
+    *[
+        {'field': f'kpi_within_{n}d', 'headerName': f'≤ {n} days', 'width': '120px',
+         **kpi_col_style, 'valueFormatter': {'function': PERCENT_FORMAT}}
+        for n in TAT_TARGET
+    ],
+    *[
+        {'field': f'kpi_lab_within_{n}d', 'headerName': f'Lab ≤ {n} days', 'width': '140px',
+         **kpi_col_style, 'valueFormatter': {'function': PERCENT_FORMAT}}
+        for n in LAB_TAT_TARGET
+    ],
+    {'field': 'kpi_peak_util', 'headerName': 'Peak util.', 'width': '120px',
+     **kpi_col_style, 'valueFormatter': {'function': PERCENT_FORMAT}},
+    {'field': 'kpi_mean_util', 'headerName': 'Mean util.', 'width': '120px',
+     **kpi_col_style, 'valueFormatter': {'function': PERCENT_FORMAT}},
 ]
-"""Defines column settings for the AG Grid object on this page."""
+"""Defines column settings for the AG Grid object on this page.  The KPI columns are
+filled in from the KPI summaries in the local mirror, without loading full reports."""
 
 #####################################################################
 ##                                                                 ##
@@ -133,14 +156,6 @@ def layout():
 ################################################################################################
 
 
-LONDON = pytz.timezone('Europe/London')
-
-
-def format_time(ts: float):
-    """Format a UNIX timestamp in the format 2023-11-11 11:11:11 GMT (or BST for summer time)."""
-    return datetime.utcfromtimestamp(ts).astimezone(LONDON).strftime('%Y-%m-%d %H:%M:%S %Z')
-
-
 @callback(
     Output('hpath-view-scenarios', 'rowData'),
     Input('btn-scenarios-refresh', 'n_clicks')
@@ -148,29 +163,17 @@ def format_time(ts: float):
 def load_scenarios(n_clicks) -> None:
     """Load or refresh the scenarios list."""
     logger = logging.getLogger('dash.dash')
-    logger.info('load_scenarios: %s', n_clicks)
+    logger.debug('load_scenarios: %s', n_clicks)
 
     try:
-        response = requests.get(
-            url=f'{HPATH_RESTFUL_HOST}/scenarios/',
-            timeout=10
-        )
-        assert response.status_code == HTTPStatus.OK
-        scenarios = response.json()
+        scenarios = scenario_list.get_scenarios()
 
         if scenarios == []:
             return sc_df_init.to_dict('records')
-
-        for val in scenarios:
-            completed = isinstance(val['completed'], float) and not isnan(val['completed'])
-            if isinstance(val['created'], float) and not isnan(val['created']):
-                val['created'] = format_time(val['created'])
-            if completed:
-                val['completed'] = format_time(val['completed'])
-            val['progress'] = f"{val['done_reps']}/{val['num_reps']}"
-            val['result_link'] = f"{val['scenario_id']}" if completed else ''
-        logger.info(scenarios)
-        return scenarios
+        prefetch.scenarios_completed(scenarios)
+        purge.apply_retention()
+        logger.debug('Loaded %d scenarios', len(scenarios))
+        return scenario_list.with_kpis(scenarios)
     except:
         # TODO: display error messages on screen
         return sc_df_init.to_dict('records')
@@ -0,0 +1,189 @@
+"""Page for monitoring the simulation job queue and worker pool."""
+import logging
+
+import dash
+import dash_ag_grid as dag
+import dash_bootstrap_components as dbc
+import pandas as pd
+import plotly.graph_objects as go
+from dash import Input, Output, callback, dcc, html
+from dash_compose import composition
+from plotly.subplots import make_subplots
+from redis.exceptions import RedisError
+
+import jobqueue
+from conf import QUEUE_MONITOR_INTERVAL_SECONDS
+from pages import templates
+from scenario_list import LONDON
+
+dash.register_page(__name__, title='Histopathology: Job Queue', path='/hpath/queue')
+
+#####################################################################
+##       ###     ######       ######   ########  #### ########     ##
+##      ## ##   ##    ##     ##    ##  ##     ##  ##  ##     ##    ##
+##     ##   ##  ##           ##        ##     ##  ##  ##     ##    ##
+##    ##     ## ##   ####    ##   #### ########   ##  ##     ##    ##
+##    ######### ##    ##     ##    ##  ##   ##    ##  ##     ##    ##
+##    ##     ## ##    ##     ##    ##  ##    ##   ##  ##     ##    ##
+##    ##     ##  ######       ######   ##     ## #### ########     ##
+#####################################################################
+
+AGE_FORMATTER = {
+    'function': 'params.value == null ? "" : d3.format(".1f")(params.value / 60) + " min"'
+}
+"""Formats ages in seconds as minutes."""
+
+queue_grid_coldefs = [
+    {'field': 'queue', 'headerName': 'Queue', 'width': '200px'},
+    {'field': 'queued', 'headerName': 'Queued', 'width': '120px'},
+    {'field': 'in_flight', 'headerName': 'In flight', 'width': '120px'},
+    {'field': 'failed', 'headerName': 'Failed', 'width': '120px'},
+    {'field': 'oldest_age', 'headerName': 'Oldest queued job', 'width': '180px',
+     'valueFormatter': AGE_FORMATTER},
+]
+"""Defines column settings for the queues AG Grid object on this page."""
+
+worker_grid_coldefs = [
+    {'field': 'worker', 'headerName': 'Worker', 'width': '260px', 'sort': 'asc'},
+    {'field': 'state', 'headerName': 'State', 'width': '100px',
+     'cellStyle': {'function': 'params.value == "busy" ? {fontWeight: "bold"} : {}'}},
+    {'field': 'current_job', 'headerName': 'Current job', 'width': '300px'},
+    {'field': 'job_age', 'headerName': 'Job age', 'width': '120px',
+     'valueFormatter': AGE_FORMATTER},
+    {'field': 'jobs_per_hour', 'headerName': 'Jobs/hour', 'width': '120px',
+     'valueFormatter': {
+         'function': 'params.value == null ? "" : d3.format(".2f")(params.value)'
+     }},
+    {'field': 'successful', 'headerName': 'Completed', 'width': '120px'},
+    {'field': 'failed', 'headerName': 'Failed', 'width': '100px'},
+    {'field': 'utilisation', 'headerName': 'Utilisation', 'width': '120px',
+     'valueFormatter': {
+         'function': 'params.value == null ? "" : d3.format(".0%")(params.value)'
+     }},
+    {'field': 'heartbeat_age', 'headerName': 'Last heartbeat', 'width': '140px',
+     'valueFormatter': AGE_FORMATTER,
+     'cellStyle': {'function': 'params.value > 600 ? {color: "crimson"} : {}'}},
+]
+"""Defines column settings for the workers AG Grid object on this page.  Workers without a
+heartbeat for ten minutes are probably dead."""
+
+#####################################################################
+##                                                                 ##
+##    ##          ###    ##    ##  #######  ##     ## ########     ##
+##    ##         ## ##    ##  ##  ##     ## ##     ##    ##        ##
+##    ##        ##   ##    ####   ##     ## ##     ##    ##        ##
+##    ##       ##     ##    ##    ##     ## ##     ##    ##        ##
+##    ##       #########    ##    ##     ## ##     ##    ##        ##
+##    ##       ##     ##    ##    ##     ## ##     ##    ##        ##
+##    ######## ##     ##    ##     #######   #######     ##        ##
+##                                                                 ##
+#####################################################################
+
+
+@composition
+def layout():
+    """Page layout."""
+    with dbc.Stack(gap=3) as ret:
+        yield templates.breadcrumb(
+            ['Home', 'Histopathology: Simulator', 'Job Queue'],
+            ['hpath', 'queue']
+        )
+        yield templates.page_title('Histopathology: Simulation Job Queue')
+        yield dbc.Alert(id='queue-alert', color='danger', is_open=False, class_name='m-0')
+        yield html.Div(id='queue-summary')
+        with dbc.Card(class_name='p-3'):
+            yield templates.card_header('Queues', 'list-ol')
+            yield dag.AgGrid(
+                id='queue-grid',
+                rowData=[],
+                columnDefs=queue_grid_coldefs,
+                defaultColDef={'sortable': True},
+                dashGridOptions={'domLayout': 'autoHeight'}
+            )
+        with dbc.Card(class_name='p-3'):
+            yield templates.card_header('Workers', 'microchip')
+            yield dag.AgGrid(
+                id='queue-workers-grid',
+                rowData=[],
+                columnDefs=worker_grid_coldefs,
+                defaultColDef={'sortable': True},
+                dashGridOptions={'domLayout': 'autoHeight'}
+            )
+        with dbc.Card(class_name='p-3'):
+            yield templates.card_header('Throughput', 'chart-line')
+            yield dcc.Graph(id='queue-throughput-graph')
+        yield dcc.Interval(id='queue-refresh', interval=QUEUE_MONITOR_INTERVAL_SECONDS * 1000)
+    return ret
+
+###############################################################################################
+##                                                                                            ##
+##     ######     ###    ##       ##       ########     ###     ######  ##    ##  ######      ##
+##    ##    ##   ## ##   ##       ##       ##     ##   ## ##   ##    ## ##   ##  ##    ##     ##
+##    ##        ##   ##  ##       ##       ##     ##  ##   ##  ##       ##  ##   ##           ##
+##    ##       ##     ## ##       ##       ########  ##     ## ##       #####     ######      ##
+##    ##       ######### ##       ##       ##     ## ######### ##       ##  ##         ##     ##
+##    ##    ## ##     ## ##       ##       ##     ## ##     ## ##    ## ##   ##  ##    ##     ##
+##     ######  ##     ## ######## ######## ########  ##     ##  ######  ##    ##  ######      ##
+##                                                                                            ##
+################################################################################################
+
+
+def summary(state: dict) -> list:
+    """One-line summary of the queue state: queued and in-flight jobs, busy workers, and the
+    age of the oldest queued job."""
+    workers = state['workers']
+    busy = sum(worker['state'] == 'busy' for worker in workers)
+    ages = [val['oldest_age'] for val in state['queues'] if val['oldest_age'] is not None]
+    return [
+        html.B('Queued: '), f"{sum(val['queued'] for val in state['queues'])}\u2002",
+        html.B('In flight: '), f"{sum(val['in_flight'] for val in state['queues'])}\u2002",
+        html.B('Busy workers: '), f'{busy}/{len(workers)}\u2002',
+        html.B('Oldest queued job: '), f'{max(ages) / 60:.1f} min' if ages else '-',
+    ]
+
+
+def throughput_figure(history: list[dict]) -> go.Figure:
+    """Plot the jobs completed per hour, with the queue depth and jobs in flight on a
+    secondary axis, over the sample history."""
+    series = pd.DataFrame(
+        jobqueue.throughput_series(history),
+        columns=['time', 'jobs_per_hour', 'queued', 'in_flight']
+    )
+    times = pd.to_datetime(series['time'], unit='s', utc=True).dt.tz_convert(LONDON)
+    fig = make_subplots(specs=[[{'secondary_y': True}]])
+    fig.add_trace(go.Scatter(x=times, y=series['jobs_per_hour'], name='Jobs completed/hour'))
+    fig.add_trace(go.Scatter(x=times, y=series['queued'], name='Queued',
+                             line={'dash': 'dot', 'shape': 'hv'}), secondary_y=True)
+    fig.add_trace(go.Scatter(x=times, y=series['in_flight'], name='In flight',
+                             line={'dash': 'dash', 'shape': 'hv'}), secondary_y=True)
+    fig.update_yaxes(title_text='Jobs/hour', rangemode='tozero', secondary_y=False)
+    fig.update_yaxes(title_text='Jobs', rangemode='tozero', secondary_y=True)
+    fig.update_layout(height=350, margin={'t': 20, 'b': 40}, uirevision='queue')
+    return fig
+
+
+@callback(
+    Output('queue-alert', 'children'),
+    Output('queue-alert', 'is_open'),
+    Output('queue-summary', 'children'),
+    Output('queue-grid', 'rowData'),
+    Output('queue-workers-grid', 'rowData'),
+    Output('queue-throughput-graph', 'figure'),
+    Input('queue-refresh', 'n_intervals')
+)
+def refresh_queue(_):
+    """Refresh the queue state.  Triggered by a dcc.Interval component."""
+    try:
+        state = jobqueue.snapshot()
+    except RedisError as exc:
+        logging.getLogger('dash.dash').error('Job queue not read: %s', exc)
+        return (f'Job queue unavailable: {exc}', True, dash.no_update, dash.no_update,
+                dash.no_update, dash.no_update)
+    return (
+        None,
+        False,
+        summary(state),
+        state['queues'],
+        state['workers'],
+        throughput_figure(state['history'])
+    )
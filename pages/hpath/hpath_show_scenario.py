@@ -1,19 +1,31 @@
 """Page for showing results for a single simulation scenario."""
+import functools
+import json
 import logging
 
 import dash
+import dash_ag_grid as dag
 import dash_bootstrap_components as dbc
 import numpy as np
 import pandas as pd
-import requests
 
-from dash import Input, Output, State, callback, dcc, html
+from dash import MATCH, Input, Output, State, callback, dcc, html
 from dash_compose import composition
 from plotly import express as px
+from plotly import graph_objects as go
 
+import cache
+import export
 import kpis
-from conf import HPATH_RESTFUL_HOST, LAB_TAT_TARGET, TAT_TARGET
+import prefetch
+from chart_datatypes import CumulativeDistribution
+import reports
+import rollup
+import series_stats
+from conf import LAB_TAT_TARGET, TAT_TARGET
 from pages import templates
+from profiling import profiled
+from pyramid import Pyramid
 
 dash.register_page(
     __name__,
@@ -55,6 +67,27 @@ slider_style = {
 
 plots_container_style = {'fluid': True, 'class_name': 'p-0'}
 
+tat_whatif_coldefs = [
+    {
+        'field': 'controls',
+        'headerName': '',
+        'checkboxSelection': True,
+        'width': '40px'
+    },
+    {'field': 'days', 'headerName': 'Within (days)', 'editable': True, 'width': '150px',
+     'cellDataType': 'number'},
+    {'field': 'target', 'headerName': 'Target (%)', 'editable': True, 'width': '150px',
+     'cellDataType': 'number'},
+]
+"""Defines column settings for the what-if TAT target editor."""
+
+statistic_options = [
+    {'label': label, 'value': value} for value, label in rollup.STATISTICS.items()
+] + [{'label': 'Full detail', 'value': 'none'}]
+"""Options for the rollup statistic of daily and weekly time series plots."""
+
+hidden = {'display': 'none'}
+
 UTIL_LATEX = [
     r"$\text{mean utilisation}=\frac"
     r"{\int_{0}^{T}\text{number busy}\left(t\right)\mathrm{d}t}"
@@ -76,24 +109,9 @@ UTIL_LATEX = [
 
 
 @composition
-def layout(scenario_id: int):
-    """Build the page layout to show the given scenario's result."""
-    logger = logging.getLogger('dash.dash')
-
-    def d_h(hours):
-        return f'{int(hours // 24)} days {(hours % 24):.2f} hours'
-
-    try:
-        results = requests.get(
-            f'{HPATH_RESTFUL_HOST}/scenarios/{scenario_id}/results/',
-            timeout=10
-        ).json()[0]
-        report = kpis.Report.model_validate_json(results['results'])
-        report_jsonstr = kpis.Report.model_dump_json(report)
-    except Exception as exc:
-        logger.error(str(exc))
-        report = None
-
+def layout(scenario_id: int, **_query_params):
+    """Build the page layout to show the given scenario's result.  The results are fetched
+    and rendered by the :py:func:`render_scenario` background callback."""
     with html.Div(id='scenario-result', className='mt-3 mx-3') as div:
         yield templates.breadcrumb(
             ['Home', 'Histopathology: Simulator', 'Scenarios', f'{scenario_id}'],
@@ -101,17 +119,122 @@ def layout(scenario_id: int):
         )
         yield templates.page_title('Histopathology: Single-Scenario Results')
 
-        yield dcc.Store(id='scenario-report', data=report_jsonstr)
-        if report is None:
-            with html.Div(style={'color': '#a00'}):
-                yield html.B('Error: ')
-                yield html.Span(f"Could not fetch scenario with ID: {scenario_id}")
-                return div  # NOTE: OMIT REST OF LAYOUT BELOW
-        else:
-            yield html.H2(
-                f"Scenario #{scenario_id}: {results['scenario_name']}",
-                style={'font-size': '1.4rem'}
+        yield dcc.Store(id='scenario-tat-dist')
+        yield dcc.Store(id='scenario-id', data=scenario_id)
+        with html.Div(id='scenario-loading'):
+            yield html.Div('Loading scenario results...', className='mb-2')
+            yield dbc.Progress(value=100, striped=True, animated=True)
+        yield html.Div(id='scenario-result-body')
+    return div
+
+
+def tat_slider(proportion: float, target: float) -> dcc.Slider:
+    """Read-only slider showing the proportion of specimens completed within some TAT,
+    coloured by whether the target proportion is met."""
+    good = proportion > target
+
+    marks = {}
+    target_pct = round(target*100)
+    marks[str(target_pct)] = {'label': f'Target: {target:.0%}'}
+
+    if target_pct >= 10:
+        marks['0'] = {'label': '0%'}
+    if target_pct <= 90:
+        marks['100'] = {'label': '100%'}
+
+    return dcc.Slider(
+        0, 100, step=0.01,
+        marks=marks,
+        value=round(float(proportion)*100, 2),
+        disabled=True,
+        tooltip={
+            "placement": "top",
+            "always_visible": True
+        },
+        className="tat-slider tat-slider-"
+        f"{'good' if good else 'bad'}"
+    )
+
+
+def tat_whatif_rows(kind: str) -> list[dict[str, float]]:
+    """Initial rows of the what-if TAT target editor: the configured targets."""
+    targets = TAT_TARGET if kind == 'overall' else LAB_TAT_TARGET
+    return [{'days': float(n), 'target': round(t*100, 2)} for n, t in targets.items()]
+
+
+@composition
+def tat_whatif_editor() -> dbc.Row:
+    """Components of the what-if TAT target editor.  Target proportions are evaluated from
+    the report's TAT distributions by :py:func:`evaluate_tat_targets`."""
+    with dbc.Row(class_name='mt-2') as row:
+        with dbc.Col(**table_plot_left_style):
+            yield dbc.RadioItems(
+                id='tat-whatif-kind',
+                options=[
+                    {'label': 'Overall TAT', 'value': 'overall'},
+                    {'label': 'Lab TAT', 'value': 'lab'}
+                ],
+                value='overall',
+                inline=True
             )
+            yield dag.AgGrid(
+                id='tat-whatif-grid',
+                rowData=tat_whatif_rows('overall'),
+                columnDefs=tat_whatif_coldefs,
+                dashGridOptions={
+                    'singleClickEdit': True,
+                    'stopEditingWhenCellsLoseFocus': True,
+                    'rowSelection': 'multiple',
+                    'domLayout': 'autoHeight'
+                },
+                style={'width': '360px', 'height': None}
+            )
+            with dbc.Row(class_name='mt-2 g-2'):
+                with dbc.Col(width='auto'):
+                    yield dbc.Button('Add target', id='tat-whatif-add', size='sm')
+                with dbc.Col(width='auto'):
+                    yield dbc.Button(
+                        'Delete selected', id='tat-whatif-delete', size='sm', color='danger'
+                    )
+        with dbc.Col(class_name='p-2'):
+            yield html.Div(id='tat-whatif-sliders')
+    return row
+
+
+def d_h(hours):
+    """Format a duration in hours as days and hours."""
+    return f'{int(hours // 24)} days {(hours % 24):.2f} hours'
+
+
+@composition
+def scenario_body(scenario_id: int, scenario_name: str, report: kpis.Report):
+    """Build the results accordion for the given scenario."""
+    with html.Div() as div:
+        with dbc.Row(class_name='mb-2', align='center'):
+            with dbc.Col(width='auto'):
+                yield html.H2(
+                    f"Scenario #{scenario_id}: {scenario_name}",
+                    style={'font-size': '1.4rem'},
+                    className='m-0'
+                )
+            with dbc.Col(width='auto'):
+                with dbc.DropdownMenu(
+                    label=['Download\u2002', html.Span(className='fa fa-download')],
+                    color='info',
+                    size='sm'
+                ):
+                    yield dbc.DropdownMenuItem(
+                        'KPIs (JSON)',
+                        href=export.export_url(scenario_id, 'kpis.json'),
+                        external_link=True
+                    )
+                    for series in export.SERIES_COLUMNS:
+                        for fmt in ['csv', 'parquet']:
+                            yield dbc.DropdownMenuItem(
+                                f'{series} ({fmt.upper()})',
+                                href=export.export_url(scenario_id, f'{series}.{fmt}'),
+                                external_link=True
+                            )
 
         with dbc.Accordion(class_name='sim-results-accordion mb-5'):
 
@@ -158,31 +281,7 @@ def layout(scenario_id: int):
                                             with html.Div():
                                                 yield f'≤ {n} days:'
                                             with html.Div(**slider_style):
-
-                                                good = report.progress[n] > TAT_TARGET[n]
-
-                                                marks = {}
-                                                target = round(TAT_TARGET[n]*100)
-                                                marks[str(target)] \
-                                                    = {'label': f'Target: {TAT_TARGET[n]:.0%}'}
-
-                                                if target >= 10:
-                                                    marks['0'] = {'label': '0%'}
-                                                if target <= 90:
-                                                    marks['100'] = {'label': '100%'}
-
-                                                yield dcc.Slider(
-                                                    0, 100, step=0.01,
-                                                    marks=marks,
-                                                    value=round(report.progress[n]*100, 2),
-                                                    disabled=True,
-                                                    tooltip={
-                                                        "placement": "top",
-                                                        "always_visible": True
-                                                    },
-                                                    className="tat-slider tat-slider-"
-                                                    f"{'good' if good else 'bad'}"
-                                                )
+                                                yield tat_slider(report.progress[n], TAT_TARGET[n])
 
                         # CARD: Lab TAT Target
                         with dbc.Col(**tat_col_style, id='card-lab-tat-target'):
@@ -196,32 +295,26 @@ def layout(scenario_id: int):
                                         with html.Div():
                                             yield '≤ 3 days:'
                                         with html.Div(**slider_style):
-
-                                            good = report.lab_progress['3'] > LAB_TAT_TARGET['3']
-
-                                            marks = {}
-                                            target = round(LAB_TAT_TARGET['3']*100)
-                                            marks[str(target)] = {
-                                                'label': f'Target: {LAB_TAT_TARGET["3"]:.0%}'
-                                            }
-
-                                            if target >= 10:
-                                                marks['0'] = {'label': '0%'}
-                                            if target <= 90:
-                                                marks['100'] = {'label': '100%'}
-
-                                            yield dcc.Slider(
-                                                0, 100, step=0.01,
-                                                marks=marks,
-                                                value=round(report.lab_progress['3']*100, 2),
-                                                disabled=True,
-                                                tooltip={
-                                                    "placement": "top", "always_visible": True
-                                                },
-                                                className="tat-slider tat-slider-"
-                                                f"{'good' if good else 'bad'}"
+                                            yield tat_slider(
+                                                report.lab_progress['3'], LAB_TAT_TARGET['3']
                                             )
 
+                    # CARD: What-if TAT Targets
+                    with dbc.Row(class_name='d-flex mx-0'):
+                        with dbc.Col(class_name='p-2', width=12, id='card-tat-whatif'):
+                            with dbc.Card():
+                                with dbc.CardBody():
+                                    yield html.B(
+                                        "What-if TAT Targets",
+                                        style={'font-size': '1.4rem'}
+                                    )
+                                    if report.tat_distribution is None:
+                                        with html.Div():
+                                            yield 'Not available: this report does not include '\
+                                                'a TAT distribution.'
+                                    else:
+                                        yield tat_whatif_editor()
+
             ########################################################################
             ##                                                                    ##
             ##  ########    ###    ########                                       ##
@@ -266,15 +359,10 @@ def layout(scenario_id: int):
                             )
                         with dbc.Col(**table_plot_tat_right_style):
                             yield dcc.Graph(
-                                figure=px.bar(
-                                    df_tat_by_stage,
-                                    x='Stage',
-                                    y='TAT',
-                                    title='Turnaround Time by Stage',
-                                    labels={
-                                        'TAT': 'Turnaround time (hours)'
-                                    },
-                                    height=400
+                                figure=cache.cached_figure(
+                                    (scenario_id, 'tat-by-stage', None, None),
+                                    tat_by_stage_figure,
+                                    df_tat_by_stage
                                 )
                             )
                             with html.Div():
@@ -357,6 +445,14 @@ def layout(scenario_id: int):
                                     options=['weeks', 'days', 'hours'],
                                     value='days'
                                 )
+                        with dbc.Col(width='auto', class_name='p-2'):
+                            with dbc.InputGroup():
+                                yield dbc.InputGroupText('Per day/week:')
+                                yield dbc.Select(
+                                    id='select-res-alloc-statistic',
+                                    options=statistic_options,
+                                    value='twa'
+                                )
 
                     with dbc.Row():
                         with dbc.Col(width=12, class_name='p-2'):
@@ -383,6 +479,7 @@ def layout(scenario_id: int):
             ########################################################################
             with dbc.AccordionItem(title="Work-in-Progress by Stage"):
                 with dbc.Stack(gap=3):
+                    yield stats_panel('wip', 'Congested above (WIP):')
                     with html.P(className='mb-0'):
                         yield 'Select which resources to show from the menu below. ('
                         yield html.B('Default: ')
@@ -434,6 +531,14 @@ def layout(scenario_id: int):
                                     options=['weeks', 'days', 'hours'],
                                     value='days'
                                 )
+                        with dbc.Col(width='auto', class_name='p-2'):
+                            with dbc.InputGroup():
+                                yield dbc.InputGroupText('Per day/week:')
+                                yield dbc.Select(
+                                    id='select-wip-statistic',
+                                    options=statistic_options,
+                                    value='twa'
+                                )
 
                     with dbc.Row():
                         with dbc.Col(width=12, class_name='p-2'):
@@ -480,20 +585,13 @@ def layout(scenario_id: int):
                                 class_name='mb-0 right-align-last'
                             )
                         with dbc.Col(**table_plot_util_right_style):
-                            bar_chart = px.bar(
-                                df_util,
-                                x='Resource',
-                                y='Utilisation',
-                                title='Utilisation by Resource',
-                                labels={
-                                    'Utilisation': 'Utilisation'
-                                },
-                                height=600
-                            )
-                            bar_chart.update_layout(
-                                yaxis_tickformat='.0%'
+                            yield dcc.Graph(
+                                figure=cache.cached_figure(
+                                    (scenario_id, 'util', None, None),
+                                    util_figure,
+                                    df_util
+                                )
                             )
-                            yield dcc.Graph(figure=bar_chart)
                             with html.Div():
                                 yield html.B('Note: ')
                                 yield 'Stage TATs do not include delivery delays to the next stage.'
@@ -521,6 +619,7 @@ def layout(scenario_id: int):
 
             with dbc.AccordionItem(title="Utilisation by Resource (hourly)"):
                 with dbc.Stack(gap=3):
+                    yield stats_panel('util-hourly', 'Congested above (utilisation):')
                     with html.P(className='mb-0'):
                         yield 'Select which resources to show from the menu below. ('
                         yield html.B('Default: ')
@@ -572,9 +671,67 @@ def layout(scenario_id: int):
                                     options=['weeks', 'days', 'hours'],
                                     value='days'
                                 )
+                        with dbc.Col(width='auto', class_name='p-2'):
+                            with dbc.InputGroup():
+                                yield dbc.InputGroupText('Per day/week:')
+                                yield dbc.Select(
+                                    id='select-util-hourly-statistic',
+                                    options=statistic_options,
+                                    value='twa'
+                                )
+
+                    with dbc.Row(align='center'):
+                        with dbc.Col(width='auto', class_name='p-2'):
+                            yield dbc.RadioItems(
+                                id='view-util-hourly-mode',
+                                options=[
+                                    {'label': 'Line charts', 'value': 'lines'},
+                                    {'label': 'Heatmap', 'value': 'heatmap'}
+                                ],
+                                value='lines',
+                                inline=True
+                            )
+                        with dbc.Col(width='auto', class_name='p-2'):
+                            with dbc.InputGroup():
+                                yield dbc.InputGroupText('Heatmap layer:')
+                                yield dbc.Select(
+                                    id='select-util-hourly-layer',
+                                    options=[
+                                        {'label': label, 'value': value}
+                                        for value, label in HEATMAP_LAYERS.items()
+                                    ],
+                                    value='busy'
+                                )
+                        with dbc.Col(width='auto', class_name='p-2'):
+                            with dbc.InputGroup():
+                                yield dbc.InputGroupText('Fold:')
+                                yield dbc.Select(
+                                    id='select-util-hourly-fold',
+                                    options=[
+                                        {'label': 'None', 'value': 'none'},
+                                        {'label': 'Day of week × hour', 'value': 'week'}
+                                    ],
+                                    value='none'
+                                )
+                        with dbc.Col(width='auto', class_name='p-2'):
+                            with dbc.InputGroup():
+                                yield dbc.InputGroupText('Sort rows by:')
+                                yield dbc.Select(
+                                    id='select-util-hourly-sort',
+                                    options=[
+                                        {'label': 'Selection order', 'value': 'selection'},
+                                        {'label': 'Mean utilisation', 'value': 'utilisation'},
+                                        {'label': 'Mean queue length', 'value': 'queue'}
+                                    ],
+                                    value='selection'
+                                )
 
                     with dbc.Row():
                         with dbc.Col(width=12, class_name='p-2'):
+                            yield dbc.Progress(
+                                id='progress-util-hourly', value=100, striped=True,
+                                animated=True, style=hidden
+                            )
                             yield dbc.Container(id='container-util-hourly', **plots_container_style)
 
     return div
@@ -591,6 +748,98 @@ def layout(scenario_id: int):
 ##                                                                                            ##
 ################################################################################################
 
+@callback(
+    Output('scenario-result-body', 'children'),
+    Output('scenario-tat-dist', 'data'),
+    Input('scenario-id', 'data'),
+    background=True,
+    running=[(Output('scenario-loading', 'style'), {}, hidden)],
+    cancel=[Input('location', 'pathname')]  # Cancel if the user navigates away
+)
+@profiled()
+def render_scenario(scenario_id):
+    """Fetch the results for the scenario and render them.  Runs as a background callback
+    so that large reports do not block the web workers."""
+    logger = logging.getLogger('dash.dash')
+    try:
+        scenario_name, report = reports.get_report(scenario_id)
+    except Exception as exc:
+        logger.error(str(exc))
+        error_msg = html.Div(
+            [html.B('Error: '), html.Span(f"Could not fetch scenario with ID: {scenario_id}")],
+            style={'color': '#a00'}
+        )
+        return error_msg, None
+
+    return (
+        cache.cached_layout((scenario_id, 'body'), scenario_body, scenario_id, scenario_name,
+                            report),
+        report.model_dump(include={'tat_distribution', 'lab_tat_distribution'})
+    )
+
+# WHAT-IF TAT TARGETS
+
+@callback(
+    Output('tat-whatif-grid', 'rowData'),
+    Input('tat-whatif-kind', 'value'),
+    Input('tat-whatif-add', 'n_clicks'),
+    State('tat-whatif-grid', 'rowData'),
+    prevent_initial_call=True
+)
+def edit_tat_targets(kind, _, rows):
+    """Reset the what-if targets when switching between overall and lab TAT,
+    or add a row when the "Add target" button is pressed."""
+    if dash.ctx.triggered_id == 'tat-whatif-add':
+        return rows + [{'days': 5.0, 'target': 80.0}]
+    return tat_whatif_rows(kind)
+
+
+@callback(
+    Output('tat-whatif-grid', 'deleteSelectedRows'),
+    Input('tat-whatif-delete', 'n_clicks'),
+    prevent_initial_call=True
+)
+def delete_tat_targets(_):
+    """Triggered when the "Delete selected" button of the what-if editor is pressed."""
+    return True
+
+
+@callback(
+    Output('tat-whatif-sliders', 'children'),
+    Input('tat-whatif-grid', 'rowData'),
+    Input('tat-whatif-grid', 'cellValueChanged'),
+    State('tat-whatif-kind', 'value'),
+    State('scenario-tat-dist', 'data')
+)
+@composition
+def evaluate_tat_targets(rows, _, kind, dists):
+    """Evaluate the what-if TAT targets against the report's TAT distribution,
+    with one vectorised lookup for all targets."""
+    dist = (dists or {}).get('tat_distribution' if kind == 'overall' else 'lab_tat_distribution')
+    with dbc.Stack(class_name='gap-1 mx-0') as ret:
+        if dist is None:
+            yield ('Not available: this report does not include '
+                   f"{'a' if kind == 'overall' else 'a lab'} TAT distribution.")
+            return ret
+
+        valid_rows = []
+        for row in rows or []:
+            try:
+                valid_rows.append((float(row['days']), float(row['target']) / 100))
+            except (KeyError, TypeError, ValueError):
+                pass  # Row still being edited
+        if not valid_rows:
+            return ret
+
+        days, targets = zip(*sorted(valid_rows))
+        proportions = CumulativeDistribution(**dist).evaluate(np.array(days) * 24)
+        for n, target, proportion in zip(days, targets, proportions):
+            with html.Div():
+                yield f'≤ {n:g} days: {proportion:.1%}'
+            with html.Div(**slider_style):
+                yield tat_slider(proportion, target)
+    return ret
+
 # CHANGE PLOT WIDTHS
 
 @callback(
@@ -694,39 +943,353 @@ depending on whether the specified column width is 12 (wide), 6 (medium), or 4 (
 """
 
 
+def report_fetcher(scenario_id: int):
+    """Return a function that gets the report from the server-side report cache on its first
+    call only, so that callbacks served entirely from the figure cache never load the report
+    and the report is never shipped to the browser."""
+    return functools.cache(lambda: reports.get_report(scenario_id)[1])
+
+
+def tat_by_stage_figure(df_tat_by_stage: pd.DataFrame):
+    """Bar chart of turnaround time by stage."""
+    return px.bar(
+        df_tat_by_stage,
+        x='Stage',
+        y='TAT',
+        title='Turnaround Time by Stage',
+        labels={
+            'TAT': 'Turnaround time (hours)'
+        },
+        height=400
+    )
+
+
+def util_figure(df_util: pd.DataFrame):
+    """Bar chart of mean utilisation by resource."""
+    bar_chart = px.bar(
+        df_util,
+        x='Resource',
+        y='Utilisation',
+        title='Utilisation by Resource',
+        labels={
+            'Utilisation': 'Utilisation'
+        },
+        height=600
+    )
+    bar_chart.update_layout(
+        yaxis_tickformat='.0%'
+    )
+    return bar_chart
+
+
+TIME_UNIT_SCALES = {'weeks': 168, 'days': 24, 'hours': 1}
+"""Number of hours per time unit of the time series plots."""
+
+Y_TITLES = {
+    'res-alloc': '# Allocated',
+    'wip': 'Hourly mean WIP',
+    'util-hourly': 'Mean # busy (hourly)',
+}
+"""Y-axis titles of the time series plots, by section."""
+
+STATISTIC_TITLES = {'twa': 'time-weighted mean', 'mean': 'mean', 'max': 'max', 'p95': 'p95'}
+"""Short names of the rollup statistics, for axis titles."""
+
+
+def series_pyramid(report, section: str, series: str) -> Pyramid:
+    """Build the min/mean/max pyramid of a time series of the report."""
+    if section == 'res-alloc':
+        chart_data = report().resource_allocation[series]
+        return Pyramid.build(chart_data.x, chart_data.y)
+    charts_data = (
+        report().wip_by_stage if section == 'wip'
+        else report().hourly_utilization_by_resource
+    )
+    return Pyramid.build(charts_data.x, charts_data.y[charts_data.labels.index(series)])
+
+
+def pyramid_loader(scenario_id: int, report, section: str, series: str):
+    """Return a function that loads the pyramid of a time series from the cache, building it
+    (and parsing the report) only on a cache miss."""
+    return functools.partial(
+        cache.cached_pyramid, (scenario_id, section, series),
+        series_pyramid, report, section, series
+    )
+
+
+def lod_graph_id(section: str, series: str, time_unit: str, statistic: str,
+                 kind: str = 'graph') -> dict[str, str]:
+    """Pattern-matching ID of a time series plot (see :py:func:`load_plot_detail`), or of its
+    placeholder (``kind='slot'``) or visibility store (``kind='visible'``)."""
+    return {
+        'type': f'lod-{kind}',
+        'section': section,
+        'series': series,
+        'time_unit': time_unit,
+        'statistic': statistic
+    }
+
+
+def is_rollup(time_unit: str, statistic: str) -> bool:
+    """Whether a time series plot shows a daily or weekly rollup rather than the pyramid."""
+    return time_unit != 'hours' and statistic != 'none'
+
+
+def lod_traces(pyramid: Pyramid, scale: float,
+               start: float | None = None, end: float | None = None) -> list[dict]:
+    """Plot traces of a time series for the time window ``[start, end]`` (in hours): a
+    min-max band (empty if showing raw data) and the mean or raw values as a step line."""
+    x, y, ymin, ymax = pyramid.detail(start, end)
+    x_band = (x/scale).tolist() if ymin is not None else []
+    band = {'mode': 'lines', 'line': {'width': 0, 'shape': 'hv'}, 'hoverinfo': 'skip'}
+    return [
+        go.Scatter(x=x_band, y=[] if ymax is None else ymax.tolist(), name='max', **band),
+        go.Scatter(x=x_band, y=[] if ymin is None else ymin.tolist(), name='min',
+                   fill='tonexty', fillcolor='rgba(99, 110, 250, 0.25)', **band),
+        go.Scatter(x=(x/scale).tolist(), y=y.tolist(), mode='lines',
+                   name='value' if ymin is None else 'mean',
+                   line={'shape': 'hv', 'color': '#636efa'}),
+    ]
+
+
+def series_figure(load_pyramid, title: str, time_unit: str, y_title: str, statistic: str):
+    """Line chart of a single time series.  For daily or weekly time units, the series is
+    rolled up into one point per day or week using the given statistic, unless the statistic
+    is ``'none'``.  Otherwise, the chart starts at the coarsest level of detail and finer
+    levels are loaded when zooming in, by :py:func:`load_plot_detail`.  The constant
+    ``uirevision`` keeps the user's zoom when the traces are replaced."""
+    pyramid = load_pyramid()
+    scale = TIME_UNIT_SCALES[time_unit]
+    if is_rollup(time_unit, statistic):
+        x, y = rollup.rollup(pyramid.x, pyramid.y, scale, statistic)
+        data = [go.Scatter(x=(x/scale).tolist(), y=y.tolist(), mode='lines',
+                           line={'shape': 'hv', 'color': '#636efa'})]
+        y_title = f'{y_title}<br>({STATISTIC_TITLES[statistic]} per {time_unit[:-1]})'
+    else:
+        data = lod_traces(pyramid, scale)
+    plot = go.Figure(
+        data=data,
+        layout={'title': title, 'showlegend': False, 'uirevision': title}
+    ).update_xaxes(
+        title=f'Time ({time_unit})'
+    ).update_yaxes(
+        title=y_title
+    )
+    if time_unit == 'days':
+        plot.update_xaxes(dtick=7, tick0=0)  # weekly ticks
+    return plot
+
+
+HEATMAP_LAYERS = {'busy': 'Mean # busy (hourly)', 'allocated': '# Allocated'}
+"""Layers of the hourly utilisation heatmap, with their colour bar titles."""
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def heatmap_matrix(report, resources: list[str], layer: str) -> tuple[np.ndarray, np.ndarray]:
+    """Hourly time points and a matrix with one row per resource of the given heatmap layer.
+    Resource allocations are sampled at the time points of the hourly utilisation."""
+    charts_data = report().hourly_utilization_by_resource
+    x = np.array(charts_data.x)
+    if layer == 'busy':
+        return x, np.array([charts_data.y[charts_data.labels.index(res)] for res in resources])
+
+    rows = []
+    for res in resources:
+        chart_data = report().resource_allocation[res]
+        res_x = np.array(chart_data.x)
+        index = np.clip(np.searchsorted(res_x, x, side='right') - 1, 0, len(res_x) - 1)
+        rows.append(np.array(chart_data.y)[index])
+    return x, np.array(rows)
+
+
+def sort_resources(report, resources: list[str], sort: str) -> list[str]:
+    """Order heatmap rows by selection order, or by descending mean utilisation or mean
+    queue length.  (Queue lengths are not time-resolved, so they are a sort key only.)"""
+    if sort == 'selection':
+        return resources
+    chart_data = (
+        report().utilization_by_resource if sort == 'utilisation'
+        else report().q_length_by_resource
+    )
+    key = dict(zip(chart_data.x, chart_data.y))
+    return sorted(resources, key=lambda res: key.get(res, 0), reverse=True)
+
+
+def util_heatmap_figure(report, resources: list[str], layer: str, time_unit: str,
+                        statistic: str, fold: str, sort: str):
+    """Heatmap of a per-resource hourly layer over resources × time.  If ``fold`` is
+    ``'week'``, the time axis is folded into day of week × hour of day; otherwise, daily and
+    weekly time units are rolled up as in :py:func:`series_figure`."""
+    resources = sort_resources(report, resources, sort)
+    x, z = heatmap_matrix(report, resources, layer)
+    if fold == 'week':
+        x, z = rollup.fold_weekly(x, z)
+        xaxis = {'title': 'Hour of week', 'tickvals': list(range(0, 168, 24)),
+                 'ticktext': WEEKDAYS}
+    else:
+        scale = TIME_UNIT_SCALES[time_unit]
+        if is_rollup(time_unit, statistic):
+            rolled = [rollup.rollup(x, row, scale, statistic) for row in z]
+            x, z = rolled[0][0], np.array([values for _, values in rolled])
+        x = x/scale
+        xaxis = {'title': f'Time ({time_unit})'}
+    return go.Figure(
+        go.Heatmap(x=x, y=resources, z=z, colorscale='Viridis',
+                   colorbar={'title': HEATMAP_LAYERS[layer]}),
+        layout={
+            'title': 'Utilisation by Resource (hourly)' if layer == 'busy'
+            else 'Allocation by Resource (hourly)',
+            'xaxis': xaxis,
+            'yaxis': {'autorange': 'reversed'},
+            'height': max(400, 20*len(resources) + 200)
+        }
+    )
+
+
+STATS_THRESHOLDS = {'wip': 10, 'util-hourly': 0.9}
+"""Default congestion thresholds of the summary statistics panels, by section: the number
+of specimens in progress at a stage, and the fraction of a resource's allocation that is
+busy."""
+
+
+def series_stats_rows(report, section: str, threshold: float) -> list[dict]:
+    """Summary statistics of every WIP or hourly utilisation series of the report.  Hourly
+    utilisation is taken relative to the number of resources allocated, so that the
+    threshold is a utilisation fraction (hours with nothing allocated are ignored)."""
+    if section == 'wip':
+        charts_data = report().wip_by_stage
+        return series_stats.summary_rows(
+            charts_data.labels, charts_data.x, charts_data.y, threshold
+        )
+    resources = list(report().hourly_utilization_by_resource.labels)
+    x, busy = heatmap_matrix(report, resources, 'busy')
+    _, allocated = heatmap_matrix(report, resources, 'allocated')
+    utilisation = np.divide(busy, allocated, out=np.full(busy.shape, np.nan),
+                            where=allocated > 0)
+    return series_stats.summary_rows(resources, x, utilisation, threshold)
+
+
+def stats_coldefs(section: str) -> list[dict]:
+    """Column settings of a summary statistics grid, initially sorted by the longest stretch
+    above the threshold so that the worst bottlenecks come first."""
+    value_format = '.1%' if section == 'util-hourly' else '.2f'
+    formats = {
+        'mean': value_format,
+        'peak': value_format,
+        'p95': value_format,
+        'hours_above': '.1f',
+        'fraction_above': '.1%',
+        'longest_above': '.1f',
+    }
+    return [
+        {'field': 'series', 'headerName': 'Stage' if section == 'wip' else 'Resource',
+         'sortable': True, 'pinned': 'left'},
+        *[
+            {
+                'field': name,
+                'headerName': series_stats.STATISTICS[name],
+                'sortable': True,
+                'valueFormatter': {
+                    'function': f'params.value == null ? "" : d3.format("{fmt}")(params.value)'
+                },
+                **({'sort': 'desc'} if name == 'longest_above' else {})
+            }
+            for name, fmt in formats.items()
+        ]
+    ]
+
+
+@composition
+def stats_panel(section: str, threshold_label: str):
+    """Sortable grid of summary statistics of all series in a section, with an input for the
+    congestion threshold.  Filled in by :py:func:`gen_series_stats`."""
+    with html.Div() as ret:
+        with dbc.Row(align='center'):
+            with dbc.Col(width='auto', class_name='p-2'):
+                yield html.B('Summary statistics')
+            with dbc.Col(width='auto', class_name='p-2'):
+                with dbc.InputGroup():
+                    yield dbc.InputGroupText(threshold_label)
+                    yield dbc.Input(
+                        id=f'stats-{section}-threshold',
+                        type='number',
+                        min=0,
+                        step=0.05 if section == 'util-hourly' else 1,
+                        value=STATS_THRESHOLDS[section],
+                        debounce=True
+                    )
+        yield dag.AgGrid(
+            id=f'stats-{section}-grid',
+            rowData=[],
+            columnDefs=stats_coldefs(section),
+            columnSize='sizeToFit',
+            style={'height': '300px'}
+        )
+    return ret
+
+
+def warm_figures(scenario_id: int, report: kpis.Report) -> None:
+    """Build the page layout, and the figures of the default view (daily, time-weighted mean)
+    of each time series, into the layout and figure caches.  Registered with
+    :py:mod:`prefetch`."""
+    scenario_name, _ = reports.get_report(scenario_id)
+    cache.cached_layout((scenario_id, 'body'), scenario_body, scenario_id, scenario_name, report)
+    sections = {
+        'res-alloc': list(report.resource_allocation.keys()),
+        'wip': report.wip_by_stage.labels,
+        'util-hourly': report.hourly_utilization_by_resource.labels,
+    }
+    for section, names in sections.items():
+        for series in names:
+            cache.cached_figure(
+                (scenario_id, section, series, 'days', 'twa'),
+                series_figure, pyramid_loader(scenario_id, lambda: report, section, series),
+                series, 'days', Y_TITLES[section], 'twa'
+            )
+    for section, threshold in STATS_THRESHOLDS.items():
+        cache.cached_json(
+            (scenario_id, f'stats-{section}', threshold),
+            series_stats_rows, lambda: report, section, threshold
+        )
+
+
+prefetch.register_warmer(warm_figures)
+
+
+def lod_slot(section: str, series: str, time_unit: str, statistic: str) -> html.Div:
+    """Placeholder for a time series plot, of the same height as the plot.  The plot is
+    mounted by :py:func:`mount_plot` when the placeholder is scrolled into view, as reported
+    by ``assets/lazyPlots.js`` via the ``lod-visible`` store."""
+    visible_id = lod_graph_id(section, series, time_unit, statistic, kind='visible')
+    return html.Div([
+        dcc.Store(id=visible_id, data=False),
+        html.Div(
+            html.Div(series, className='text-muted p-3'),
+            id=lod_graph_id(section, series, time_unit, statistic, kind='slot'),
+            className='lod-slot',
+            style={'minHeight': '450px'},
+            **{'data-visible-store': json.dumps(visible_id)}
+        )
+    ])
+
+
 @callback(
     Output('container-res-alloc', 'children'),
     Input('multi-dropdown-res-alloc', 'value'),  # Multi-select: which plots to display
     Input('view-res-alloc-layout-value', 'data'),  # Store: display width
     Input('select-res-alloc-timeunit', 'value'),  # Store: x-axis time unit
-    State('scenario-report', 'data')  # Simulation results
+    Input('select-res-alloc-statistic', 'value'),  # Select: rollup statistic
 )
 @composition
-def gen_res_alloc_plots(selected, width, time_unit, data):
-    """Generate plots for resource allocations over time."""
+def gen_res_alloc_plots(selected, width, time_unit, statistic):
+    """Generate placeholders for plots of resource allocations over time."""
     cols = 12 if width == 'wide' else 6 if width == 'medium' else 4
-    scale = 168 if time_unit == 'weeks' else 24 if time_unit == 'days' else 1
-    charts_data = kpis.Report.model_validate_json(data).resource_allocation
     with dbc.Container(fluid=True) as ret:
         with dbc.Row():  # Place all plots in a single Row as bootstrap will handle line wrapping
             for res in selected:
-                df = pd.DataFrame({
-                    f'Time ({time_unit})': np.array(charts_data[res].x)/scale,
-                    '# Allocated': charts_data[res].y
-                })
-                plot = px.line(
-                    df,
-                    x=f'Time ({time_unit})',
-                    y='# Allocated',
-                    title=res,
-                    render_mode='svg'
-                ).update_traces(
-                    line_shape="hv"
-                )
-                if time_unit == 'days':
-                    plot.update_xaxes(dtick=7, tick0=0)  # weekly ticks
                 with dbc.Col(width=cols):
-                    yield dcc.Graph(figure=plot)
+                    yield lod_slot('res-alloc', res, time_unit, statistic)
     return ret
 
 
@@ -735,39 +1298,17 @@ def gen_res_alloc_plots(selected, width, time_unit, data):
     Input('multi-dropdown-wip', 'value'),  # Multi-select: which plots to display
     Input('view-wip-layout-value', 'data'),  # Store: display width
     Input('select-wip-timeunit', 'value'),  # Store: x-axis time unit
-    State('scenario-report', 'data')  # Simulation results
+    Input('select-wip-statistic', 'value'),  # Select: rollup statistic
 )
 @composition
-def gen_wip_plots(selected, width, time_unit, data):
-    """Generate plots for resource allocations over time."""
+def gen_wip_plots(selected, width, time_unit, statistic):
+    """Generate placeholders for plots of WIP by stage over time."""
     cols = 12 if width == 'wide' else 6 if width == 'medium' else 4
-    scale = 168 if time_unit == 'weeks' else 24 if time_unit == 'days' else 1
-    charts_data = kpis.Report.model_validate_json(data).wip_by_stage
-    df = pd.DataFrame(
-        data=np.array(charts_data.y).T,
-        index=np.array(charts_data.x)/scale,
-        columns=charts_data.labels
-    ).reset_index()
     with dbc.Container(fluid=True) as ret:
         with dbc.Row():  # Place all plots in a single Row as bootstrap will handle line wrapping
             for stage in selected:
-                plot = px.line(
-                    df,
-                    x="index",
-                    y=stage,
-                    title=stage,
-                    render_mode='svg'
-                ).update_traces(
-                    line_shape="hv"
-                ).update_xaxes(
-                    title=f'Time ({time_unit})'
-                ).update_yaxes(
-                    title='Hourly mean WIP'
-                )
-                if time_unit == 'days':
-                    plot.update_xaxes(dtick=7, tick0=0)  # weekly ticks
                 with dbc.Col(width=cols):
-                    yield dcc.Graph(figure=plot)
+                    yield lod_slot('wip', stage, time_unit, statistic)
     return ret
 
 
@@ -776,37 +1317,128 @@ def gen_wip_plots(selected, width, time_unit, data):
     Input('multi-dropdown-util-hourly', 'value'),  # Multi-select: which plots to display
     Input('view-util-hourly-layout-value', 'data'),  # Store: display width
     Input('select-util-hourly-timeunit', 'value'),  # Store: x-axis time unit
-    State('scenario-report', 'data')  # Simulation results
+    Input('select-util-hourly-statistic', 'value'),  # Select: rollup statistic
+    Input('view-util-hourly-mode', 'value'),  # RadioItems: line charts or heatmap
+    Input('select-util-hourly-layer', 'value'),  # Select: heatmap layer
+    Input('select-util-hourly-fold', 'value'),  # Select: heatmap folding
+    Input('select-util-hourly-sort', 'value'),  # Select: heatmap row order
+    State('scenario-id', 'data'),
+    background=True,
+    running=[(Output('progress-util-hourly', 'style'), {}, hidden)],
+    cancel=[Input('location', 'pathname')]  # Cancel if the user navigates away
 )
+@profiled()
 @composition
-def gen_util_hourly_plots(selected, width, time_unit, data):
-    """Generate plots for resource allocations over time."""
+def gen_util_hourly_plots(selected, width, time_unit, statistic,
+                          mode, layer, fold, sort, scenario_id):
+    """Generate a single resource × time heatmap of hourly utilisation, or placeholders for
+    one line chart per resource."""
     cols = 12 if width == 'wide' else 6 if width == 'medium' else 4
-    scale = 168 if time_unit == 'weeks' else 24 if time_unit == 'days' else 1
-    charts_data = kpis.Report.model_validate_json(data).hourly_utilization_by_resource
-    df = pd.DataFrame(
-        data=np.array(charts_data.y).T,
-        index=np.array(charts_data.x)/scale,
-        columns=charts_data.labels
-    ).reset_index()
     with dbc.Container(fluid=True) as ret:
+        if mode == 'heatmap':
+            if selected:
+                yield dcc.Graph(figure=cache.cached_figure(
+                    (scenario_id, 'util-heatmap', selected, time_unit, statistic,
+                     layer, fold, sort),
+                    util_heatmap_figure, report_fetcher(scenario_id), selected, layer, time_unit,
+                    statistic, fold, sort
+                ))
+            return ret
         with dbc.Row():  # Place all plots in a single Row as bootstrap will handle line wrapping
             for resource in selected:
-                plot = px.line(
-                    df,
-                    x="index",
-                    y=resource,
-                    title=resource,
-                    render_mode='svg'
-                ).update_traces(
-                    line_shape="hv"
-                ).update_xaxes(
-                    title=f'Time ({time_unit})'
-                ).update_yaxes(
-                    title='Mean # busy (hourly)'
-                )
-                if time_unit == 'days':
-                    plot.update_xaxes(dtick=7, tick0=0)  # weekly ticks
                 with dbc.Col(width=cols):
-                    yield dcc.Graph(figure=plot)
+                    yield lod_slot('util-hourly', resource, time_unit, statistic)
     return ret
+
+
+def gen_series_stats(section: str, threshold, scenario_id):
+    """Rows of the summary statistics grid of a section, from the figure cache if possible."""
+    if threshold is None:  # Invalid input
+        return dash.no_update
+    return cache.cached_json(
+        (scenario_id, f'stats-{section}', threshold),
+        series_stats_rows, report_fetcher(scenario_id), section, threshold
+    )
+
+
+@callback(
+    Output('stats-wip-grid', 'rowData'),
+    Input('stats-wip-threshold', 'value'),
+    State('scenario-id', 'data'),
+)
+def gen_wip_stats(threshold, scenario_id):
+    """Fill in the summary statistics of WIP by stage."""
+    return gen_series_stats('wip', threshold, scenario_id)
+
+
+@callback(
+    Output('stats-util-hourly-grid', 'rowData'),
+    Input('stats-util-hourly-threshold', 'value'),
+    State('scenario-id', 'data'),
+)
+def gen_util_hourly_stats(threshold, scenario_id):
+    """Fill in the summary statistics of hourly utilisation by resource."""
+    return gen_series_stats('util-hourly', threshold, scenario_id)
+
+
+@callback(
+    Output(lod_graph_id(MATCH, MATCH, MATCH, MATCH, kind='slot'), 'children'),
+    Input(lod_graph_id(MATCH, MATCH, MATCH, MATCH, kind='visible'), 'data'),
+    State('scenario-id', 'data'),
+    prevent_initial_call=True
+)
+@profiled()
+def mount_plot(visible, scenario_id):
+    """Mount a time series plot when its placeholder is scrolled into view, and unmount it
+    when scrolled far out of view, so that the number of live plots stays bounded."""
+    slot_id = dash.ctx.triggered_id
+    section, series = slot_id['section'], slot_id['series']
+    if not visible:
+        return html.Div(series, className='text-muted p-3')
+    plot = cache.cached_figure(
+        (scenario_id, section, series, slot_id['time_unit'], slot_id['statistic']),
+        series_figure, pyramid_loader(scenario_id, report_fetcher(scenario_id), section, series),
+        series, slot_id['time_unit'], Y_TITLES[section], slot_id['statistic']
+    )
+    return dcc.Graph(
+        id=lod_graph_id(section, series, slot_id['time_unit'], slot_id['statistic']),
+        figure=plot
+    )
+
+
+def x_window(relayout_data: dict | None) -> tuple[float | None, float | None] | None:
+    """Visible x-axis range from a plot's ``relayoutData``, with ``(None, None)`` meaning the
+    full range, or None if the event did not change the x-axis."""
+    relayout_data = relayout_data or {}
+    if relayout_data.get('xaxis.autorange'):
+        return None, None
+    if 'xaxis.range[0]' in relayout_data:
+        return float(relayout_data['xaxis.range[0]']), float(relayout_data['xaxis.range[1]'])
+    if 'xaxis.range' in relayout_data:
+        return tuple(float(x) for x in relayout_data['xaxis.range'])
+    return None
+
+
+@callback(
+    Output(lod_graph_id(MATCH, MATCH, MATCH, MATCH), 'figure'),
+    Input(lod_graph_id(MATCH, MATCH, MATCH, MATCH), 'relayoutData'),
+    State('scenario-id', 'data'),
+    prevent_initial_call=True
+)
+def load_plot_detail(relayout_data, scenario_id):
+    """Reload the data of a time series plot at the level of detail of the visible window
+    when the user zooms or pans.  Only the traces are replaced, so the zoom is preserved."""
+    graph_id = dash.ctx.triggered_id
+    window = x_window(relayout_data)
+    if window is None or is_rollup(graph_id['time_unit'], graph_id['statistic']):
+        return dash.no_update
+    scale = TIME_UNIT_SCALES[graph_id['time_unit']]
+    pyramid = pyramid_loader(
+        scenario_id, report_fetcher(scenario_id), graph_id['section'], graph_id['series']
+    )()
+    patch = dash.Patch()
+    patch['data'] = [
+        trace.to_plotly_json()
+        for trace in lod_traces(pyramid, scale, *(None if t is None else t*scale for t in window))
+    ]
+    return patch
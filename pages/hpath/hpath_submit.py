@@ -1,7 +1,10 @@
 """Page for submitting simulation jobs."""
 import logging
+import sqlite3
+import zipfile
 from base64 import b64decode
 from http import HTTPStatus
+from xml.etree import ElementTree
 
 import dash
 import dash_ag_grid as dag
@@ -9,10 +12,17 @@ import dash_bootstrap_components as dbc
 from dash_compose import composition
 import humanize
 import pandas as pd
+import plotly.graph_objects as go
 import requests
-from dash import Input, Output, State, callback, dcc, html
-
-from conf import HPATH_RESTFUL_HOST
+from plotly.colors import qualitative
+from plotly.subplots import make_subplots
+from dash import (ClientsideFunction, Input, Output, State, callback, clientside_callback, dcc,
+                  html)
+
+import arrivals
+import runtime_model
+import scenario_list
+from conf import HPATH_RESTFUL_HOST, RUNTIME_MIN_RUNS
 from pages import templates
 
 dash.register_page(__name__, title='Histopathology: Submit Scenarios', path='/hpath/submit')
@@ -31,7 +41,8 @@ sc_df_init = pd.DataFrame({
     'file_name': [],
     'sc_name': [],
     'file_base64': [],
-    'decode_len_str': []
+    'decode_len_str': [],
+    'digest': []
 })
 """Defines an empty scenarios dataframe. Required because some representations of
 an empty dataframe cannot hold column metadata."""
@@ -73,6 +84,18 @@ sc_grid_default_coldefs = {
 """Defines default column settings for the AG Grid object on this page.  See also
 ``sc_grid_coldefs`` for overrriden column settings."""
 
+PREVIEW_HINT = html.Span(
+    'Select a scenario in the table above to preview its arrival schedules.',
+    className='text-muted'
+)
+"""Placeholder for the arrival schedules preview, shown when no scenario is selected."""
+
+PREVIEW_TITLES = {
+    'ArrivalScheduleCancer': 'Cancer arrivals',
+    'ArrivalScheduleNonCancer': 'Non-cancer arrivals'
+}
+"""Subplot titles of the arrival schedules preview, by Excel table name."""
+
 #####################################################################
 ##                                                                 ##
 ##    ##          ###    ##    ##  #######  ##     ## ########     ##
@@ -216,6 +239,21 @@ def layout():
                         disabled=True,
                         color='secondary'
                     )
+                with dbc.Col(
+                    width='auto',
+                    class_name='m-0 align-self-center',
+                    id='hpath-submitter-submitting',
+                    style={'display': 'none'}
+                ):
+                    yield dbc.Spinner(size='sm')
+                    yield '\u2002Submitting...'
+
+            # Arrival schedules of the selected scenario
+            yield dcc.Store(id='hpath-submitter-schedules', data={})
+            yield dcc.Store(id='hpath-submitter-preview-key')
+            with dbc.Row(class_name='mx-0 mt-3'):
+                with dbc.Col(width=12, id='hpath-submitter-preview'):
+                    yield PREVIEW_HINT
 
         # Modal for Submit callback results
         #yield submit_msg_modal
@@ -242,6 +280,25 @@ def layout():
                 with dbc.Button(id="hpath-submitter-modal-close", n_clicks=0):
                     yield 'Close'
 
+        # Modal for confirming a submission, with the estimated run times
+        with dbc.Modal(
+            id='hpath-submitter-confirm-modal',
+            is_open=False,
+            backdrop='static',
+            size='lg'
+        ):
+            with dbc.ModalHeader():
+                yield dbc.ModalTitle('Confirm submission')
+            yield dbc.ModalBody(id='hpath-submitter-confirm-body')
+            with dbc.ModalFooter():
+                yield dbc.Button(
+                    'Cancel',
+                    id='hpath-submitter-confirm-cancel',
+                    color='secondary',
+                    className='ms-auto'
+                )
+                yield dbc.Button('Submit', id='hpath-submitter-confirm-btn', color='success')
+
     return ret
 
 ###############################################################################################
@@ -268,17 +325,16 @@ def download_hpath_template(_):
     return dcc.send_file('static/examples/config.xlsx')
 
 
-@callback(
+# Pure UI state is handled clientside (see assets/hpathClientside.js)
+clientside_callback(
+    ClientsideFunction('hpath', 'deleteSelectedRows'),
     Output('hpath-submitter-grid', 'deleteSelectedRows'),
     Input('hpath-submitter-delete-btn', 'n_clicks'),
     prevent_initial_call=True,
 )
-def hpath_submitter_delete_rows(_):
-    """Triggered when the "Delete selected rows" button is pressed."""
-    return True
-
 
-@callback(
+clientside_callback(
+    ClientsideFunction('hpath', 'inputStates'),
     Output('hpath-submitter-analysis-name', 'disabled'),
     Output('hpath-submitter-submit-btn', 'disabled'),
     Output('hpath-submitter-submit-btn', 'color'),
@@ -286,28 +342,6 @@ def hpath_submitter_delete_rows(_):
     Input('hpath-submitter-analysis-name', 'value'),
     Input('hpath-submitter-sim-length', 'value')
 )
-def input_states(row_data, name_value, sim_length_value):
-    """Checks if all inputs are valid and enables/disables the submit button
-    accordingly.  Also enables/disables the analysis name input for
-    single-scenario analyses."""
-
-    name_df = sc_df_init if row_data == [] else pd.DataFrame(row_data)
-    empty = len(name_df) == 0
-    multi = len(name_df) > 1
-    missing_analysis_name = multi and (name_value == '' or name_value is None)
-    try:
-        can_submit = (not empty
-                      and not missing_analysis_name
-                      and float(sim_length_value) > 0
-                      )
-    except ValueError:  # Catch invalid simulation length
-        can_submit = False
-
-    return (
-        len(name_df) < 2,
-        missing_analysis_name,
-        'success' if can_submit else 'secondary'
-    )
 
 
 @callback(
@@ -316,16 +350,19 @@ def input_states(row_data, name_value, sim_length_value):
     Output('hpath-submitter-alert', 'is_open'),
     Output('hpath-submitter-upload-files', 'contents'),
     Output('hpath-submitter-grid', 'rowData'),
+    Output('hpath-submitter-schedules', 'data'),
 
     Input('hpath-submitter-upload-files', 'contents'),
     Input('hpath-submitter-grid', 'cellValueChanged'),
     State('hpath-submitter-upload-files', 'filename'),
     State('hpath-submitter-grid', 'rowData'),
+    State('hpath-submitter-schedules', 'data'),
     prevent_inital_call=True
 )
-def manage_grid_data(contents, _, names, old_sc_data: dict):
+def manage_grid_data(contents, _, names, old_sc_data: dict, schedules: dict):
     """Manages file uploads and changes to scenario names
-    by updating the AG Grid data (name changes force re-sort)."""
+    by updating the AG Grid data (name changes force re-sort).  The arrival schedules of
+    uploaded files are read once, into a store keyed by content digest, for the preview."""
 
     sc_df = sc_df_init if old_sc_data == [] else pd.DataFrame(old_sc_data)
 
@@ -337,22 +374,28 @@ def manage_grid_data(contents, _, names, old_sc_data: dict):
                 dash.no_update,
                 dash.no_update,
                 None,
+                dash.no_update,
                 dash.no_update
             )
 
         n_new_files = 0
+        schedules = dict(schedules or {})
         for file_name, content in zip(names, contents):
             sc_name = file_name.rsplit('.xlsx', 1)[0]
             while sc_name in sc_df.sc_name.to_list():
                 sc_name = f'{sc_name} copy'
 
             # update pandas DataTable (name, scenario name)
-            b64string = content.split('base64,')[1]
+            data = b64decode(content.split('base64,')[1])
+            digest = arrivals.content_digest(data)
+            if digest not in schedules:
+                schedules[digest] = schedule_tables(data, file_name)
             new_row = pd.DataFrame({
                 'file_name': [file_name],
                 'sc_name': [sc_name],
                 'file_base64': content,
-                'decode_len_str': humanize.naturalsize(len(b64decode(b64string)))
+                'decode_len_str': humanize.naturalsize(len(data)),
+                'digest': digest
             })
             sc_df: pd.DataFrame = pd.concat([sc_df, new_row], axis='rows', ignore_index=True)
             n_new_files += 1
@@ -370,30 +413,218 @@ def manage_grid_data(contents, _, names, old_sc_data: dict):
             'success',
             True,
             None,
-            sc_data
+            sc_data,
+            {digest: val for digest, val in schedules.items() if digest in set(sc_df.digest)}
         )
     return (
         dash.no_update,
         dash.no_update,
         dash.no_update,
         None,
-        sc_data
+        sc_data,
+        dash.no_update
+    )
+
+
+def schedule_tables(data: bytes, file_name: str) -> dict[str, dict]:
+    """The arrival schedules of an uploaded configuration file, as ``{table name: {'columns':
+    [...], 'data': [[...], ...]}}``, or empty if the file cannot be read."""
+    try:
+        schedules = arrivals.arrival_schedules(data)
+    except (zipfile.BadZipFile, KeyError, IndexError, ElementTree.ParseError, ValueError) as exc:
+        logging.getLogger('dash.dash').error(
+            'Arrival schedules of %s not read: %s', file_name, exc)
+        return {}
+    return {
+        name: {'columns': [str(col) for col in schedule.columns],
+               'data': schedule.to_numpy().tolist()}
+        for name, schedule in schedules.items()
+    }
+
+
+def arrival_figure(schedules: dict[str, pd.DataFrame]) -> go.Figure:
+    """Plot the hourly arrival rates of each arrival schedule table, one line per day of the
+    week, with the tables side by side."""
+    fig = make_subplots(
+        rows=1, cols=len(schedules), shared_yaxes=True,
+        subplot_titles=[PREVIEW_TITLES.get(name, name) for name in schedules]
     )
+    for col, schedule in enumerate(schedules.values(), start=1):
+        hours, days = schedule.columns[0], schedule.columns[1:]
+        for i, day in enumerate(days):
+            fig.add_trace(
+                go.Scatter(
+                    x=schedule[hours], y=schedule[day], name=day, legendgroup=day,
+                    showlegend=col == 1, line={'shape': 'hv'},
+                    marker_color=qualitative.Plotly[i % len(qualitative.Plotly)]
+                ),
+                row=1, col=col
+            )
+        fig.update_xaxes(title_text=hours, dtick=3, row=1, col=col)
+    fig.update_yaxes(title_text='Arrivals per hour', row=1, col=1)
+    fig.update_layout(height=350, margin={'t': 40, 'b': 40})
+    return fig
+
+
+clientside_callback(
+    ClientsideFunction('hpath', 'previewKey'),
+    Output('hpath-submitter-preview-key', 'data'),
+    Input('hpath-submitter-grid', 'selectedRows'),
+    State('hpath-submitter-preview-key', 'data'),
+    prevent_initial_call=True
+)
+
+
+@callback(
+    Output('hpath-submitter-preview', 'children'),
+    Input('hpath-submitter-preview-key', 'data'),
+    State('hpath-submitter-schedules', 'data'),
+    prevent_initial_call=True
+)
+def preview_arrivals(key, tables):
+    """Plot the arrival schedules of the first selected scenario, read when its file was
+    uploaded.  Only the file's digest and names are sent (see ``previewKey`` in
+    ``assets/hpathClientside.js``), not the file itself."""
+    if not key:
+        return PREVIEW_HINT
+    schedules = {
+        name: pd.DataFrame(val['data'], columns=val['columns'])
+        for name, val in (tables or {}).get(key['digest'], {}).items()
+    }
+    if not schedules:
+        return html.Span(
+            f"No arrival schedules found in {key.get('file_name')}.",
+            style={'color': 'crimson'}
+        )
+    return [
+        html.B(f"Arrival schedules: {key.get('sc_name')}"),
+        dcc.Graph(figure=arrival_figure(schedules), config={'displayModeBar': False})
+    ]
+
+
+def valid_sim_length(sim_length) -> float | None:
+    """The simulation length as a positive number, or None if it is missing or invalid."""
+    try:
+        value = float(sim_length)
+    except (TypeError, ValueError):
+        return None
+    return value if 0 < value < float('inf') else None
+
+
+def sim_hours(sim_length: float, sim_length_unit: str) -> float:
+    """Simulation length in hours."""
+    return sim_length * (
+        168 if sim_length_unit == "Weeks"
+        else 24 if sim_length_unit == "Days"
+        else 1
+    )
+
+
+def scenario_features(sc_data: list[dict], hours: float) -> dict[int, dict[str, float]]:
+    """Run time model features of the uploaded scenarios, by row index (see
+    :py:func:`runtime_model.config_features`).  Scenario names need not be unique.  Scenarios
+    whose files cannot be read are omitted."""
+    features = {}
+    for i, row in enumerate(sc_data):
+        try:
+            features[i] = runtime_model.config_features(
+                b64decode(row['file_base64'].split('base64,')[1]), hours)
+        except (zipfile.BadZipFile, KeyError, IndexError, ElementTree.ParseError,
+                ValueError) as exc:
+            logging.getLogger('dash.dash').error(
+                'Features of scenario %s not read: %s', row.get('sc_name'), exc)
+    return features
+
+
+def format_duration(seconds: float | None) -> str:
+    """Format an estimated run time, e.g. "2h 05m"."""
+    if seconds is None:
+        return 'Unknown'
+    minutes = round(seconds / 60)
+    return f'{minutes // 60}h {minutes % 60:02d}m' if minutes >= 60 else f'{minutes}m'
+
+
+@callback(
+    Output('hpath-submitter-confirm-modal', 'is_open'),
+    Output('hpath-submitter-confirm-body', 'children'),
+    Output('hpath-submitter-confirm-btn', 'disabled'),
+    Input('hpath-submitter-submit-btn', 'n_clicks'),
+    State('hpath-submitter-grid', 'rowData'),
+    State('hpath-submitter-sim-length', 'value'),
+    State('hpath-submitter-sim-length-units', 'value'),
+    prevent_initial_call=True
+)
+def confirm_submission(_, sc_data, sim_length, sim_length_unit):
+    """Show the estimated run time of each scenario, and in total, for confirmation before
+    the job is submitted.  Submission is disabled if the simulation length is invalid."""
+    sim_length = valid_sim_length(sim_length)
+    if sim_length is None:
+        return True, html.Span(
+            'Enter a positive simulation length.', style={'color': 'crimson'}
+        ), True
+    hours = sim_hours(sim_length, sim_length_unit)
+    features = scenario_features(sc_data, hours)
+    try:
+        estimates = runtime_model.estimate(list(features.values()))
+    except sqlite3.Error as exc:
+        logging.getLogger('dash.dash').error('Run time estimate failed: %s', exc)
+        estimates = None
+    by_row = dict(zip(features, estimates)) if estimates is not None else {}
+
+    table = pd.DataFrame({
+        'Scenario': [row['sc_name'] for row in sc_data],
+        'Simulated hours': [f'{hours:g}'] * len(sc_data),
+        'Expected specimens': [
+            f"{features[i]['arrivals_per_hour'] * hours:,.0f}" if i in features else 'Unknown'
+            for i in range(len(sc_data))
+        ],
+        'Estimated run time': [format_duration(by_row.get(i)) for i in range(len(sc_data))]
+    })
+    children = [
+        dbc.Table.from_dataframe(
+            table, striped=True, bordered=True, hover=True, class_name='mb-2 right-align-last'
+        )
+    ]
+    if estimates is None:
+        children.append(html.P(
+            f'Run times are estimated once {RUNTIME_MIN_RUNS} submitted scenarios have '
+            'completed.', className='text-muted mb-0'
+        ))
+    else:
+        children.append(html.P([
+            html.B('Total estimated run time: '),
+            f'{format_duration(sum(estimates))} ',
+            '(if run one after another; includes time spent queued)'
+        ], className='mb-0'))
+    return True, children, False
+
+
+clientside_callback(
+    ClientsideFunction('hpath', 'closeModal'),
+    Output('hpath-submitter-confirm-modal', 'is_open', allow_duplicate=True),
+    Input('hpath-submitter-confirm-cancel', 'n_clicks'),
+    Input('hpath-submitter-confirm-btn', 'n_clicks'),
+    prevent_initial_call=True
+)
 
 
 @callback(
     Output('hpath-submitter-modal', 'is_open'),
     Output('hpath-submitter-modal-body', 'children'),     # Modal message
     Output('hpath-submitter-view-results-btn', 'style'),  # Show/hide "View Results" button
-    Input('hpath-submitter-submit-btn', 'n_clicks'),
+    Input('hpath-submitter-confirm-btn', 'n_clicks'),
     State('hpath-submitter-grid', 'rowData'),
     State('hpath-submitter-analysis-name', 'value'),
     State('hpath-submitter-sim-length', 'value'),
     State('hpath-submitter-sim-length-units', 'value'),
-    prevent_initial_call=True
+    prevent_initial_call=True,
+    background=True,
+    running=[(Output('hpath-submitter-submitting', 'style'), {}, {'display': 'none'})],
+    cancel=[Input('location', 'pathname')]  # Cancel if the user navigates away
 )
 def submit_or_close_modal(_, sc_data, analysis_name, sim_length, sim_length_unit):
-    """Process a simulation job request when the Submit button is pressed."""
+    """Process a simulation job request when the submission is confirmed.  Runs as a
+    background callback so that a slow backend does not block the web workers."""
 
     logger = logging.getLogger('dash.dash')
 
@@ -401,16 +632,19 @@ def submit_or_close_modal(_, sc_data, analysis_name, sim_length, sim_length_unit
     if len(sc_data) > 1:
         logger.info("Analysis name: %s", analysis_name)
 
-    # sim_length and sim_length_unit should already be validated by Dash input constraints
-    sim_length_unit_factor = (
-        168 if sim_length_unit == "Weeks"
-        else 24 if sim_length_unit == "Days"
-        else 1
-    )
+    # sim_length should already be validated by confirm_submission
+    sim_length = valid_sim_length(sim_length)
+    if sim_length is None:
+        logger.error('Invalid simulation length.')
+        return (
+            True,
+            html.Div("Invalid simulation length.", className='m-0', style={'color': 'crimson'}),
+            {'display': 'none'}
+        )
 
     # parameters common to all submitted scenarios
     params = {
-        'sim_hours': sim_length * sim_length_unit_factor,
+        'sim_hours': sim_hours(sim_length, sim_length_unit),
         'num_reps': 1,
         'analysis_name': analysis_name
     }
@@ -421,7 +655,10 @@ def submit_or_close_modal(_, sc_data, analysis_name, sim_length, sim_length_unit
             url=f'{HPATH_RESTFUL_HOST}/submit/',
             json={
                 'params': params,
-                'scenarios': sc_data
+                'scenarios': [
+                    {name: val for name, val in row.items() if name != 'digest'}
+                    for row in sc_data
+                ]
             },
             timeout=10
         )
@@ -443,6 +680,13 @@ def submit_or_close_modal(_, sc_data, analysis_name, sim_length, sim_length_unit
 
     if response.status_code == HTTPStatus.OK:
         logger.info('OK!')
+        scenario_list.invalidate()  # Show the new scenarios on the next list refresh
+        try:
+            features = scenario_features(sc_data, params['sim_hours'])
+            runtime_model.record_submission(
+                analysis_name, [(sc_data[i]['sc_name'], val) for i, val in features.items()])
+        except sqlite3.Error as exc:
+            logger.error('Submission not recorded for run time estimates: %s', exc)
         return (
             True,
             f"Sucessfully created {'single' if len(sc_data) == 1 else 'multi'}-scenario analysis!",
@@ -465,11 +709,9 @@ def submit_or_close_modal(_, sc_data, analysis_name, sim_length, sim_length_unit
     )
 
 
-@callback(
+clientside_callback(
+    ClientsideFunction('hpath', 'closeModal'),
     Output('hpath-submitter-modal', 'is_open', allow_duplicate=True),
     Input('hpath-submitter-modal-close', 'n_clicks'),
     prevent_initial_call=True
 )
-def close_modal(_):
-    """Closes the modal dialog for submission-related messages."""
-    return False
@@ -0,0 +1,190 @@
+"""Page for listing and inspecting recent callback profiles."""
+from datetime import datetime
+
+import dash
+import dash_ag_grid as dag
+import dash_bootstrap_components as dbc
+from dash import Input, Output, callback, dcc, html
+from dash_compose import composition
+import humanize
+import pandas as pd
+from plotly import express as px
+
+import payload
+import profiling
+from conf import (MEMORY_PROFILING_MODE, PAYLOAD_TRACKING_MODE, PROFILING_HEADER, PROFILING_MODE,
+                  PROFILING_QUERY_PARAM)
+from pages import templates
+
+dash.register_page(__name__, title='Profiling', path='/profiling')
+
+profiles_grid_coldefs = [
+    {'field': 'file_name', 'headerName': 'File name', 'width': '420px'},
+    {'field': 'callback', 'headerName': 'Callback', 'width': '200px'},
+    {'field': 'created', 'headerName': 'Created', 'width': '200px', 'sort': 'desc'},
+    {'field': 'size_str', 'headerName': 'Size', 'width': '120px'},
+]
+"""Defines column settings for the CPU profiles AG Grid object on this page."""
+
+memory_grid_coldefs = [
+    {'field': 'callback', 'headerName': 'Callback', 'width': '420px'},
+    {'field': 'created', 'headerName': 'Time', 'width': '200px'},
+    {'field': 'pid', 'headerName': 'PID', 'width': '100px'},
+    {'field': 'peak_bytes', 'headerName': 'Peak', 'width': '120px',
+     'valueFormatter': {'function': 'd3.format(".3s")(params.value) + "B"'}},
+    {'field': 'net_bytes', 'headerName': 'Net', 'width': '120px',
+     'valueFormatter': {'function': 'd3.format(".3s")(params.value) + "B"'}},
+]
+"""Defines column settings for the memory profiles AG Grid object on this page."""
+
+payload_grid_coldefs = [
+    {'field': 'property', 'headerName': 'Property', 'width': '420px'},
+    {'field': 'direction', 'headerName': 'Direction', 'width': '120px'},
+    {'field': 'count', 'headerName': 'Requests', 'width': '120px'},
+    {'field': 'mean_bytes', 'headerName': 'Mean', 'width': '120px',
+     'valueFormatter': {'function': 'd3.format(".3s")(params.value) + "B"'}},
+    {'field': 'max_bytes', 'headerName': 'Max', 'width': '120px', 'sort': 'desc',
+     'valueFormatter': {'function': 'd3.format(".3s")(params.value) + "B"'}},
+    {'field': 'budget_bytes', 'headerName': 'Budget', 'width': '120px',
+     'valueFormatter': {
+         'function': 'params.value == null ? "" : d3.format(".3s")(params.value) + "B"'
+     },
+     'cellStyle': {'function': 'params.value != null && params.data.max_bytes > params.value'
+                              ' ? {color: "crimson", fontWeight: "bold"} : {}'}},
+]
+"""Defines column settings for the payload sizes AG Grid object on this page."""
+
+MEMORY_RECORDS_SHOWN = 200
+"""Number of most recent per-callback memory records to show."""
+
+
+@composition
+def layout():
+    """Page layout."""
+    with dbc.Stack(gap=3) as ret:
+        yield templates.breadcrumb(['Home', 'Profiling'], ['profiling'])
+        yield templates.page_title('Callback Profiles')
+        with html.Div():
+            yield html.B('Profiling mode: ')
+            yield html.Code(PROFILING_MODE)
+            if PROFILING_MODE == 'request':
+                yield f' (add the {PROFILING_HEADER} header or the '
+                yield html.Code(f'?{PROFILING_QUERY_PARAM}=1')
+                yield ' query parameter to a page URL)'
+        with dbc.Row():
+            with dbc.Col(width='auto'):
+                yield dbc.Button(
+                    ['Refresh ', html.Span(className='fa fa-arrows-rotate')],
+                    id='btn-profiles-refresh',
+                    color='info'
+                )
+        yield dag.AgGrid(
+            id='profiles-grid',
+            rowData=[],
+            columnDefs=profiles_grid_coldefs,
+            dashGridOptions={'rowSelection': 'single'}
+        )
+        yield html.Pre(id='profile-summary', style={'font-size': '0.8rem'})
+
+        yield html.H2('Memory', style={'font-size': '1.4rem'})
+        with html.Div():
+            yield html.B('Memory profiling mode: ')
+            yield html.Code(MEMORY_PROFILING_MODE)
+        yield dag.AgGrid(
+            id='memory-grid',
+            rowData=[],
+            columnDefs=memory_grid_coldefs,
+            defaultColDef={'sortable': True},
+            dashGridOptions={'rowSelection': 'single'}
+        )
+        yield html.Pre(id='memory-top-sites', style={'font-size': '0.8rem'})
+        yield dcc.Graph(id='memory-rss-graph')
+
+        yield html.H2('Payloads', style={'font-size': '1.4rem'})
+        with html.Div():
+            yield html.B('Payload tracking mode: ')
+            yield html.Code(PAYLOAD_TRACKING_MODE)
+        yield dag.AgGrid(
+            id='payload-grid',
+            rowData=[],
+            columnDefs=payload_grid_coldefs,
+            defaultColDef={'sortable': True}
+        )
+    return ret
+
+
+@callback(
+    Output('profiles-grid', 'rowData'),
+    Input('btn-profiles-refresh', 'n_clicks')
+)
+def load_profiles(_):
+    """Load or refresh the list of recent profiles."""
+    return [
+        {**p, 'size_str': humanize.naturalsize(p['size'])}
+        for p in profiling.list_profiles()
+    ]
+
+
+@callback(
+    Output('profile-summary', 'children'),
+    Input('profiles-grid', 'selectedRows'),
+    prevent_initial_call=True
+)
+def show_profile(selected_rows):
+    """Show the top functions (by cumulative time) of the selected profile."""
+    if not selected_rows:
+        return ''
+    try:
+        return profiling.profile_summary(selected_rows[0]['file_name'])
+    except (FileNotFoundError, OSError):
+        return 'Profile not found.'
+
+
+@callback(
+    Output('memory-grid', 'rowData'),
+    Output('memory-rss-graph', 'figure'),
+    Input('btn-profiles-refresh', 'n_clicks')
+)
+def load_memory_records(_):
+    """Load or refresh the per-callback memory records and the worker RSS plot."""
+    records = [
+        {**r, 'created': datetime.fromtimestamp(r['time']).strftime('%Y-%m-%d %H:%M:%S')}
+        for r in profiling.read_records('memory')[:MEMORY_RECORDS_SHOWN]
+    ]
+    df_rss = pd.DataFrame(profiling.read_records('rss'), columns=['time', 'pid', 'rss'])
+    df_rss['Time'] = pd.to_datetime(df_rss['time'], unit='s')
+    df_rss['RSS (MB)'] = df_rss['rss'] / 1e6
+    df_rss['Worker PID'] = df_rss['pid'].astype(str)
+    fig = px.line(
+        df_rss.sort_values('time'),
+        x='Time',
+        y='RSS (MB)',
+        color='Worker PID',
+        title='Worker RSS'
+    )
+    return records, fig
+
+
+@callback(
+    Output('memory-top-sites', 'children'),
+    Input('memory-grid', 'selectedRows'),
+    prevent_initial_call=True
+)
+def show_memory_record(selected_rows):
+    """Show the top allocation sites of the selected callback request."""
+    if not selected_rows:
+        return ''
+    return '\n'.join(
+        f"{humanize.naturalsize(site['size_diff'])}\t{site['count_diff']:+d} blocks\t"
+        f"{site['site']}"
+        for site in selected_rows[0]['top']
+    )
+
+
+@callback(
+    Output('payload-grid', 'rowData'),
+    Input('btn-profiles-refresh', 'n_clicks')
+)
+def load_payload_records(_):
+    """Load or refresh the payload sizes by component property."""
+    return payload.summarise_records(profiling.read_records('payload'))
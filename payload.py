@@ -0,0 +1,236 @@
+"""Measurement of the JSON payloads of Dash callbacks, and size budgets for them.
+
+Tracking is controlled by :py:data:`conf.PAYLOAD_TRACKING_MODE`, with the same values as
+:py:data:`conf.PROFILING_MODE`.  For each tracked callback request, :py:func:`register_hooks`
+records the serialised size of every input and state value sent by the browser and of every
+output value returned, by component property (``'<id>.<property>'``; pattern-matching IDs are
+reduced to their ``type``).  Records are appended to ``payload-<pid>.jsonl`` in
+:py:data:`conf.PROFILING_DIR` and summarised on the ``/profiling`` page.  Properties that
+exceed their budget in :py:data:`conf.PAYLOAD_BUDGETS` are logged as warnings.
+
+Run ``python -m payload`` to check the main callback outputs of the scenario results page
+against their budgets, for a synthetic 26-week report.  The exit status is 1 if any budget is
+exceeded, so that the check can be run before merging changes.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Iterable
+
+import flask
+import numpy as np
+
+import profiling
+from conf import PAYLOAD_BUDGETS, PAYLOAD_TRACKING_MODE
+
+
+def prop_key(component_id: str | dict, prop: str) -> str:
+    """Key of a component property in payload records and budgets."""
+    if isinstance(component_id, str) and component_id.startswith('{'):
+        component_id = json.loads(component_id)  # Pattern-matching ID in a response
+    if isinstance(component_id, dict):
+        component_id = component_id.get('type', json.dumps(component_id, sort_keys=True))
+    return f'{component_id}.{prop}'
+
+
+def json_size(value: Any) -> int:
+    """Size of a value serialised as JSON, in bytes."""
+    return len(json.dumps(value, separators=(',', ':')).encode())
+
+
+def _flatten(items: Iterable) -> Iterable[dict]:
+    """Input and state items of a callback request.  Pattern-matching (ALL, ALLSMALLER)
+    inputs are lists of items."""
+    for item in items:
+        if isinstance(item, list):
+            yield from item
+        else:
+            yield item
+
+
+def request_sizes(body: dict) -> dict[str, int]:
+    """Sizes of the input and state values in a callback request body, by property key.
+    Multiple values of the same key (from pattern-matching inputs) are added up."""
+    sizes: dict[str, int] = {}
+    for item in _flatten([*body.get('inputs', []), *body.get('state', [])]):
+        key = prop_key(item['id'], item['property'])
+        sizes[key] = sizes.get(key, 0) + json_size(item.get('value'))
+    return sizes
+
+
+def response_sizes(body: dict) -> dict[str, int]:
+    """Sizes of the output values in a callback response body, by property key.  Background
+    callback responses only contain outputs once the job has finished."""
+    sizes: dict[str, int] = {}
+    for component_id, props in body.get('response', {}).items():
+        for prop, value in props.items():
+            key = prop_key(component_id, prop)
+            sizes[key] = sizes.get(key, 0) + json_size(value)
+    return sizes
+
+
+def over_budget(sizes: dict[str, int]) -> dict[str, int]:
+    """The properties whose size exceeds their budget, with their sizes."""
+    return {
+        key: size for key, size in sizes.items()
+        if key in PAYLOAD_BUDGETS and size > PAYLOAD_BUDGETS[key]
+    }
+
+
+def register_hooks(server: flask.Flask) -> None:
+    """Install payload tracking of Dash callback requests on the Flask server.  Does nothing
+    if payload tracking is off."""
+    if PAYLOAD_TRACKING_MODE == 'off':
+        return
+    server.after_request(_after_request)
+
+
+def _after_request(response: flask.Response) -> flask.Response:
+    if (not flask.request.path.endswith('_dash-update-component')
+            or response.is_streamed
+            or not profiling.profiling_requested(PAYLOAD_TRACKING_MODE)):
+        return response
+    body = flask.request.get_json(silent=True) or {}
+    try:
+        outputs = response_sizes(json.loads(response.get_data()))
+    except ValueError:
+        outputs = {}
+    inputs = request_sizes(body)
+    exceeded = over_budget({**inputs, **outputs})
+    for key, size in exceeded.items():
+        logging.getLogger('dash.dash').warning(
+            'Payload budget exceeded: %s is %d bytes (budget %d)',
+            key, size, PAYLOAD_BUDGETS[key]
+        )
+    profiling.append_record('payload', {
+        'time': time.time(),
+        'pid': os.getpid(),
+        'callback': body.get('output', flask.request.path),
+        'inputs': inputs,
+        'outputs': outputs,
+        'over_budget': sorted(exceeded),
+    })
+    return response
+
+
+def summarise_records(records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Summarise payload records by property and direction: number of requests, mean and
+    maximum size, and budget."""
+    sizes: dict[tuple[str, str], list[int]] = {}
+    for record in records:
+        for direction in ['inputs', 'outputs']:
+            for key, size in record[direction].items():
+                sizes.setdefault((key, direction[:-1]), []).append(size)
+    return [
+        {
+            'property': key,
+            'direction': direction,
+            'count': len(values),
+            'mean_bytes': float(np.mean(values)),
+            'max_bytes': max(values),
+            'budget_bytes': PAYLOAD_BUDGETS.get(key),
+        }
+        for (key, direction), values in sorted(sizes.items())
+    ]
+
+
+# SYNTHETIC CHECK
+
+def synthetic_report(weeks: int = 26, n_resources: int = 12, n_stages: int = 10):
+    """A report with random hourly series over ``weeks`` weeks, sized like a real run."""
+    # pylint: disable=import-outside-toplevel
+    import kpis
+    import reports
+
+    rng = np.random.default_rng(0)
+    hours = weeks * 168
+    x = np.arange(hours, dtype=float).tolist()
+    resources = [f'Resource {i}' for i in range(n_resources)]
+    stages = [f'Stage {i}' for i in range(n_stages)]
+    return reports.regularised(kpis.Report.model_validate({
+        'overall_tat': 100.0,
+        'lab_tat': 50.0,
+        'progress': {'7': 0.7, '10': 0.85, '12': 0.9, '21': 0.99},
+        'lab_progress': {'3': 0.75},
+        'tat_by_stage': {'x': stages, 'y': rng.random(n_stages).tolist()},
+        'resource_allocation': {
+            res: {'x': (0.5*np.arange(2*hours)).tolist(),
+                  'y': rng.integers(0, 5, 2*hours).astype(float).tolist()}
+            for res in resources
+        },
+        'wip_by_stage': {'x': x, 'y': (20*rng.random((n_stages, hours))).tolist(),
+                         'labels': stages},
+        'utilization_by_resource': {'x': resources, 'y': rng.random(n_resources).tolist()},
+        'q_length_by_resource': {'x': resources, 'y': rng.random(n_resources).tolist()},
+        'hourly_utilization_by_resource': {'x': x, 'y': rng.random((n_resources, hours)).tolist(),
+                                           'labels': resources},
+        'tat_distribution': {'x': [0.0, 100.0, 200.0, 300.0], 'y': [0.0, 0.5, 0.9, 1.0]},
+    }))
+
+
+def synthetic_sizes(weeks: int = 26) -> dict[str, int]:
+    """Sizes of the main callback outputs of the scenario results page for a synthetic report,
+    for the largest of the display options where they matter.  Caches are bypassed, so that
+    the sizes reflect the current code, and callbacks that load the report by scenario ID get
+    the synthetic report."""
+    # pylint: disable=import-outside-toplevel
+    from unittest import mock
+
+    import dash
+    from plotly.io.json import to_json_plotly
+
+    import cache
+    import reports
+    dash.Dash(__name__)  # Page modules can only be imported once an app exists
+    from pages.hpath import hpath_show_scenario as page
+
+    report = synthetic_report(weeks)
+    stages = report.wip_by_stage.labels
+    resources = list(report.resource_allocation.keys())
+    time_units = [('days', 'twa'), ('hours', 'none')]
+    with (mock.patch.object(cache, 'FIGURE_CACHE', cache.NullStore()),
+          mock.patch.object(cache, 'PYRAMID_CACHE', cache.NullStore()),
+          mock.patch.object(cache, 'LAYOUT_CACHE', cache.NullStore()),
+          mock.patch.object(reports, 'get_report', lambda _: ('Synthetic', report))):
+        lod_figures = [
+            page.series_figure(
+                lambda: page.series_pyramid(lambda: report, 'wip', stages[0]),
+                stages[0], time_unit, page.Y_TITLES['wip'], statistic
+            )
+            for time_unit, statistic in time_units
+        ]
+        outputs = {
+            'scenario-result-body.children': page.scenario_body(0, 'Synthetic', report),
+            'container-res-alloc.children': page.gen_res_alloc_plots(
+                resources, 'medium', 'days', 'twa'),
+            'container-wip.children': page.gen_wip_plots(stages, 'medium', 'days', 'twa'),
+            'container-util-hourly.children': max(
+                (page.gen_util_hourly_plots(resources, 'medium', time_unit, statistic, mode,
+                                            'busy', 'none', 'selection', 0)
+                 for mode in ['lines', 'heatmap'] for time_unit, statistic in time_units),
+                key=lambda children: len(to_json_plotly(children))
+            ),
+            'lod-slot.children': max(lod_figures, key=lambda fig: len(to_json_plotly(fig))),
+            'stats-wip-grid.rowData': page.gen_wip_stats(10, 0),
+        }
+    return {
+        key: len(value.encode()) if isinstance(value, str) else len(to_json_plotly(value).encode())
+        for key, value in outputs.items()
+    }
+
+
+def main() -> int:
+    """Print the synthetic payload sizes and their budgets; return 1 if any is exceeded."""
+    sizes = synthetic_sizes()
+    exceeded = over_budget(sizes)
+    for key, size in sizes.items():
+        budget = PAYLOAD_BUDGETS.get(key)
+        status = 'OVER BUDGET' if key in exceeded else 'ok'
+        print(f'{key:40} {size:>12,d} / {budget or 0:>12,d} bytes  {status}')
+    return 1 if exceeded else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
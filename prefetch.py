@@ -0,0 +1,114 @@
+"""Background prefetching of newly completed scenario reports.
+
+Each worker remembers which scenarios it has seen completed, starting from the first scenario
+list it sees (so that a restarted worker does not prefetch scenarios completed before it
+started).  When
+:py:func:`scenarios_completed` is called with a scenario list containing newly completed
+scenarios, their reports are fetched and parsed in a small thread pool, warming this worker's
+report cache.  One worker (chosen by a Redis claim) then runs the registered warmers, e.g.
+to build the default figures into the shared figure cache, so that opening a newly
+completed result is usually a cache hit.
+
+Scenarios that leave the scenario list (e.g. purged) are forgotten, so that they are
+prefetched again if their IDs are reused after the database is cleared.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from redis.exceptions import RedisError
+
+import kpis
+import reports
+from conf import PREFETCH_CLAIM_SECONDS, PREFETCH_MAX_BATCH, PREFETCH_WORKERS
+from redis_conn import REDIS_CONN
+
+_warmers: list[Callable[[int, kpis.Report], None]] = []
+_seen_completed: set[int] | None = None
+"""IDs of the scenarios seen completed, or None before the first scenario list is seen."""
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_executor_pid: int | None = None
+"""PID of the process in which the thread pool was created (threads do not survive a fork,
+so each worker creates its own)."""
+
+
+def register_warmer(warmer: Callable[[int, kpis.Report], None]) -> None:
+    """Register a function to be called with the scenario ID and parsed report of each
+    prefetched scenario, e.g. to build figures into the figure cache."""
+    _warmers.append(warmer)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid  # pylint: disable=global-statement
+    if _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix='prefetch')
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def scenarios_completed(scenarios: list[dict]) -> None:
+    """Schedule prefetching of the scenarios in a (normalised) scenario list that have
+    completed since the last call.  At most ``PREFETCH_MAX_BATCH`` of the most recent
+    scenarios are prefetched per call."""
+    completed = {int(val['scenario_id']) for val in scenarios if val['result_link']}
+    listed = {int(val['scenario_id']) for val in scenarios}
+    global _seen_completed  # pylint: disable=global-statement
+    with _lock:
+        if _seen_completed is None:
+            _seen_completed = completed
+            return
+        new = sorted(completed - _seen_completed, reverse=True)[:PREFETCH_MAX_BATCH]
+        _seen_completed.intersection_update(listed)
+        _seen_completed.update(completed)
+        if not new:
+            return
+        executor = _get_executor()
+    for scenario_id in new:
+        executor.submit(_prefetch, scenario_id)
+
+
+def forget(scenario_id: int | None = None) -> None:
+    """Forget that ``scenario_id``, or all scenarios if None, was seen completed and warmed,
+    e.g. after it is purged, so that a new scenario with the same ID is prefetched again."""
+    with _lock:
+        if _seen_completed is None:
+            pass
+        elif scenario_id is None:
+            _seen_completed.clear()
+        else:
+            _seen_completed.discard(int(scenario_id))
+    try:
+        if scenario_id is not None:
+            REDIS_CONN.delete(f'hpath:prefetch:{int(scenario_id)}')
+            return
+        claim_keys = list(REDIS_CONN.scan_iter('hpath:prefetch:*'))
+        if claim_keys:
+            REDIS_CONN.delete(*claim_keys)
+    except RedisError as exc:
+        logging.getLogger('dash.dash').error('Prefetch claim invalidation failed: %s', exc)
+
+
+def _claim(scenario_id: int) -> bool:
+    """Claim the warming of a scenario's shared caches for this worker.  Returns True if
+    Redis is unavailable, as warming is idempotent."""
+    try:
+        return bool(REDIS_CONN.set(
+            f'hpath:prefetch:{scenario_id}', os.getpid(), nx=True, ex=PREFETCH_CLAIM_SECONDS
+        ))
+    except RedisError:
+        return True
+
+
+def _prefetch(scenario_id: int) -> None:
+    logger = logging.getLogger('dash.dash')
+    try:
+        _, report = reports.get_report(scenario_id)
+        if _claim(scenario_id):
+            for warmer in _warmers:
+                warmer(scenario_id, report)
+        logger.info('Prefetched scenario %s', scenario_id)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        logger.error('Prefetch of scenario %s failed: %s', scenario_id, exc)
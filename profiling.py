@@ -0,0 +1,241 @@
+"""Opt-in CPU and memory profiling of Dash callbacks.
+
+CPU profiling is controlled by :py:data:`conf.PROFILING_MODE`.  If the mode is ``'off'``,
+:py:func:`profiled` returns the decorated function unchanged, so there is no overhead
+at all.  Otherwise, each profiled call is run under :py:mod:`cProfile` and the results
+are written to :py:data:`conf.PROFILING_DIR` as a pstats file named
+``<callback>-<timestamp>-<pid>.prof``, which can be inspected with :py:mod:`pstats`,
+``snakeviz``, or the ``/profiling`` page of this app.
+
+Memory profiling is controlled by :py:data:`conf.MEMORY_PROFILING_MODE` and is installed
+for all callbacks by :py:func:`register_memory_hooks`.  Allocations are snapshotted with
+:py:mod:`tracemalloc` around each Dash callback request and the peak traced memory and top
+allocation sites are appended to ``memory-<pid>.jsonl``; worker RSS is sampled into
+``rss-<pid>.jsonl``.  Note that :py:mod:`tracemalloc` is process-wide, so figures for
+concurrent requests in the same worker overlap.
+"""
+import cProfile
+import functools
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import resource
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlsplit
+
+import flask
+
+from conf import (MEMORY_LOG_MAX_BYTES, MEMORY_PROFILING_FRAMES, MEMORY_PROFILING_MODE,
+                  MEMORY_PROFILING_TOP_N, PROFILING_DIR, PROFILING_HEADER, PROFILING_KEEP,
+                  PROFILING_MODE, PROFILING_QUERY_PARAM, RSS_SAMPLE_INTERVAL_SECONDS)
+
+PROFILE_SUFFIX = '.prof'
+"""File extension of pstats files written by this module."""
+
+
+def profiling_requested(mode: str = PROFILING_MODE) -> bool:
+    """Returns whether the current call should be profiled, based on the profiling mode and,
+    for mode ``'request'``, the headers and page URL of the current HTTP request."""
+    if mode == 'always':
+        return True
+    if mode != 'request' or not flask.has_request_context():
+        return False
+    if flask.request.headers.get(PROFILING_HEADER):
+        return True
+    if PROFILING_QUERY_PARAM in flask.request.args:
+        return True
+    # Dash callbacks are POSTed to /_dash-update-component, so check the page URL as well
+    page_query = parse_qs(urlsplit(flask.request.referrer or '').query)
+    return PROFILING_QUERY_PARAM in page_query
+
+
+def profiled(name: str | None = None) -> Callable[[Callable], Callable]:
+    """Decorator for profiling a callback (or page layout function).
+
+    Place this decorator *below* ``@callback(...)`` so that Dash registers the wrapped
+    function.  If profiling is off, the function is returned unchanged.
+    """
+    def decorator(func: Callable) -> Callable:
+        if PROFILING_MODE == 'off':
+            return func
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            if not profiling_requested():
+                return func(*args, **kwargs)
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                _dump_stats(profiler, label)
+        return wrapper
+    return decorator
+
+
+def _dump_stats(profiler: cProfile.Profile, label: str) -> None:
+    """Write profiler results to the profiling directory and prune old files."""
+    logger = logging.getLogger('dash.dash')
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(PROFILING_DIR, f'{label}-{timestamp}-{os.getpid()}{PROFILE_SUFFIX}')
+    try:
+        os.makedirs(PROFILING_DIR, exist_ok=True)
+        profiler.dump_stats(path)
+        logger.info('Profile written: %s', path)
+        for stale in list_profiles()[PROFILING_KEEP:]:
+            os.remove(os.path.join(PROFILING_DIR, stale['file_name']))
+    except OSError as exc:
+        logger.error('Could not write profile %s: %s', path, exc)
+
+
+def list_profiles() -> list[dict[str, Any]]:
+    """List profiler output files, newest first."""
+    try:
+        entries = [e for e in os.scandir(PROFILING_DIR)
+                   if e.is_file() and e.name.endswith(PROFILE_SUFFIX)]
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    return [
+        {
+            'file_name': e.name,
+            'callback': e.name.split('-', 1)[0],
+            'created': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(e.stat().st_mtime)),
+            'size': e.stat().st_size
+        }
+        for e in entries
+    ]
+
+
+def profile_summary(file_name: str, n_lines: int = 40) -> str:
+    """Return the top ``n_lines`` functions of a profile by cumulative time, as text."""
+    if file_name not in {p['file_name'] for p in list_profiles()}:
+        raise FileNotFoundError(file_name)  # also rejects paths outside PROFILING_DIR
+    stream = io.StringIO()
+    stats = pstats.Stats(os.path.join(PROFILING_DIR, file_name), stream=stream)
+    stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(n_lines)
+    return stream.getvalue()
+
+
+# MEMORY PROFILING
+
+_rss_sampler_pid: int | None = None
+"""PID of the process in which the RSS sampler thread was started (threads do not survive
+a fork, so each worker starts its own)."""
+
+
+def register_memory_hooks(server: flask.Flask) -> None:
+    """Install :py:mod:`tracemalloc` snapshots around Dash callback requests on the Flask
+    server.  Does nothing if memory profiling is off."""
+    if MEMORY_PROFILING_MODE == 'off':
+        return
+    tracemalloc.start(MEMORY_PROFILING_FRAMES)
+    server.before_request(_memory_before_request)
+    server.after_request(_memory_after_request)
+
+
+def current_rss() -> int:
+    """Return the resident set size of this process, in bytes."""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Not Linux: fall back to peak RSS (reported in KiB)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _sample_rss() -> None:
+    """Append an RSS sample for this worker every ``RSS_SAMPLE_INTERVAL_SECONDS``."""
+    while True:
+        append_record('rss', {'time': time.time(), 'pid': os.getpid(), 'rss': current_rss()})
+        time.sleep(RSS_SAMPLE_INTERVAL_SECONDS)
+
+
+def _is_callback_request() -> bool:
+    return flask.request.path.endswith('_dash-update-component')
+
+
+def _memory_before_request() -> None:
+    global _rss_sampler_pid  # pylint: disable=global-statement
+    if _rss_sampler_pid != os.getpid():
+        _rss_sampler_pid = os.getpid()
+        threading.Thread(target=_sample_rss, name='rss-sampler', daemon=True).start()
+
+    if not _is_callback_request() or not profiling_requested(MEMORY_PROFILING_MODE):
+        return
+    tracemalloc.reset_peak()
+    flask.g.mem_start = tracemalloc.get_traced_memory()[0]
+    flask.g.mem_snapshot = tracemalloc.take_snapshot()
+
+
+def _memory_after_request(response: flask.Response) -> flask.Response:
+    if 'mem_snapshot' not in flask.g:
+        return response
+    current, peak = tracemalloc.get_traced_memory()
+    trace_filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    )
+    diff = tracemalloc.take_snapshot().filter_traces(trace_filters).compare_to(
+        flask.g.mem_snapshot.filter_traces(trace_filters), 'lineno'
+    )
+    body = flask.request.get_json(silent=True) or {}
+    append_record('memory', {
+        'time': time.time(),
+        'pid': os.getpid(),
+        'callback': body.get('output', flask.request.path),
+        'peak_bytes': peak - flask.g.mem_start,
+        'net_bytes': current - flask.g.mem_start,
+        'top': [
+            {
+                'site': str(stat.traceback),
+                'size_diff': stat.size_diff,
+                'count_diff': stat.count_diff
+            }
+            for stat in diff[:MEMORY_PROFILING_TOP_N]
+        ]
+    })
+    return response
+
+
+def append_record(kind: str, record: dict[str, Any]) -> None:
+    """Append a JSON record to this worker's ``<kind>-<pid>.jsonl`` file, rotating the file
+    if it exceeds ``MEMORY_LOG_MAX_BYTES``."""
+    path = os.path.join(PROFILING_DIR, f'{kind}-{os.getpid()}.jsonl')
+    try:
+        os.makedirs(PROFILING_DIR, exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > MEMORY_LOG_MAX_BYTES:
+            os.replace(path, f'{path}.1')
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + '\n')
+    except OSError as exc:
+        logging.getLogger('dash.dash').error('Could not write %s record: %s', kind, exc)
+
+
+def read_records(kind: str) -> list[dict[str, Any]]:
+    """Read the ``'memory'``, ``'rss'`` or ``'payload'`` records of all workers, newest
+    first.  Malformed lines (e.g. a record still being written by another worker) are
+    skipped."""
+    records = []
+    for path in glob.glob(os.path.join(PROFILING_DIR, f'{kind}-*.jsonl')):
+        with open(path, encoding='utf-8') as file:
+            for n, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    float(record['time'])
+                except (ValueError, TypeError, KeyError) as exc:
+                    logging.getLogger('dash.dash').debug(
+                        'Skipped malformed record at %s:%d: %r', path, n, exc)
+                    continue
+                records.append(record)
+    records.sort(key=lambda r: r['time'], reverse=True)
+    return records
@@ -0,0 +1,189 @@
+"""Selective deletion of scenarios from the histopathology REST server.
+
+Scenarios are selected by analysis, age, status or ID (see :py:func:`select`) and deleted one
+at a time with ``DELETE /scenarios/<scenario_id>/``, so that a long purge can report progress
+and is not limited by a single request timeout.  The cached results of each scenario are
+invalidated as soon as it is deleted.
+
+A retention policy (:py:data:`conf.RETENTION_MAX_AGE_DAYS` and
+:py:data:`conf.RETENTION_MAX_SCENARIOS`) can purge old completed scenarios automatically.
+It is applied in the background by one worker at a time, at most once per
+:py:data:`conf.RETENTION_INTERVAL_SECONDS` (see :py:func:`apply_retention`).
+"""
+import logging
+import os
+import threading
+import time
+from http import HTTPStatus
+from math import isnan
+from typing import Callable
+
+import requests
+from redis.exceptions import RedisError
+
+import cache
+import scenario_list
+from conf import (HPATH_RESTFUL_HOST, PURGE_REQUEST_TIMEOUT_SECONDS, RETENTION_INTERVAL_SECONDS,
+                  RETENTION_MAX_AGE_DAYS, RETENTION_MAX_SCENARIOS)
+from redis_conn import REDIS_CONN
+
+RETENTION_KEY = 'hpath:purge:retention'
+"""Redis key held for :py:data:`conf.RETENTION_INTERVAL_SECONDS` by the worker that last
+applied the retention policy."""
+
+STATUSES = {'any': 'Any', 'completed': 'Completed', 'incomplete': 'Incomplete'}
+"""Status filters accepted by :py:func:`select`, with their labels."""
+
+_last_retention: float | None = None
+"""Time of the last application of the retention policy by this worker, used if Redis is
+unavailable."""
+
+
+def _timestamp(value) -> float | None:
+    """Return a raw or normalised (formatted) scenario list timestamp as a number, or None if
+    it is missing (NaN)."""
+    if isinstance(value, str):
+        try:
+            return scenario_list.parse_time(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, float) and not isnan(value) else None
+
+
+def select(scenarios: list[dict], analysis_ids: list[int] | None = None,
+           scenario_ids: list[int] | None = None, older_than_days: float | None = None,
+           status: str = 'any') -> list[int]:
+    """Return the IDs of the scenarios matching all of the given filters.  Filters that are
+    None (or empty) match all scenarios.
+
+    Args:
+        scenarios: Scenario list, as returned by :py:func:`scenario_list.fetch_scenarios`
+            or (normalised) by :py:func:`scenario_list.get_scenarios`.
+        analysis_ids: Only select scenarios in these analyses.
+        scenario_ids: Only select these scenarios.
+        older_than_days: Only select scenarios created more than this many days ago.
+        status: One of the keys of :py:data:`STATUSES`.
+    """
+    analysis_ids = {int(val) for val in analysis_ids} if analysis_ids else None
+    scenario_ids = {int(val) for val in scenario_ids} if scenario_ids else None
+    cutoff = None if older_than_days is None else time.time() - older_than_days * 86400
+    selected = []
+    for val in scenarios:
+        completed = _timestamp(val['completed']) is not None
+        created = _timestamp(val['created'])
+        if ((analysis_ids is None or val.get('analysis_id') in analysis_ids)
+                and (scenario_ids is None or int(val['scenario_id']) in scenario_ids)
+                and (cutoff is None or (created is not None and created < cutoff))
+                and (status == 'any' or completed == (status == 'completed'))):
+            selected.append(int(val['scenario_id']))
+    return sorted(selected)
+
+
+def is_unfiltered(analysis_ids=None, scenario_ids=None, older_than_days=None,
+                  status='any') -> bool:
+    """Whether the filters of :py:func:`select` would select every scenario."""
+    return not analysis_ids and not scenario_ids and older_than_days is None and status == 'any'
+
+
+def delete_scenario(scenario_id: int) -> None:
+    """Delete a scenario on the REST server and invalidate its cached results.  A scenario
+    that no longer exists counts as deleted, but a 404 response alone does not show that (the
+    deletion route itself may be missing), so the scenario list is checked first.
+
+    Raises:
+        requests.RequestException: The scenario could not be deleted.
+        ValueError: The scenario list could not be read.
+    """
+    response = requests.delete(
+        f'{HPATH_RESTFUL_HOST}/scenarios/{scenario_id}/',
+        timeout=PURGE_REQUEST_TIMEOUT_SECONDS
+    )
+    if (response.status_code != HTTPStatus.NOT_FOUND
+            or any(int(val['scenario_id']) == int(scenario_id)
+                   for val in scenario_list.fetch_scenarios())):
+        response.raise_for_status()
+    cache.invalidate_scenario(scenario_id)
+
+
+def delete_all() -> None:
+    """Clear the whole database on the REST server and invalidate all cached results.
+
+    Raises:
+        requests.RequestException: The database could not be cleared.
+    """
+    response = requests.delete(
+        url=f'{HPATH_RESTFUL_HOST}/',
+        json={'delete': 'yes'},
+        timeout=PURGE_REQUEST_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    cache.invalidate_all()
+
+
+def purge(scenario_ids: list[int],
+          progress: Callable[[int, int], None] | None = None) -> tuple[list[int], list[int]]:
+    """Delete scenarios one at a time, calling ``progress(done, total)`` after each.  Returns
+    the IDs of the deleted scenarios and of those that could not be deleted."""
+    logger = logging.getLogger('dash.dash')
+    deleted, failed = [], []
+    for i, scenario_id in enumerate(scenario_ids):
+        try:
+            delete_scenario(scenario_id)
+            deleted.append(scenario_id)
+        except (requests.RequestException, ValueError) as exc:
+            logger.error('Deletion of scenario %s failed: %s', scenario_id, exc)
+            failed.append(scenario_id)
+        if progress is not None:
+            progress(i + 1, len(scenario_ids))
+    logger.info('Purged %d scenarios (%d failed)', len(deleted), len(failed))
+    return deleted, failed
+
+
+def retention_candidates(scenarios: list[dict]) -> list[int]:
+    """Return the IDs of the completed scenarios to be purged under the retention policy.
+    Incomplete scenarios are never purged automatically."""
+    completed = sorted(
+        (val for val in scenarios if _timestamp(val['completed']) is not None),
+        key=lambda val: val['completed'],
+        reverse=True
+    )
+    expired = set()
+    if RETENTION_MAX_AGE_DAYS is not None:
+        cutoff = time.time() - RETENTION_MAX_AGE_DAYS * 86400
+        expired.update(int(val['scenario_id']) for val in completed if val['completed'] < cutoff)
+    if RETENTION_MAX_SCENARIOS is not None:
+        expired.update(int(val['scenario_id']) for val in completed[RETENTION_MAX_SCENARIOS:])
+    return sorted(expired)
+
+
+def _claim_retention() -> bool:
+    """Claim the next application of the retention policy for this worker, if it is due."""
+    global _last_retention  # pylint: disable=global-statement
+    try:
+        return bool(REDIS_CONN.set(
+            RETENTION_KEY, os.getpid(), nx=True, ex=RETENTION_INTERVAL_SECONDS
+        ))
+    except RedisError:
+        now = time.monotonic()
+        if _last_retention is not None and now - _last_retention < RETENTION_INTERVAL_SECONDS:
+            return False
+        _last_retention = now
+        return True
+
+
+def apply_retention() -> None:
+    """Apply the retention policy in a background thread, if it is configured and due."""
+    if RETENTION_MAX_AGE_DAYS is None and RETENTION_MAX_SCENARIOS is None:
+        return
+    if _claim_retention():
+        threading.Thread(target=_apply_retention, name='retention', daemon=True).start()
+
+
+def _apply_retention() -> None:
+    try:
+        scenario_ids = retention_candidates(scenario_list.fetch_scenarios())
+    except (requests.RequestException, ValueError) as exc:
+        logging.getLogger('dash.dash').error('Retention policy not applied: %s', exc)
+        return
+    if scenario_ids:
+        purge(scenario_ids)
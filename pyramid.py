@@ -0,0 +1,165 @@
+"""Multi-resolution min/mean/max pyramids for long step-function time series.
+
+Level 0 of a :py:class:`Pyramid` is the raw series.  Level 1 aggregates the series into
+equal-width time bins, holding the minimum, time-weighted mean and maximum of the step
+function over each bin, and every further level merges :py:data:`conf.PYRAMID_FACTOR`
+bins of the level below.  Levels are added until the coarsest level has at most
+:py:data:`conf.PYRAMID_MAX_POINTS` bins.
+
+:py:meth:`Pyramid.detail` returns the finest level whose points in a given time window
+fit within the point budget, so the number of points sent to the browser stays bounded
+at any zoom level.
+"""
+import io
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from conf import PYRAMID_FACTOR, PYRAMID_MAX_POINTS
+
+
+@dataclass
+class PyramidLevel:
+    """Aggregated level of a :py:class:`Pyramid`.  Bin ``j`` covers the time interval
+    ``[t0 + j*width, t0 + (j+1)*width)``."""
+    t0: float
+    width: float
+    ymin: np.ndarray
+    ymean: np.ndarray
+    ymax: np.ndarray
+
+    @property
+    def n(self) -> int:
+        """Number of bins."""
+        return len(self.ymean)
+
+    def bins(self, start: float, end: float) -> slice:
+        """Slice of the bins overlapping the time window ``[start, end]``."""
+        j0 = max(math.floor((start - self.t0) / self.width), 0)
+        j1 = min(math.ceil((end - self.t0) / self.width), self.n)
+        return slice(j0, max(j1, j0 + 1))
+
+    def coarsen(self, factor: int) -> 'PyramidLevel':
+        """Merge every ``factor`` consecutive bins into one."""
+        n_pad = -self.n % factor
+
+        def grouped(values):
+            return np.pad(values, (0, n_pad), constant_values=np.nan).reshape(-1, factor)
+
+        return PyramidLevel(
+            t0=self.t0,
+            width=self.width * factor,
+            ymin=np.nanmin(grouped(self.ymin), axis=1),
+            ymean=np.nanmean(grouped(self.ymean), axis=1),
+            ymax=np.nanmax(grouped(self.ymax), axis=1)
+        )
+
+
+def aggregate_steps(x: np.ndarray, y: np.ndarray, width: float) -> PyramidLevel:
+    """Aggregate the step function ``y(t) = y[i] for x[i] <= t < x[i+1]`` into bins of the
+    given width starting at ``x[0]``.  The last value is held until ``x[-1]``."""
+    n_bins = max(math.ceil((x[-1] - x[0]) / width), 1)
+    edges = np.minimum(x[0] + width * np.arange(n_bins + 1), x[-1])
+
+    # Min/max: over the value carried into each bin and the points inside it.  Pairs of
+    # (start, stop) indices make reduceat reduce y[start:stop] at every even position.
+    start = np.searchsorted(x, edges[:-1], side='right') - 1
+    stop = np.maximum(np.searchsorted(x, edges[1:], side='left'), start + 1)
+    y_ext = np.append(y, y[-1])  # stop may equal len(y)
+    indices = np.column_stack([start, stop]).ravel()
+    ymin = np.minimum.reduceat(y_ext, indices)[::2]
+    ymax = np.maximum.reduceat(y_ext, indices)[::2]
+
+    # Time-weighted mean: difference of the integral of the step function at the bin edges
+    area = np.concatenate([[0.0], np.cumsum(y[:-1] * np.diff(x))])
+    i = np.clip(np.searchsorted(x, edges, side='right') - 1, 0, len(x) - 1)
+    integral = area[i] + y[i] * (edges - x[i])
+    widths = np.diff(edges)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ymean = np.where(widths > 0, np.diff(integral) / widths, y[start])
+
+    return PyramidLevel(t0=float(x[0]), width=width, ymin=ymin, ymean=ymean, ymax=ymax)
+
+
+@dataclass
+class Pyramid:
+    """Min/mean/max pyramid of a step-function time series."""
+    x: np.ndarray
+    y: np.ndarray
+    levels: list[PyramidLevel] = field(default_factory=list)
+
+    @staticmethod
+    def build(x, y, factor: int = PYRAMID_FACTOR,
+              max_points: int = PYRAMID_MAX_POINTS) -> 'Pyramid':
+        """Build the pyramid of a series with time points ``x`` (sorted) and values ``y``."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        pyramid = Pyramid(x, y)
+        span = x[-1] - x[0] if len(x) else 0.0
+        if len(x) <= max_points or span <= 0:
+            return pyramid  # Raw data only
+
+        level = aggregate_steps(x, y, span * factor / len(x))
+        pyramid.levels.append(level)
+        while level.n > max_points:
+            level = level.coarsen(factor)
+            pyramid.levels.append(level)
+        return pyramid
+
+    @property
+    def extent(self) -> tuple[float, float]:
+        """Time range of the series."""
+        return float(self.x[0]), float(self.x[-1])
+
+    def detail(self, start: float | None = None, end: float | None = None,
+               max_points: int = PYRAMID_MAX_POINTS) \
+            -> tuple[np.ndarray, np.ndarray, np.ndarray | None, np.ndarray | None]:
+        """Return ``(x, mean, min, max)`` for the time window ``[start, end]`` at the finest
+        level with at most ``max_points`` points in the window.  ``min`` and ``max`` are
+        None if the raw data is returned.  ``None`` for ``start`` or ``end`` means an open end.
+        """
+        if len(self.x) == 0:
+            return self.x, self.y, None, None
+        start = self.x[0] if start is None else start
+        end = self.x[-1] if end is None else end
+
+        # Include the last point at or before start, which sets the value at start
+        i0 = max(np.searchsorted(self.x, start, side='right') - 1, 0)
+        i1 = np.searchsorted(self.x, end, side='right')
+        if i1 - i0 <= max_points or not self.levels:
+            return self.x[i0:i1], self.y[i0:i1], None, None
+
+        for level in self.levels:
+            index = level.bins(start, end)
+            if index.stop - index.start <= max_points or level is self.levels[-1]:
+                x = level.t0 + level.width * np.arange(index.start, index.stop)
+                return x, level.ymean[index], level.ymin[index], level.ymax[index]
+        raise AssertionError('unreachable')
+
+    def to_bytes(self) -> bytes:
+        """Serialise the pyramid, e.g. for caching."""
+        arrays = {'x': self.x, 'y': self.y}
+        for k, level in enumerate(self.levels):
+            arrays[f'grid_{k}'] = np.array([level.t0, level.width])
+            arrays[f'ymin_{k}'] = level.ymin
+            arrays[f'ymean_{k}'] = level.ymean
+            arrays[f'ymax_{k}'] = level.ymax
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'Pyramid':
+        """Deserialise a pyramid serialised with :py:meth:`to_bytes`."""
+        with np.load(io.BytesIO(data)) as arrays:
+            pyramid = Pyramid(arrays['x'], arrays['y'])
+            k = 0
+            while f'grid_{k}' in arrays:
+                t0, width = arrays[f'grid_{k}']
+                pyramid.levels.append(PyramidLevel(
+                    float(t0), float(width),
+                    arrays[f'ymin_{k}'], arrays[f'ymean_{k}'], arrays[f'ymax_{k}']
+                ))
+                k += 1
+        return pyramid
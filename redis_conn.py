@@ -0,0 +1,15 @@
+"""Shared client for the Redis server, used by the result caches, the coordination between
+workers, and the job queue monitor.
+
+All modules use this one client, so that each worker process has a single connection pool.
+The pool is recreated automatically in each worker after a fork.
+"""
+from redis import Redis
+
+from conf import REDIS_HOST, REDIS_PORT
+
+REDIS_CONN = Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT  # default
+)
+"""Provides a connection to the redis server at ``redis://<REDIS_HOST>:<REDIS_PORT>``."""
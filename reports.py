@@ -0,0 +1,165 @@
+"""Fetching and caching of simulation reports from the histopathology REST server.
+
+Reports of completed scenarios never change, so parsed :py:class:`kpis.Report` objects
+are kept in a small per-worker LRU cache, and the raw results are kept in the local
+:py:mod:`mirror`, from which they are read first.  A scenario's results do go away when it is
+purged, and its ID may be reused after the database is cleared, so each cache entry records
+the invalidation generation counters in Redis (global and per scenario) at which it was
+loaded, and is reloaded once another worker has invalidated it.  Concurrent fetches of the
+same report are coalesced, within each worker and across workers (see :py:mod:`singleflight`).
+
+Time series on evenly spaced grids are converted to the regular chart data types on parsing,
+so their x-axes are neither stored nor shipped to the browser.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import requests
+from redis.exceptions import RedisError
+
+import kpis
+import mirror
+import singleflight
+from chart_datatypes import regularise
+from conf import HPATH_RESTFUL_HOST, REPORT_CACHE_SIZE
+from redis_conn import REDIS_CONN
+
+GENERATION_KEY = 'hpath:reports:generation'
+"""Redis key of the global invalidation counter of the report caches.  The counter of each
+scenario is kept at ``<GENERATION_KEY>:<scenario_id>``."""
+
+_report_cache: OrderedDict[
+    int, tuple[tuple[int, int] | None, tuple[str, kpis.Report]]
+] = OrderedDict()
+"""Parsed reports by scenario ID, with the generation counters at which they were loaded."""
+_report_cache_lock = threading.Lock()
+_report_flights = singleflight.Group()
+
+
+def fetch_results(scenario_id: int) -> dict:
+    """Fetch the raw results of a scenario from the mirror, or else from the REST server.  The
+    returned dict contains the scenario name in ``'scenario_name'`` and the report JSON in
+    ``'results'``."""
+    logger = logging.getLogger('dash.dash')
+    try:
+        results = mirror.get_results(scenario_id)
+        if results is not None:
+            return results
+    except (sqlite3.Error, OSError, ValueError) as exc:
+        logger.error('Mirror read failed: %s', exc)
+
+    def fetch() -> bytes:
+        response = requests.get(
+            f'{HPATH_RESTFUL_HOST}/scenarios/{scenario_id}/results/',
+            timeout=10
+        )
+        response.raise_for_status()
+        return response.content
+
+    results = json.loads(singleflight.shared_fetch(f'results:{scenario_id}', fetch))[0]
+    try:
+        mirror.put_results(scenario_id, results)
+    except (sqlite3.Error, OSError) as exc:
+        logger.error('Mirror write failed: %s', exc)
+    return results
+
+
+def regularised(report: kpis.Report) -> kpis.Report:
+    """Return a copy of the report with evenly spaced time series converted to
+    :py:class:`~chart_datatypes.RegularChartData` or
+    :py:class:`~chart_datatypes.RegularMultiChartData`."""
+    return report.model_copy(update={
+        'resource_allocation': {
+            res: regularise(chart_data) for res, chart_data in report.resource_allocation.items()
+        },
+        'wip_by_stage': regularise(report.wip_by_stage),
+        'hourly_utilization_by_resource': regularise(report.hourly_utilization_by_resource),
+    })
+
+
+def kpi_summary(report: kpis.Report) -> dict:
+    """Extract the KPIs shown in the scenarios grid from a report.  ``peak_util`` is the
+    utilisation of the busiest resource and ``mean_util`` the mean over all resources."""
+    utilisation = report.utilization_by_resource.y
+    return {
+        'overall_tat': report.overall_tat,
+        'lab_tat': report.lab_tat,
+        'progress': report.progress,
+        'lab_progress': report.lab_progress,
+        'peak_util': max(utilisation, default=None),
+        'mean_util': sum(utilisation) / len(utilisation) if utilisation else None,
+    }
+
+
+def get_report(scenario_id: int) -> tuple[str, kpis.Report]:
+    """Return the scenario name and parsed report of a completed scenario.
+
+    Raises:
+        requests.RequestException: The results could not be fetched.
+        pydantic.ValidationError: The results are not a valid report.
+        LookupError: The REST server returned no results for the scenario.
+    """
+    scenario_id = int(scenario_id)
+    generation = _generation(scenario_id)
+    with _report_cache_lock:
+        cached = _report_cache.get(scenario_id)
+        if cached is not None and (generation is None or cached[0] == generation):
+            _report_cache.move_to_end(scenario_id)
+            return cached[1]
+    return _report_flights.do(scenario_id, _load_report, scenario_id, generation)
+
+
+def _generation(scenario_id: int) -> tuple[int, int] | None:
+    """Read the global and per-scenario invalidation counters in one round trip.  Returns
+    None if Redis is unavailable, in which case cached reports are served as they are (no
+    worker can have invalidated them through Redis either)."""
+    try:
+        values = REDIS_CONN.mget(GENERATION_KEY, f'{GENERATION_KEY}:{scenario_id}')
+    except RedisError as exc:
+        logging.getLogger('dash.dash').warning('Report generation not read: %s', exc)
+        return None
+    return int(values[0] or 0), int(values[1] or 0)
+
+
+def _load_report(scenario_id: int,
+                 generation: tuple[int, int] | None) -> tuple[str, kpis.Report]:
+    """Fetch, parse and cache a report, read at the given generation."""
+    results = fetch_results(scenario_id)
+    report = regularised(kpis.Report.model_validate_json(results['results']))
+    entry = (results['scenario_name'], report)
+    try:
+        if not mirror.has_kpis(scenario_id):
+            mirror.put_kpis(scenario_id, kpi_summary(report))
+    except (sqlite3.Error, OSError) as exc:
+        logging.getLogger('dash.dash').error('Mirror write failed: %s', exc)
+
+    with _report_cache_lock:
+        _report_cache[scenario_id] = (generation, entry)
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    return entry
+
+
+def invalidate(scenario_id: int | None = None) -> None:
+    """Drop ``scenario_id``, or all scenarios if None, from the report cache of every worker.
+    The generation counter is incremented in Redis, so other workers reload the report on
+    their next lookup."""
+    try:
+        if scenario_id is None:
+            REDIS_CONN.incr(GENERATION_KEY)
+            scenario_keys = list(REDIS_CONN.scan_iter(f'{GENERATION_KEY}:*'))
+            if scenario_keys:
+                REDIS_CONN.delete(*scenario_keys)
+        else:
+            REDIS_CONN.incr(f'{GENERATION_KEY}:{int(scenario_id)}')
+    except RedisError as exc:
+        logging.getLogger('dash.dash').error('Report cache invalidation failed: %s', exc)
+    with _report_cache_lock:
+        if scenario_id is None:
+            _report_cache.clear()
+        else:
+            _report_cache.pop(int(scenario_id), None)
+    singleflight.forget(None if scenario_id is None else f'results:{int(scenario_id)}')
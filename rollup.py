@@ -0,0 +1,85 @@
+"""Temporal rollup of step-function time series into day or week bins.
+
+Hourly series are bucketed into bins of ``bin_hours`` hours, starting at the first time
+point, and each bin is reduced to a single statistic.  Series on a regular grid whose step
+divides the bin width are reshaped directly; other series are first sampled hourly.  The
+time-weighted average (``'twa'``) is computed exactly from the integral of the step function.
+
+:py:func:`fold_weekly` folds series by hour of the week, for day-of-week × hour-of-day views.
+"""
+import math
+
+import numpy as np
+
+from pyramid import aggregate_steps
+
+STATISTICS = {
+    'twa': 'Time-weighted mean',
+    'mean': 'Mean',
+    'max': 'Maximum',
+    'p95': '95th percentile',
+}
+"""Statistics available for rollups, with their display names."""
+
+SAMPLE_HOURS = 1.0
+"""Sampling interval for irregular series when computing sample statistics."""
+
+
+def _regular_step(x: np.ndarray, rtol: float = 1e-6) -> float | None:
+    """Return the grid step if ``x`` is evenly spaced, else None."""
+    if len(x) < 2:
+        return None
+    steps = np.diff(x)
+    return float(steps[0]) if np.allclose(steps, steps[0], rtol=rtol, atol=0) else None
+
+
+def _grouped(values: np.ndarray, group_size: int) -> np.ndarray:
+    """Reshape into rows of ``group_size`` values, padding the last row with NaN."""
+    n_pad = -len(values) % group_size
+    return np.pad(values, (0, n_pad), constant_values=np.nan).reshape(-1, group_size)
+
+
+def rollup(x, y, bin_hours: float, statistic: str) -> tuple[np.ndarray, np.ndarray]:
+    """Roll up the step function ``y(t) = y[i] for x[i] <= t < x[i+1]`` into bins of
+    ``bin_hours``.  Returns the bin start times and the statistic of each bin."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) < 2:
+        return x, y
+    if statistic not in STATISTICS:
+        raise ValueError(f'Unknown rollup statistic: {statistic!r}')
+
+    if statistic == 'twa':
+        level = aggregate_steps(x, y, bin_hours)
+        return level.t0 + bin_hours * np.arange(level.n), level.ymean
+
+    step = _regular_step(x)
+    if step is not None and math.isclose(bin_hours / step, round(bin_hours / step)):
+        samples = y
+    else:
+        step = SAMPLE_HOURS
+        t = np.arange(x[0], x[-1], step)
+        samples = y[np.searchsorted(x, t, side='right') - 1]
+
+    grouped = _grouped(samples, max(round(bin_hours / step), 1))
+    if statistic == 'mean':
+        values = np.nanmean(grouped, axis=1)
+    elif statistic == 'max':
+        values = np.nanmax(grouped, axis=1)
+    else:
+        values = np.nanpercentile(grouped, 95, axis=1)
+    return x[0] + bin_hours * np.arange(len(values)), values
+
+
+def fold_weekly(x, z) -> tuple[np.ndarray, np.ndarray]:
+    """Fold the rows of the matrix ``z``, sampled at times ``x`` (in hours from the start
+    of a Monday), into the mean of each hour of the week.  Returns the hours of the week
+    ``0, ..., 167`` and a matrix with one column per hour of the week (NaN if no samples)."""
+    x = np.asarray(x, dtype=float)
+    z = np.atleast_2d(np.asarray(z, dtype=float))
+    hour_of_week = (np.floor(x) % 168).astype(int)
+    sums = np.zeros((z.shape[0], 168))
+    np.add.at(sums, (slice(None), hour_of_week), z)
+    counts = np.bincount(hour_of_week, minlength=168)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.arange(168), sums / counts
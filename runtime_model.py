@@ -0,0 +1,194 @@
+"""Estimation of simulation run times from scenario configurations, for capacity planning.
+
+The wall time of a run (from creation to completion of the scenario, so including time spent
+queued) is modelled as linear in a few features of its configuration (see :py:func:`design`):
+the simulated hours, the expected number of specimens, and the resource-hours on duty.
+
+The REST server's scenario list has no configuration details, so the features of each
+scenario are recorded in the :py:mod:`mirror` when it is submitted (see
+:py:func:`record_submission`).  Whenever the scenario list is fetched, newly completed
+scenarios are matched to their submissions by name and time and added to the model (see
+:py:func:`observe`).  The model is fitted by recursive least squares: only the sums
+``XᵀX`` and ``Xᵀy`` are stored, and each run updates them, with older runs discounted by
+:py:data:`conf.RUNTIME_FORGETTING_FACTOR` so that the estimates follow changes in the
+simulation workers.  Estimates are only given once :py:data:`conf.RUNTIME_MIN_RUNS` runs
+have been observed.
+"""
+import json
+import time
+from math import isnan
+
+import numpy as np
+
+import arrivals
+import mirror
+from conf import (RUNTIME_FORGETTING_FACTOR, RUNTIME_MATCH_WINDOW_SECONDS, RUNTIME_MIN_RUNS,
+                  RUNTIME_SUBMISSION_MAX_AGE_DAYS)
+
+WEEKDAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+"""Columns of the weekday flags in the ``Resources`` table of configuration files."""
+
+_unmatched: set[int] = set()
+"""Completed scenarios already found to have no recorded submission, e.g. because they were
+submitted before the model existed.  Not looked up again by this worker."""
+
+
+def config_features(data: bytes, sim_hours: float) -> dict[str, float]:
+    """Features of a scenario configuration file for a run of ``sim_hours`` hours: the mean
+    total arrival rate (specimens per hour) and the mean number of resource units on duty
+    over a week.
+
+    Raises:
+        See :py:func:`arrivals.read_tables`.
+    """
+    schedules = arrivals.arrival_schedules(data)
+    weekly_arrivals = sum(
+        float(np.nansum(schedule.iloc[:, 1:].to_numpy())) for schedule in schedules.values()
+    )
+    resources = arrivals.read_tables(data, ['Resources']).get('Resources')
+    units = 0.0
+    if resources is not None:
+        # Weekday flags, then resource units by time of day (e.g. '00:00', '00:30', ...)
+        days = resources[[col for col in resources.columns if col in WEEKDAYS]].to_numpy()
+        slots = resources[[col for col in resources.columns if ':' in str(col)]].to_numpy()
+        if days.size and slots.size:
+            units = float(np.sum(
+                np.nansum(slots, axis=1) / slots.shape[1] * np.nansum(days, axis=1) / 7
+            ))
+    return {
+        'sim_hours': float(sim_hours),
+        'arrivals_per_hour': weekly_arrivals / 168,
+        'resource_units': units,
+    }
+
+
+def design(features: dict[str, float]) -> np.ndarray:
+    """Regression inputs for a run: intercept (start-up and queueing), simulated hours,
+    expected specimens, and resource-hours."""
+    sim_hours = features['sim_hours']
+    return np.array([
+        1.0,
+        sim_hours,
+        sim_hours * features['arrivals_per_hour'],
+        sim_hours * features['resource_units'],
+    ])
+
+
+def record_submission(analysis_name: str | None,
+                      features: list[tuple[str, dict[str, float]]]) -> None:
+    """Record the features of newly submitted scenarios, as (scenario name, features) pairs,
+    for matching with the scenarios once they complete.  Names may repeat; each record is
+    matched with one completed scenario.  Unmatched records older than
+    :py:data:`conf.RUNTIME_SUBMISSION_MAX_AGE_DAYS` are dropped."""
+    now = time.time()
+    conn = mirror.connect()
+    with conn:
+        conn.execute('DELETE FROM submissions WHERE submitted < ?',
+                     (now - RUNTIME_SUBMISSION_MAX_AGE_DAYS * 86400,))
+        conn.executemany(
+            'INSERT INTO submissions (submitted, analysis_name, scenario_name, features) '
+            'VALUES (?, ?, ?, ?)',
+            [(now, analysis_name, name, json.dumps(val)) for name, val in features]
+        )
+
+
+def _completed_runs(scenarios: list[dict]) -> list[tuple[dict, float]]:
+    """Completed scenarios in a (not normalised) scenario list, with their wall times."""
+    runs = []
+    for val in scenarios:
+        created, completed = val.get('created'), val.get('completed')
+        if (isinstance(created, float) and isinstance(completed, float)
+                and not isnan(created) and not isnan(completed)):
+            runs.append((val, completed - created))
+    return runs
+
+
+def observe(scenarios: list[dict]) -> int:
+    """Add the completed scenarios in a scenario list (as returned by the REST server) that
+    have not been observed before, and whose submissions were recorded, to the model.
+    Returns the number of runs added.
+
+    Raises:
+        sqlite3.Error: The mirror could not be read or written.
+    """
+    conn = mirror.connect()
+    observed = {
+        scenario_id for (scenario_id,) in conn.execute('SELECT scenario_id FROM runtimes')
+    }
+    added = 0
+    for val, seconds in _completed_runs(scenarios):
+        scenario_id = int(val['scenario_id'])
+        if scenario_id in observed or scenario_id in _unmatched:
+            continue
+        with conn:
+            row = conn.execute(
+                'SELECT id, features FROM submissions WHERE scenario_name = ? '
+                'AND submitted BETWEEN ? AND ? '
+                'ORDER BY analysis_name IS ? DESC, submitted DESC LIMIT 1',
+                (val.get('scenario_name'), val['created'] - RUNTIME_MATCH_WINDOW_SECONDS,
+                 val['created'] + RUNTIME_MATCH_WINDOW_SECONDS, val.get('analysis_name'))
+            ).fetchone()
+            if row is None:
+                _unmatched.add(scenario_id)
+                continue
+            submission_id, features = row
+            conn.execute('DELETE FROM submissions WHERE id = ?', (submission_id,))
+            conn.execute(
+                'INSERT INTO runtimes (scenario_id, features, seconds) VALUES (?, ?, ?)',
+                (scenario_id, features, seconds)
+            )
+            _update(conn, design(json.loads(features)), seconds)
+        added += 1
+    return added
+
+
+def _load(conn) -> tuple[int, np.ndarray, np.ndarray] | None:
+    """Number of runs observed and the (discounted) sums ``XᵀX`` and ``Xᵀy``, or None."""
+    row = conn.execute('SELECT n, xtx, xty FROM runtime_model WHERE id = 1').fetchone()
+    if row is None:
+        return None
+    n, xtx, xty = row
+    return n, np.array(json.loads(xtx)), np.array(json.loads(xty))
+
+
+def _update(conn, x: np.ndarray, y: float) -> None:
+    """Add one run to the stored sums, discounting the previous runs."""
+    state = _load(conn)
+    if state is None:
+        n, xtx, xty = 0, np.zeros((len(x), len(x))), np.zeros(len(x))
+    else:
+        n, xtx, xty = state
+    xtx = RUNTIME_FORGETTING_FACTOR * xtx + np.outer(x, x)
+    xty = RUNTIME_FORGETTING_FACTOR * xty + y * x
+    conn.execute(
+        'INSERT OR REPLACE INTO runtime_model (id, n, xtx, xty) VALUES (1, ?, ?, ?)',
+        (n + 1, json.dumps(xtx.tolist()), json.dumps(xty.tolist()))
+    )
+
+
+def coefficients() -> np.ndarray | None:
+    """Fitted coefficients of :py:func:`design`, or None if too few runs were observed.
+
+    Raises:
+        sqlite3.Error: The mirror could not be read.
+    """
+    state = _load(mirror.connect())
+    if state is None or state[0] < RUNTIME_MIN_RUNS:
+        return None
+    _, xtx, xty = state
+    # Least squares on the normal equations copes with collinear features, e.g. if every
+    # run so far simulated the same number of hours
+    return np.linalg.lstsq(xtx, xty, rcond=None)[0]
+
+
+def estimate(features: list[dict[str, float]]) -> list[float] | None:
+    """Estimated wall times in seconds of runs with the given features, or None if too few
+    runs were observed.
+
+    Raises:
+        sqlite3.Error: The mirror could not be read.
+    """
+    coef = coefficients()
+    if coef is None:
+        return None
+    return [max(float(design(val) @ coef), 0.0) for val in features]
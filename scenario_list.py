@@ -0,0 +1,251 @@
+"""Fetching and caching of the scenario list from the histopathology REST server.
+
+The normalised scenario list is cached in Redis and shared by all workers, with
+stale-while-revalidate semantics: :py:func:`get_scenarios` always returns the cached list
+immediately, and if it is older than its freshness period, a single background refresher
+(across all workers) fetches a new list.  The freshness period is shorter while any scenario
+is still running, so that progress updates appear promptly.
+
+Concurrent fetches of the list are coalesced, within each worker and across workers (see
+:py:mod:`singleflight`), so that simultaneous page loads cost a single backend call.  Every
+fetched list is written to the local :py:mod:`mirror`, which is served (and revalidated)
+when the Redis cache is empty, unless the list has been invalidated or the mirror is older
+than :py:data:`conf.SCENARIO_LIST_MAX_AGE_SECONDS`.  The mirror is also the fallback when the
+REST server is unavailable.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from math import isnan
+
+import pytz
+import requests
+from redis.exceptions import RedisError
+
+import mirror
+import runtime_model
+import singleflight
+from conf import (HPATH_RESTFUL_HOST, SCENARIO_LIST_MAX_AGE_SECONDS,
+                  SCENARIO_LIST_RUNNING_TTL_SECONDS, SCENARIO_LIST_TTL_SECONDS,
+                  SINGLEFLIGHT_LEASE_SECONDS)
+from redis_conn import REDIS_CONN
+
+LIST_KEY = 'hpath:scenarios:list'
+"""Redis key of the cached scenario list and the time it was fetched."""
+
+REFRESH_LOCK_KEY = 'hpath:scenarios:refresh'
+"""Redis key held by the worker currently refreshing the cached scenario list."""
+
+INVALIDATED_KEY = 'hpath:scenarios:invalidated'
+"""Redis key set by :py:func:`invalidate` until a new list is cached, so that no worker serves
+its mirrored list in the meantime."""
+
+LONDON = pytz.timezone('Europe/London')
+
+_scenario_flights = singleflight.Group()
+
+
+def format_time(ts: float):
+    """Format a UNIX timestamp in the format 2023-11-11 11:11:11 GMT (or BST for summer time)."""
+    return datetime.utcfromtimestamp(ts).astimezone(LONDON).strftime('%Y-%m-%d %H:%M:%S %Z')
+
+
+def parse_time(text: str) -> float:
+    """Inverse of :py:func:`format_time`: the UNIX timestamp of a formatted time.
+
+    Raises:
+        ValueError: The time is not in the format of :py:func:`format_time`.
+    """
+    naive = datetime.strptime(text[:19], '%Y-%m-%d %H:%M:%S')
+    return LONDON.localize(naive, is_dst=text.endswith('BST')).timestamp()
+
+
+def _fetch() -> bytes:
+    response = requests.get(
+        url=f'{HPATH_RESTFUL_HOST}/scenarios/',
+        timeout=10
+    )
+    response.raise_for_status()
+    return response.content
+
+
+def fetch_scenarios() -> list[dict]:
+    """Fetch the list of scenarios, as returned by the REST server.
+
+    Raises:
+        requests.RequestException: The list could not be fetched.
+    """
+    return json.loads(
+        _scenario_flights.do('scenarios', singleflight.shared_fetch, 'scenarios', _fetch)
+    )
+
+
+def normalise(scenarios: list[dict]) -> list[dict]:
+    """Format the timestamps of the scenarios and add the ``progress`` and ``result_link``
+    fields shown in the scenarios grid.  ``result_link`` is empty for incomplete scenarios."""
+    for val in scenarios:
+        completed = isinstance(val['completed'], float) and not isnan(val['completed'])
+        if isinstance(val['created'], float) and not isnan(val['created']):
+            val['created'] = format_time(val['created'])
+        if completed:
+            val['completed'] = format_time(val['completed'])
+        val['progress'] = f"{val['done_reps']}/{val['num_reps']}"
+        val['result_link'] = f"{val['scenario_id']}" if completed else ''
+    return scenarios
+
+
+def _fetch_normalised() -> list[dict]:
+    """Fetch the scenario list, write it to the mirror, add newly completed runs to the run
+    time model and normalise the list."""
+    scenarios = fetch_scenarios()
+    try:
+        mirror.put_scenarios(scenarios)
+    except (sqlite3.Error, OSError) as exc:
+        logging.getLogger('dash.dash').error('Mirror write failed: %s', exc)
+    try:
+        runtime_model.observe(scenarios)
+    except (sqlite3.Error, ValueError, KeyError) as exc:
+        logging.getLogger('dash.dash').error('Run time model not updated: %s', exc)
+    return normalise(scenarios)
+
+
+def _mirrored(max_age: float | None = None) -> list[dict] | None:
+    """Return the normalised mirrored scenario list, or None if not available or (if
+    ``max_age`` is given) mirrored more than ``max_age`` seconds ago."""
+    try:
+        if max_age is not None:
+            synced = mirror.scenarios_synced()
+            if synced is None or time.time() - synced > max_age:
+                return None
+        scenarios = mirror.get_scenarios()
+    except (sqlite3.Error, OSError) as exc:
+        logging.getLogger('dash.dash').error('Mirror read failed: %s', exc)
+        return None
+    return None if scenarios is None else normalise(scenarios)
+
+
+def _fetch_or_mirrored() -> list[dict]:
+    """Fetch the normalised scenario list, falling back to the mirror if the REST server is
+    unavailable."""
+    try:
+        return _fetch_normalised()
+    except requests.RequestException:
+        scenarios = _mirrored()
+        if scenarios is None:
+            raise
+        logging.getLogger('dash.dash').warning('REST server unavailable, using mirror')
+        return scenarios
+
+
+def with_kpis(scenarios: list[dict]) -> list[dict]:
+    """Add the KPI summaries of completed scenarios from the mirror to a normalised scenario
+    list, as ``kpi_*`` fields (one per TAT target for the progress values)."""
+    try:
+        summaries = mirror.get_kpis()
+    except (sqlite3.Error, OSError) as exc:
+        logging.getLogger('dash.dash').error('Mirror read failed: %s', exc)
+        return scenarios
+    for val in scenarios:
+        summary = summaries.get(int(val['scenario_id']))
+        if summary is None:
+            continue
+        val.update({
+            f'kpi_{name}': summary[name]
+            for name in ['overall_tat', 'lab_tat', 'peak_util', 'mean_util']
+        })
+        val.update({f'kpi_within_{n}d': p for n, p in summary['progress'].items()})
+        val.update({f'kpi_lab_within_{n}d': p for n, p in summary['lab_progress'].items()})
+    return scenarios
+
+
+def _store(scenarios: list[dict]) -> None:
+    pipe = REDIS_CONN.pipeline()
+    pipe.set(
+        LIST_KEY,
+        json.dumps({'fetched': time.time(), 'scenarios': scenarios}),
+        ex=SCENARIO_LIST_MAX_AGE_SECONDS
+    )
+    pipe.delete(INVALIDATED_KEY)
+    pipe.execute()
+
+
+def _fresh_for(scenarios: list[dict]) -> float:
+    """Freshness period of a cached scenario list."""
+    running = any(not val['result_link'] for val in scenarios)
+    return SCENARIO_LIST_RUNNING_TTL_SECONDS if running else SCENARIO_LIST_TTL_SECONDS
+
+
+def get_scenarios() -> list[dict]:
+    """Return the normalised scenario list, from the shared cache if possible, or else from
+    a recent mirror (revalidating in the background).  Fetches the list directly if neither
+    has it, the list was invalidated, or Redis is unavailable.  The mirror is then only served
+    if the REST server is unavailable.
+
+    Raises:
+        requests.RequestException: The list was not cached or mirrored and could not be
+            fetched.
+    """
+    logger = logging.getLogger('dash.dash')
+    try:
+        entry, invalidated = REDIS_CONN.mget(LIST_KEY, INVALIDATED_KEY)
+    except RedisError as exc:
+        logger.warning('Scenario list cache unavailable: %s', exc)
+        return _fetch_or_mirrored()
+
+    if entry is None:
+        scenarios = None if invalidated else _mirrored(SCENARIO_LIST_MAX_AGE_SECONDS)
+        if scenarios is not None:
+            _revalidate()
+            return scenarios
+        scenarios = _fetch_or_mirrored()
+        try:
+            _store(scenarios)
+        except RedisError as exc:
+            logger.warning('Scenario list cache write failed: %s', exc)
+        return scenarios
+
+    entry = json.loads(entry)
+    if time.time() - entry['fetched'] > _fresh_for(entry['scenarios']):
+        _revalidate()
+    return entry['scenarios']
+
+
+def _revalidate() -> None:
+    """Start a background refresh of the cached list, unless one is already running."""
+    try:
+        if not REDIS_CONN.set(REFRESH_LOCK_KEY, os.getpid(), nx=True,
+                              px=int(SINGLEFLIGHT_LEASE_SECONDS * 1000)):
+            return
+    except RedisError:
+        return
+    threading.Thread(target=_refresh, name='scenario-list-refresh', daemon=True).start()
+
+
+def _refresh() -> None:
+    try:
+        _store(_fetch_normalised())
+    except (requests.RequestException, RedisError, ValueError) as exc:
+        logging.getLogger('dash.dash').error('Scenario list refresh failed: %s', exc)
+    finally:
+        try:
+            REDIS_CONN.delete(REFRESH_LOCK_KEY)
+        except RedisError:
+            pass  # The lock expires anyway
+
+
+def invalidate() -> None:
+    """Drop the cached scenario list, e.g. after submitting scenarios or clearing the
+    database, so that the next call of :py:func:`get_scenarios` fetches a new list (rather
+    than serving the mirrored list)."""
+    try:
+        pipe = REDIS_CONN.pipeline()
+        pipe.delete(LIST_KEY)
+        pipe.set(INVALIDATED_KEY, 1, ex=SCENARIO_LIST_MAX_AGE_SECONDS)
+        pipe.execute()
+    except RedisError as exc:
+        logging.getLogger('dash.dash').error('Scenario list invalidation failed: %s', exc)
+    singleflight.forget('scenarios')
@@ -0,0 +1,82 @@
+"""Summary statistics of step-function time series, for spotting bottlenecks.
+
+All series of a :py:class:`~chart_datatypes.MultiChartData` share a time axis, so the
+statistics of every series are computed together in one pass over the ``(series × time)``
+matrix.  Each value ``z[i, j]`` holds from ``x[j]`` until ``x[j+1]``; the last value is taken
+to hold for one more time step.
+"""
+import numpy as np
+
+STATISTICS = {
+    'mean': 'Mean',
+    'peak': 'Peak',
+    'p95': 'p95',
+    'hours_above': 'Hours above threshold',
+    'fraction_above': 'Time above threshold',
+    'longest_above': 'Longest stretch above threshold (h)',
+}
+"""Statistics returned by :py:func:`summarise`, with their display names."""
+
+
+def durations(x) -> np.ndarray:
+    """Length of time for which each value of a step function on the time axis ``x`` holds."""
+    x = np.asarray(x, dtype=float)
+    if len(x) < 2:
+        return np.ones(len(x))
+    return np.diff(x, append=2*x[-1] - x[-2])
+
+
+def weighted_percentile(z: np.ndarray, weights: np.ndarray, q: float) -> np.ndarray:
+    """Time-weighted ``q``-th percentile of each row of ``z``, i.e. the smallest value that
+    the series is at or below for at least ``q`` percent of the time.  NaN values are
+    ignored."""
+    weights = np.where(np.isnan(z), 0, np.broadcast_to(weights, z.shape))
+    order = np.argsort(z, axis=1)  # NaN sorts last
+    cum_weights = np.cumsum(np.take_along_axis(weights, order, axis=1), axis=1)
+    index = np.sum(cum_weights < q/100 * cum_weights[:, -1:], axis=1)
+    index = np.minimum(index, z.shape[1] - 1)
+    return np.take_along_axis(z, np.take_along_axis(order, index[:, None], axis=1), axis=1)[:, 0]
+
+
+def longest_run(above: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Total weight of the longest run of consecutive True values in each row of ``above``.
+    The running total is reset at each False value by subtracting the total up to the most
+    recent reset."""
+    totals = np.cumsum(np.where(above, weights, 0), axis=1)
+    resets = np.maximum.accumulate(np.where(above, 0, totals), axis=1)
+    return np.max(totals - resets, axis=1, initial=0)
+
+
+def summarise(x, z, threshold: float) -> dict[str, np.ndarray]:
+    """Statistics of each row of the matrix ``z`` on the time axis ``x`` (in hours): the
+    time-weighted mean and 95th percentile, the peak, and the total and longest time spent
+    above ``threshold``.  Returns one array per statistic in :py:data:`STATISTICS`."""
+    z = np.atleast_2d(np.asarray(z, dtype=float))
+    weights = durations(x)
+    valid = ~np.isnan(z)
+    total = np.sum(np.where(valid, weights, 0), axis=1)
+    above = valid & (z > threshold)
+    hours_above = np.sum(np.where(above, weights, 0), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'mean': np.nansum(z * weights, axis=1) / total,
+            'peak': np.max(np.where(valid, z, -np.inf), axis=1),
+            'p95': weighted_percentile(z, weights, 95),
+            'hours_above': hours_above,
+            'fraction_above': hours_above / total,
+            'longest_above': longest_run(above, weights),
+        }
+
+
+def summary_rows(labels: list[str], x, z, threshold: float) -> list[dict]:
+    """:py:func:`summarise` as one JSON-serialisable record per series, e.g. for an AG Grid.
+    Undefined statistics (e.g. of an all-NaN series) are None."""
+    stats = summarise(x, z, threshold)
+    return [
+        {
+            'series': label,
+            **{name: float(values[i]) if np.isfinite(values[i]) else None
+               for name, values in stats.items()}
+        }
+        for i, label in enumerate(labels)
+    ]
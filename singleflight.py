@@ -0,0 +1,133 @@
+"""Coalescing of identical concurrent fetches from the histopathology REST server.
+
+Within a worker process, a :py:class:`Group` lets concurrent calls with the same key share
+a single call of the underlying function.  Across workers, :py:func:`shared_fetch` takes a
+short Redis lease per key: the worker holding the lease performs the fetch and publishes the
+response body in Redis for a few seconds, while the other workers wait for it.  If Redis is
+unavailable, or the lease holder fails, waiting workers fetch for themselves.
+"""
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Hashable
+
+from redis.exceptions import RedisError
+
+from conf import (SINGLEFLIGHT_LEASE_SECONDS, SINGLEFLIGHT_POLL_SECONDS,
+                  SINGLEFLIGHT_RESULT_TTL_SECONDS)
+from redis_conn import REDIS_CONN
+
+KEY_PREFIX = 'hpath:singleflight'
+"""Prefix of the Redis keys used by :py:func:`shared_fetch`."""
+
+_release_lease = REDIS_CONN.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+"""Delete a lease only if it is still held by the given token."""
+
+
+class _Call:
+    """An in-flight call of a :py:class:`Group`."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class Group:
+    """Coalesces concurrent calls with the same key within a process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args) -> Any:
+        """Return ``func(*args)``.  If a call with the same key is already in flight, wait
+        for it and return (or raise) its result instead of calling ``func`` again."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def shared_fetch(key: str, fetch: Callable[[], bytes],
+                 result_ttl: float = SINGLEFLIGHT_RESULT_TTL_SECONDS) -> bytes:
+    """Return ``fetch()``, coalescing concurrent calls with the same key across all workers.
+    The result is kept in Redis for ``result_ttl`` seconds, so that workers that were waiting
+    for it (or arrive shortly after) can use it."""
+    logger = logging.getLogger('dash.dash')
+    lease_key = f'{KEY_PREFIX}:{key}:lease'
+    result_key = f'{KEY_PREFIX}:{key}:result'
+    token = uuid.uuid4().hex
+    try:
+        value = REDIS_CONN.get(result_key)
+        if value is not None:
+            return value
+        leader = REDIS_CONN.set(
+            lease_key, token, nx=True, px=int(SINGLEFLIGHT_LEASE_SECONDS * 1000)
+        )
+    except RedisError as exc:
+        logger.warning('Singleflight lease for %s failed: %s', key, exc)
+        return fetch()
+
+    if leader:
+        try:
+            value = fetch()
+            REDIS_CONN.set(result_key, value, px=int(result_ttl * 1000))
+        except RedisError as exc:
+            logger.warning('Singleflight result for %s not published: %s', key, exc)
+        finally:
+            try:
+                _release_lease(keys=[lease_key], args=[token])
+            except RedisError:
+                pass  # The lease expires anyway
+        return value
+
+    try:
+        deadline = time.monotonic() + SINGLEFLIGHT_LEASE_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(SINGLEFLIGHT_POLL_SECONDS)
+            value = REDIS_CONN.get(result_key)
+            if value is not None:
+                return value
+            if not REDIS_CONN.exists(lease_key):
+                break  # Lease holder failed
+    except RedisError as exc:
+        logger.warning('Singleflight wait for %s failed: %s', key, exc)
+    return fetch()
+
+
+def forget(key: str | None = None) -> None:
+    """Delete the published result for ``key``, or all published results if None."""
+    try:
+        if key is not None:
+            REDIS_CONN.delete(f'{KEY_PREFIX}:{key}:result')
+            return
+        result_keys = list(REDIS_CONN.scan_iter(f'{KEY_PREFIX}:*:result'))
+        if result_keys:
+            REDIS_CONN.delete(*result_keys)
+    except RedisError as exc:
+        logging.getLogger('dash.dash').error('Singleflight invalidation failed: %s', exc)
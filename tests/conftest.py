@@ -0,0 +1,15 @@
+"""Shared setup for the tests: the top-level modules are importable, paths such as
+``static/examples/config.xlsx`` resolve from the repository root, and a Dash app exists so
+that page modules can be imported."""
+import os
+import sys
+
+import dash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+APP = dash.Dash(__name__)
+"""Page modules register themselves with an app when imported."""
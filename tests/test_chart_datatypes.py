@@ -0,0 +1,33 @@
+"""Windows of regular chart data agree with those of the equivalent explicit x-axis."""
+import numpy as np
+import pytest
+
+from chart_datatypes import ChartData, RegularChartData
+
+WINDOWS = [
+    (None, None),
+    (None, 2.0),
+    (1.0, 3.0),
+    (1.25, 2.75),
+    (-5.0, 0.5),
+    (3.75, 10.0),  # Starts after the last point
+    (10.0, None),
+    (10.0, 20.0),
+    (-10.0, -5.0),  # Ends before the first point
+]
+
+
+@pytest.mark.parametrize('n', [0, 1, 5])
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_regular_window_matches_explicit(n, start, end):
+    y = list(range(n))
+    explicit = ChartData(x=(0.5 * np.arange(n)).tolist(), y=y)
+    regular = RegularChartData(t0=0.0, dt=0.5, y=y)
+    assert regular.window(start, end) == explicit.window(start, end)
+
+
+def test_window_after_last_point_keeps_last_point():
+    regular = RegularChartData(t0=0.0, dt=1.0, y=[1.0, 2.0, 3.0])
+    index = regular.window(10.0, 20.0)
+    assert index == slice(2, 3)
+    assert regular.x_range(index).tolist() == [2.0]
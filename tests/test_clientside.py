@@ -0,0 +1,137 @@
+"""Parity of the clientside callbacks in ``assets/hpathClientside.js`` with the server-side
+callbacks they replaced.  The JavaScript functions are run with node."""
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from pages.hpath.hpath import CLEAR_DB_CONFIRMATION_MSG
+
+HIDDEN = {'display': 'none'}
+
+ROW = {'file_name': 'a.xlsx', 'sc_name': 'a', 'file_base64': '', 'decode_len_str': '1 kB'}
+
+INPUT_CASES = [
+    # (rowData, analysis name, simulation length)
+    ([], 'analysis', 4),
+    ([ROW], None, 4),
+    ([ROW], '', 4),
+    ([ROW, {**ROW, 'sc_name': 'b'}, {**ROW, 'sc_name': 'c'}], 'analysis', 4),
+    ([ROW, {**ROW, 'sc_name': 'b'}], None, 4),
+    ([ROW, {**ROW, 'sc_name': 'b'}], '', 4),
+    ([{**ROW, 'sc_name': ''}], None, 4),
+    ([ROW], None, None),
+    ([ROW], None, ''),
+    ([ROW], None, 'abc'),
+    ([ROW], None, 0),
+    ([ROW], None, -1),
+    ([ROW], None, '2.5'),
+]
+
+CLEAR_DB_TRIGGERS = ['clear-db', 'clear-db-modal-cancel', 'clear-db-modal-close']
+
+
+def baseline_input_states(row_data, name_value, sim_length_value):
+    """``input_states`` from ``pages/hpath/hpath_submit.py`` before it moved clientside (the
+    DataFrame only served to count rows)."""
+    empty = len(row_data) == 0
+    multi = len(row_data) > 1
+    missing_analysis_name = multi and (name_value == '' or name_value is None)
+    try:
+        can_submit = (not empty
+                      and not missing_analysis_name
+                      and float(sim_length_value) > 0
+                      )
+    except ValueError:  # Catch invalid simulation length
+        can_submit = False
+
+    return (
+        len(row_data) < 2,
+        missing_analysis_name,
+        'success' if can_submit else 'secondary'
+    )
+
+
+def baseline_clear_db_confirmation(triggered_id):
+    """``clear_db_confirmation`` from ``pages/hpath/hpath.py`` before it moved clientside,
+    for the triggers now handled clientside.  Outputs: open, header, message, and the styles
+    of the cancel, delete and close buttons."""
+    if triggered_id == 'clear-db':
+        return True, 'Danger!', CLEAR_DB_CONFIRMATION_MSG, {}, {}, HIDDEN
+    return False, [], [], HIDDEN, HIDDEN, HIDDEN
+
+
+def run_js(calls: list[tuple[str, list, str | None]]) -> list:
+    """Call functions of ``window.dash_clientside.hpath`` with node, returning their results.
+    Each call is (function name, arguments, triggered ID)."""
+    script = """
+        const fs = require('fs');
+        global.window = {};
+        eval(fs.readFileSync('dash_app/assets/hpathClientside.js', 'utf8'));
+        window.dash_clientside.no_update = 'no_update';
+        const calls = JSON.parse(fs.readFileSync(0, 'utf8'));
+        const results = calls.map(([name, args, triggered]) => {
+            window.dash_clientside.callback_context = {triggered_id: triggered};
+            return window.dash_clientside.hpath[name](...args);
+        });
+        console.log(JSON.stringify(results));
+    """
+    output = subprocess.run(
+        ['node', '-e', script], input=json.dumps(calls), capture_output=True, text=True,
+        check=True
+    ).stdout
+    return json.loads(output)
+
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+
+
+@pytest.mark.parametrize('case', INPUT_CASES, ids=repr)
+def test_input_states(case):
+    """``float(None)`` raised TypeError in the old callback, so the outputs were left as they
+    were: the button stayed disabled ('secondary')."""
+    (result,) = run_js([('inputStates', list(case), None)])
+    try:
+        expected = baseline_input_states(*case)
+    except TypeError:
+        row_data, name_value, _ = case
+        expected = baseline_input_states(row_data, name_value, 0)
+    assert tuple(result) == expected
+
+
+def test_delete_selected_rows_and_close_modal():
+    assert run_js([('deleteSelectedRows', [1], None), ('closeModal', [1], None)]) == [True, False]
+
+
+@pytest.mark.parametrize('triggered_id', CLEAR_DB_TRIGGERS)
+def test_clear_db_modal(triggered_id):
+    """The dialog now keeps its message in the layout and shows or hides it, with a separate
+    result area, so compare what is displayed rather than the raw outputs."""
+    (result,) = run_js([('clearDbModal', [1, 1, 1], triggered_id)])
+    is_open, title, msg_style, result_children, *button_styles = result
+    old_open, old_title, old_msg, *old_button_styles = baseline_clear_db_confirmation(
+        triggered_id)
+
+    assert is_open == old_open
+    assert button_styles == old_button_styles
+    if old_open:
+        assert title == old_title
+        assert (msg_style != HIDDEN) == (old_msg == CLEAR_DB_CONFIRMATION_MSG)
+        assert result_children == []
+
+
+@pytest.mark.parametrize('style, expected', [({}, True), (None, True), (HIDDEN, 'no_update')])
+def test_disable_while_shown(style, expected):
+    assert run_js([('disableWhileShown', [style], None)]) == [expected]
+
+
+def test_preview_key():
+    row = {**ROW, 'digest': 'abc'}
+    key = {'digest': 'abc', 'sc_name': 'a', 'file_name': 'a.xlsx'}
+    assert run_js([
+        ('previewKey', [[row, {**ROW, 'digest': 'def'}], None], None),
+        ('previewKey', [[row], key], None),
+        ('previewKey', [[], key], None),
+        ('previewKey', [[], None], None),
+    ]) == [key, 'no_update', None, 'no_update']
@@ -0,0 +1,22 @@
+"""Throughput series of the job queue monitor."""
+import jobqueue
+from conf import QUEUE_MONITOR_INTERVAL_SECONDS
+
+
+def sample(time, successful, queued=0):
+    return {'time': time, 'queued': queued, 'in_flight': 1, 'successful': {'w': successful}}
+
+
+def test_throughput_series_shows_gaps():
+    """Samples more than twice the interval apart are separated by an empty point, and no
+    rate is given across the gap."""
+    step = QUEUE_MONITOR_INTERVAL_SECONDS
+    history = [sample(0, 0), sample(step, 1), sample(10 * step, 5, queued=3),
+               sample(11 * step, 7)]
+    series = jobqueue.throughput_series(history)
+    assert [val['time'] for val in series] == [step, 5.5 * step, 10 * step, 11 * step]
+    assert series[0]['jobs_per_hour'] == 3600 / step
+    assert series[1] == {'time': 5.5 * step, 'jobs_per_hour': None, 'queued': None,
+                         'in_flight': None}
+    assert series[2]['jobs_per_hour'] is None and series[2]['queued'] == 3
+    assert series[3]['jobs_per_hour'] == 7200 / step
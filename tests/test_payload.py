@@ -0,0 +1,17 @@
+"""Payload size budgets of the scenario results page (see :py:mod:`payload`)."""
+import cache
+import payload
+
+
+def test_synthetic_report_within_budgets():
+    caches = cache.FIGURE_CACHE, cache.PYRAMID_CACHE, cache.LAYOUT_CACHE
+    sizes = payload.synthetic_sizes()
+    assert (cache.FIGURE_CACHE, cache.PYRAMID_CACHE, cache.LAYOUT_CACHE) == caches
+    assert set(sizes) <= set(payload.PAYLOAD_BUDGETS)
+    assert payload.over_budget(sizes) == {}
+
+
+def test_over_budget_reports_exceeded_properties():
+    budget = payload.PAYLOAD_BUDGETS['lod-slot.children']
+    sizes = {'lod-slot.children': budget + 1, 'stats-wip-grid.rowData': 1, 'unbudgeted.data': 10**9}
+    assert payload.over_budget(sizes) == {'lod-slot.children': budget + 1}
@@ -0,0 +1,31 @@
+"""Choice of the scenarios prefetched by :py:mod:`prefetch`."""
+import pytest
+
+import prefetch
+
+
+def scenario(scenario_id, completed=True):
+    return {'scenario_id': scenario_id, 'result_link': '/results' if completed else None}
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """Scenario IDs submitted for prefetching, in a worker that has seen no scenario list."""
+    ids = []
+
+    class Executor:
+        @staticmethod
+        def submit(_, scenario_id):
+            ids.append(scenario_id)
+
+    monkeypatch.setattr(prefetch, '_seen_completed', None)
+    monkeypatch.setattr(prefetch, '_get_executor', Executor)
+    return ids
+
+
+def test_first_list_seeds_seen_scenarios(submitted):
+    """Scenarios completed before a worker starts are not prefetched; later ones are."""
+    prefetch.scenarios_completed([scenario(1), scenario(2), scenario(3, completed=False)])
+    assert submitted == []
+    prefetch.scenarios_completed([scenario(1), scenario(2), scenario(3), scenario(4)])
+    assert submitted == [4, 3]
@@ -0,0 +1,24 @@
+"""Reading of the per-worker profiling records."""
+import json
+import logging
+
+import profiling
+
+
+def test_read_records_skips_malformed_lines(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(profiling, 'PROFILING_DIR', str(tmp_path))
+    (tmp_path / 'rss-1.jsonl').write_text(
+        json.dumps({'time': 1.0, 'rss': 10}) + '\n'
+        + '\n'
+        + '[1, 2]\n'
+        + '{"rss": 5}\n'
+        + json.dumps({'time': 3.0, 'rss': 30}) + '\n'
+        + '{"time": 4.0, "rs',  # Still being written
+        encoding='utf-8'
+    )
+    (tmp_path / 'rss-2.jsonl').write_text(json.dumps({'time': 2.0, 'rss': 20}) + '\n',
+                                          encoding='utf-8')
+    with caplog.at_level(logging.DEBUG, logger='dash.dash'):
+        records = profiling.read_records('rss')
+    assert [record['time'] for record in records] == [3.0, 2.0, 1.0]
+    assert sum('Skipped malformed record' in msg for msg in caplog.messages) == 3
@@ -0,0 +1,68 @@
+"""Selection of scenarios to purge."""
+import copy
+import time
+
+import pytest
+import requests
+
+import purge
+import scenario_list
+
+NOW = time.time()
+
+SCENARIOS = [
+    {'scenario_id': 1, 'scenario_name': 'a', 'analysis_id': 1, 'created': NOW - 40 * 86400,
+     'completed': NOW - 39 * 86400, 'done_reps': 1, 'num_reps': 1},
+    {'scenario_id': 2, 'scenario_name': 'b', 'analysis_id': 1, 'created': NOW - 10 * 86400,
+     'completed': NOW - 9 * 86400, 'done_reps': 1, 'num_reps': 1},
+    {'scenario_id': 3, 'scenario_name': 'c', 'analysis_id': 2, 'created': NOW - 20 * 86400,
+     'completed': float('nan'), 'done_reps': 0, 'num_reps': 1},
+    {'scenario_id': 4, 'scenario_name': 'd', 'analysis_id': None, 'created': NOW - 3600,
+     'completed': float('nan'), 'done_reps': 0, 'num_reps': 1},
+]
+
+
+@pytest.mark.parametrize('ts', [1700000000.0, 1720000000.0])  # GMT and BST
+def test_parse_time_inverts_format_time(ts):
+    assert scenario_list.parse_time(scenario_list.format_time(ts)) == ts
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'analysis_ids': [1]},
+    {'scenario_ids': [2, 4]},
+    {'older_than_days': 15},
+    {'older_than_days': 1, 'status': 'incomplete'},
+    {'status': 'completed'},
+])
+def test_select_normalised_list_matches_raw(filters):
+    """The purge preview selects from the normalised (cached) scenario list."""
+    normalised = scenario_list.normalise(copy.deepcopy(SCENARIOS))
+    assert purge.select(normalised, **filters) == purge.select(SCENARIOS, **filters)
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}', response=self)
+
+
+@pytest.fixture
+def deletions(monkeypatch):
+    """Fake REST server answering 404 to every deletion; returns the invalidated IDs."""
+    invalidated = []
+    monkeypatch.setattr(purge.requests, 'delete', lambda *_, **__: _Response(404))
+    monkeypatch.setattr(purge.scenario_list, 'fetch_scenarios', lambda: copy.deepcopy(SCENARIOS))
+    monkeypatch.setattr(purge.cache, 'invalidate_scenario', invalidated.append)
+    return invalidated
+
+
+def test_not_found_counts_as_deleted_only_if_absent(deletions):
+    """A 404 for a listed scenario means the deletion route is missing, not that the scenario
+    is gone, so nothing is invalidated."""
+    deleted, failed = purge.purge([1, 99])
+    assert (deleted, failed) == ([99], [1])
+    assert deletions == [99]
@@ -0,0 +1,25 @@
+"""Callbacks of the scenario results page."""
+import numpy as np
+import pytest
+
+from pages.hpath import hpath_show_scenario as page
+from pyramid import Pyramid
+
+
+@pytest.mark.parametrize('kind, expected', [
+    ('overall', 'does not include a TAT distribution.'),
+    ('lab', 'does not include a lab TAT distribution.'),
+])
+def test_missing_tat_distribution_message(kind, expected):
+    stack = page.evaluate_tat_targets([{'days': 3, 'target': 80}], None, kind, {})
+    assert stack.children.endswith(expected)
+
+
+@pytest.mark.parametrize('time_unit, statistic', [('hours', 'none'), ('days', 'twa')])
+def test_series_figure_keeps_zoom(time_unit, statistic):
+    """``load_plot_detail`` only patches the traces, so the figure's constant ``uirevision``
+    is what keeps the user's zoom when they are replaced."""
+    x = np.arange(24 * 28, dtype=float)
+    pyramid = Pyramid.build(x, np.sin(x))
+    fig = page.series_figure(lambda: pyramid, 'Stage 0', time_unit, 'WIP', statistic)
+    assert fig.layout.uirevision == 'Stage 0'
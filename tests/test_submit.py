@@ -0,0 +1,49 @@
+"""Validation of submissions on the submit page."""
+from base64 import b64encode
+
+import pytest
+
+import arrivals
+from pages.hpath import hpath_submit
+
+ROW = {'file_name': 'a.xlsx', 'sc_name': 'a', 'file_base64': '', 'decode_len_str': '1 kB'}
+
+
+@pytest.mark.parametrize('value, expected', [
+    (4, 4.0), ('2.5', 2.5), (None, None), ('', None), ('abc', None), (0, None), (-1, None),
+    ('inf', None), ('nan', None),
+])
+def test_valid_sim_length(value, expected):
+    assert hpath_submit.valid_sim_length(value) == expected
+
+
+@pytest.mark.parametrize('sim_length', [None, '', 'abc', 0, -1])
+def test_confirm_submission_disabled_for_invalid_length(sim_length):
+    is_open, _, disabled = hpath_submit.confirm_submission(1, [ROW], sim_length, 'Weeks')
+    assert is_open and disabled
+
+
+def test_scenario_features_keyed_by_row():
+    """Rows with duplicate names are kept apart; unreadable files are omitted."""
+    with open('static/examples/config.xlsx', 'rb') as file:
+        data = 'data:application/octet-stream;base64,' + b64encode(file.read()).decode()
+    rows = [{**ROW, 'file_base64': data}, ROW, {**ROW, 'file_base64': data}]
+    features = hpath_submit.scenario_features(rows, 168)
+    assert list(features) == [0, 2]
+    assert features[0] == features[2]
+    assert features[0]['sim_hours'] == 168
+
+
+def test_preview_from_uploaded_schedules():
+    """The preview is drawn from the schedules read at upload, looked up by digest."""
+    with open('static/examples/config.xlsx', 'rb') as file:
+        data = file.read()
+    digest = arrivals.content_digest(data)
+    tables = {digest: hpath_submit.schedule_tables(data, 'config.xlsx')}
+    assert tables[digest]
+    key = {'digest': digest, 'sc_name': 'a', 'file_name': 'config.xlsx'}
+    assert hpath_submit.preview_arrivals(None, tables) is hpath_submit.PREVIEW_HINT
+    assert 'Arrival schedules: a' in str(hpath_submit.preview_arrivals(key, tables))
+    assert 'No arrival schedules' in str(
+        hpath_submit.preview_arrivals({**key, 'digest': 'other'}, tables))
+    assert hpath_submit.schedule_tables(b'not a workbook', 'bad.xlsx') == {}